@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+生成基准测试用的合成语料（DOCX / XLSX / PPTX / PDF / Markdown）
+
+所有内容由固定随机种子生成，同一 scale 在任何机器上得到相同的文档，便于跨版本对比。
+
+用法: python benchmarks/generate_corpus.py <output_dir> [--scale small|medium|large]
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import zlib
+
+CORPUS_SEED = 20240601
+CORPUS_MANIFEST_FILENAME = 'corpus.json'
+
+# 每个 scale 下各类文档的规模参数；medium/large 分别约为 small 的 5 倍和 25 倍
+CORPUS_SCALES = {
+    'small': {
+        'docx': {'paragraphs': 200, 'list_items': 40, 'tables': 5, 'table_rows': 20, 'table_cols': 5, 'images': 3},
+        'xlsx_tall': {'rows': 2000, 'cols': 10, 'merges': 0},
+        'xlsx_wide': {'rows': 50, 'cols': 120, 'merges': 20},
+        'pptx': {'slides': 20, 'shapes': 12, 'images': 1},
+        'pdf_single': {'pages': 10, 'columns': 1},
+        'pdf_two_column': {'pages': 10, 'columns': 2},
+        'md': {'sections': 20},
+    },
+    'medium': {
+        'docx': {'paragraphs': 1000, 'list_items': 200, 'tables': 25, 'table_rows': 20, 'table_cols': 5, 'images': 15},
+        'xlsx_tall': {'rows': 10000, 'cols': 10, 'merges': 0},
+        'xlsx_wide': {'rows': 250, 'cols': 120, 'merges': 100},
+        'pptx': {'slides': 100, 'shapes': 12, 'images': 1},
+        'pdf_single': {'pages': 50, 'columns': 1},
+        'pdf_two_column': {'pages': 50, 'columns': 2},
+        'md': {'sections': 100},
+    },
+    'large': {
+        'docx': {'paragraphs': 5000, 'list_items': 1000, 'tables': 125, 'table_rows': 20, 'table_cols': 5, 'images': 75},
+        'xlsx_tall': {'rows': 50000, 'cols': 10, 'merges': 0},
+        'xlsx_wide': {'rows': 1250, 'cols': 120, 'merges': 500},
+        'pptx': {'slides': 500, 'shapes': 12, 'images': 1},
+        'pdf_single': {'pages': 250, 'columns': 1},
+        'pdf_two_column': {'pages': 250, 'columns': 2},
+        'md': {'sections': 500},
+    },
+}
+
+_WORDS = (
+    'alpha beta gamma delta epsilon zeta theta kappa lambda sigma omega vector matrix tensor '
+    'document converter markdown table paragraph heading slide sheet column layout render '
+    'stream buffer cache index parser token style format number value result summary'
+).split()
+
+
+def _sentence(rng, min_words=8, max_words=20):
+    words = [rng.choice(_WORDS) for _ in range(rng.randint(min_words, max_words))]
+    return ' '.join(words).capitalize() + '.'
+
+
+def make_png(rng, width=160, height=120):
+    """生成带随机噪点的 RGB PNG（压缩后足够大，不会被装饰性过滤规则丢弃）"""
+    def _chunk(chunk_type, data):
+        raw = chunk_type + data
+        return struct.pack('>I', len(data)) + raw + struct.pack('>I', zlib.crc32(raw) & 0xFFFFFFFF)
+
+    rows = bytearray()
+    for _ in range(height):
+        rows.append(0)
+        rows.extend(rng.getrandbits(8) for _ in range(width * 3))
+    return (
+        b'\x89PNG\r\n\x1a\n'
+        + _chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+        + _chunk(b'IDAT', zlib.compress(bytes(rows)))
+        + _chunk(b'IEND', b'')
+    )
+
+
+def generate_docx(path, rng, paragraphs, list_items, tables, table_rows, table_cols, images):
+    """段落、标题、多级列表、表格和内嵌图片交错的 Word 文档"""
+    import io
+    import docx
+    from docx.shared import Inches
+
+    document = docx.Document()
+    sections = max(tables, images, 1)
+    for section in range(sections):
+        document.add_heading(f'Section {section + 1}', level=1 + section % 3)
+        for _ in range(paragraphs // sections):
+            paragraph = document.add_paragraph(_sentence(rng) + ' ')
+            paragraph.add_run(_sentence(rng, 3, 6)).bold = True
+        for item in range(list_items // sections):
+            style = 'List Bullet' if item % 2 == 0 else 'List Number 2'
+            document.add_paragraph(_sentence(rng, 4, 10), style=style)
+        if section < tables:
+            table = document.add_table(rows=table_rows, cols=table_cols)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = ' '.join(rng.choice(_WORDS) for _ in range(3))
+            table.cell(0, 0).merge(table.cell(0, 1))
+        if section < images:
+            document.add_picture(io.BytesIO(make_png(rng)), width=Inches(2))
+    document.save(path)
+
+
+def generate_xlsx(path, rng, rows, cols, merges):
+    """数值、文本、日期混合的工作表；merges 控制表头区域的合并单元格数量"""
+    from datetime import date, timedelta
+    import openpyxl
+
+    workbook = openpyxl.Workbook()
+    worksheet = workbook.active
+    worksheet.title = 'Data'
+    worksheet.append([f'Column {col + 1}' for col in range(cols)])
+    start = date(2024, 1, 1)
+    for row in range(rows):
+        values = []
+        for col in range(cols):
+            kind = col % 3
+            if kind == 0:
+                values.append(round(rng.uniform(0, 10000), 2))
+            elif kind == 1:
+                values.append(rng.choice(_WORDS))
+            else:
+                values.append(start + timedelta(days=row % 365))
+        worksheet.append(values)
+    worksheet.freeze_panes = 'A2'
+
+    for index in range(merges):
+        # 合并第一行之后的两格区域，分散在不同行，模拟分组表头
+        row = 2 + (index * 3) % max(rows - 1, 1)
+        col = 1 + (index * 2) % max(cols - 1, 1)
+        worksheet.merge_cells(start_row=row, start_column=col, end_row=row, end_column=col + 1)
+
+    workbook.save(path)
+
+
+def generate_pptx(path, rng, slides, shapes, images):
+    """每页包含标题、多个文本框、一个表格和可选图片"""
+    import io
+    from pptx import Presentation
+    from pptx.util import Inches, Pt
+
+    presentation = Presentation()
+    layout = presentation.slide_layouts[5]
+    for slide_index in range(slides):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = f'Slide {slide_index + 1}: {_sentence(rng, 2, 4)}'
+        for shape_index in range(shapes):
+            left = Inches(0.3 + (shape_index % 4) * 2.4)
+            top = Inches(1.5 + (shape_index // 4) * 1.2)
+            box = slide.shapes.add_textbox(left, top, Inches(2.2), Inches(1.0))
+            box.text_frame.text = _sentence(rng, 4, 8)
+            box.text_frame.paragraphs[0].runs[0].font.size = Pt(12)
+        table = slide.shapes.add_table(3, 3, Inches(0.5), Inches(5.5), Inches(4), Inches(1)).table
+        for row in table.rows:
+            for cell in row.cells:
+                cell.text = rng.choice(_WORDS)
+        for _ in range(images):
+            slide.shapes.add_picture(io.BytesIO(make_png(rng)), Inches(7), Inches(5.5), Inches(2))
+        slide.notes_slide.notes_text_frame.text = _sentence(rng)
+    presentation.save(path)
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _pdf_text_lines(rng, x, top, bottom, width_chars, leading=13):
+    """按固定行宽生成正文行，返回内容流操作列表"""
+    operations = []
+    y = top
+    while y > bottom:
+        line = ''
+        while len(line) < width_chars:
+            line += rng.choice(_WORDS) + ' '
+        operations.append(f'BT /F1 10 Tf {x} {y} Td ({_pdf_escape(line.strip())}) Tj ET')
+        y -= leading
+    return operations, y
+
+
+def _pdf_table(rng, x, top, rows=4, cols=3, cell_width=90, cell_height=18):
+    """带完整边框的表格（pdfplumber 依靠线条检测表格）"""
+    operations = ['0.5 w']
+    for row in range(rows + 1):
+        y = top - row * cell_height
+        operations.append(f'{x} {y} m {x + cols * cell_width} {y} l S')
+    for col in range(cols + 1):
+        cx = x + col * cell_width
+        operations.append(f'{cx} {top} m {cx} {top - rows * cell_height} l S')
+    for row in range(rows):
+        for col in range(cols):
+            text = _pdf_escape(rng.choice(_WORDS))
+            tx = x + col * cell_width + 4
+            ty = top - (row + 1) * cell_height + 5
+            operations.append(f'BT /F1 9 Tf {tx} {ty} Td ({text}) Tj ET')
+    return operations, top - rows * cell_height
+
+
+def generate_pdf(path, rng, pages, columns):
+    """
+    手写 PDF 1.4（项目依赖的 pdfplumber 只能读取 PDF，无法生成）
+
+    每页包含大号标题、正文段落和一个有边框的表格；columns=2 时正文为双栏排版，
+    标题跨栏，用于覆盖双栏检测分支。
+    """
+    page_width, page_height = 612, 792
+    contents = []
+    for page_index in range(pages):
+        operations = [
+            f'BT /F2 18 Tf 50 740 Td ({_pdf_escape(f"Chapter {page_index + 1} {rng.choice(_WORDS).title()}")}) Tj ET'
+        ]
+        if columns == 2:
+            left, _ = _pdf_text_lines(rng, 50, 700, 260, 42)
+            right, _ = _pdf_text_lines(rng, 320, 700, 260, 42)
+            operations += left + right
+            table, _ = _pdf_table(rng, 50, 230)
+        else:
+            body, y = _pdf_text_lines(rng, 50, 700, 320, 90)
+            operations += body
+            table, _ = _pdf_table(rng, 50, y - 20)
+        operations += table
+        contents.append('\n'.join(operations).encode('latin-1'))
+
+    # 对象编号: 1 Catalog, 2 Pages, 3/4 字体, 之后每页两个对象（Page + Contents）
+    objects = {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>',
+        4: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold >>',
+    }
+    kids = []
+    for page_index, stream in enumerate(contents):
+        page_id = 5 + page_index * 2
+        content_id = page_id + 1
+        kids.append(f'{page_id} 0 R')
+        objects[page_id] = (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width} {page_height}] '
+            f'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_id} 0 R >>'
+        ).encode('ascii')
+        objects[content_id] = b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream'
+    objects[2] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'.encode('ascii')
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b'%d 0 obj\n' % object_id + objects[object_id] + b'\nendobj\n'
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for object_id in sorted(objects):
+        output += b'%010d 00000 n \n' % offsets[object_id]
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset)
+
+    with open(path, 'wb') as f:
+        f.write(output)
+
+
+def generate_md(path, rng, sections):
+    """Markdown 转 DOCX 路径使用的文档：标题、列表、表格和代码块"""
+    parts = []
+    for section in range(sections):
+        parts.append(f'## Section {section + 1}\n')
+        parts.append(' '.join(_sentence(rng) for _ in range(4)) + '\n')
+        parts.append('\n'.join(f'- {_sentence(rng, 3, 6)}' for _ in range(4)) + '\n')
+        parts.append('| Name | Value | Note |\n| --- | --- | --- |\n' + '\n'.join(
+            f'| {rng.choice(_WORDS)} | {rng.randint(0, 999)} | {rng.choice(_WORDS)} |' for _ in range(5)
+        ) + '\n')
+        parts.append('```python\nprint("%s")\n```\n' % rng.choice(_WORDS))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('# Benchmark Document\n\n' + '\n'.join(parts))
+
+
+_GENERATORS = {
+    'docx': ('.docx', generate_docx),
+    'xlsx_tall': ('.xlsx', generate_xlsx),
+    'xlsx_wide': ('.xlsx', generate_xlsx),
+    'pptx': ('.pptx', generate_pptx),
+    'pdf_single': ('.pdf', generate_pdf),
+    'pdf_two_column': ('.pdf', generate_pdf),
+    'md': ('.md', generate_md),
+}
+
+
+def generate_corpus(output_dir, scale='small'):
+    """
+    在 output_dir 中生成一套语料，并写入 corpus.json 描述每个文件的规模参数
+
+    Returns:
+        语料清单字典 {'scale', 'seed', 'files': [{'name', 'path', 'bytes', 'params'}]}
+    """
+    if scale not in CORPUS_SCALES:
+        raise ValueError(f'未知的 scale: {scale}。可选: {", ".join(CORPUS_SCALES)}')
+
+    os.makedirs(output_dir, exist_ok=True)
+    files = []
+    for name, params in CORPUS_SCALES[scale].items():
+        extension, generator = _GENERATORS[name]
+        path = os.path.join(output_dir, f'{name}{extension}')
+        # 每个文件使用独立的随机序列，增减某类文档不会改变其他文档的内容
+        rng = random.Random(f'{CORPUS_SEED}:{scale}:{name}')
+        generator(path, rng, **params)
+        files.append({'name': name, 'path': os.path.basename(path), 'bytes': os.path.getsize(path), 'params': params})
+
+    manifest = {'scale': scale, 'seed': CORPUS_SEED, 'files': files}
+    with open(os.path.join(output_dir, CORPUS_MANIFEST_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成基准测试语料')
+    parser.add_argument('output_dir', help='语料输出目录')
+    parser.add_argument('--scale', choices=sorted(CORPUS_SCALES), default='small', help='语料规模 (默认: small)')
+    args = parser.parse_args(argv)
+
+    manifest = generate_corpus(args.output_dir, args.scale)
+    for entry in manifest['files']:
+        print(f"{entry['path']:<24} {entry['bytes'] / 1024:>10.1f} KB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换器基准测试：吞吐量与峰值 RSS
+
+每个语料文件在独立子进程中测量（先导入解析库作为基线，再重复转换 N 次），
+避免前一个转换器的内存占用和缓存影响下一个。结果写为 JSON，可用 --compare
+与之前版本的结果对比。
+
+用法:
+    python benchmarks/run_benchmarks.py [corpus_dir] [--scale small] [--repeat 3]
+        [--only docx,pdf_single] [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.generate_corpus import CORPUS_MANIFEST_FILENAME, generate_corpus  # noqa: E402
+
+RESULTS_SCHEMA_VERSION = 1
+
+# 扩展名 -> (被测函数, 需要预先导入的解析库)
+_CONVERTERS_BY_EXT = {
+    '.docx': ('convert_docx', 'docx'),
+    '.xlsx': ('convert_xlsx', 'openpyxl'),
+    '.pptx': ('convert_pptx', 'pptx'),
+    '.pdf': ('convert_pdf', 'pdfplumber'),
+    '.md': ('md_to_docx', None),
+}
+
+_DEPENDENCY_DISTRIBUTIONS = ('python-docx', 'openpyxl', 'python-pptx', 'pdfplumber', 'pdfminer.six')
+
+
+def _peak_rss_bytes(include_children=False):
+    """当前进程（可选包含已结束的子进程）的峰值 RSS；平台不支持时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if include_children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _node_skip_reason(converter_module):
+    """Node 路径不可用时返回跳过原因；不在基准测试中触发 npm install"""
+    if not shutil.which('node'):
+        return '未找到 Node.js'
+    local_node_modules = os.path.join(REPO_ROOT, 'scripts', 'md_to_docx', 'node_modules')
+    shared_node_modules = os.path.join(converter_module._get_node_shared_root(), 'md_to_docx', 'node_modules')
+    if not (os.path.isdir(local_node_modules) or os.path.isdir(shared_node_modules)):
+        return 'Node.js 依赖未安装（先运行一次 Markdown 转换或 npm install）'
+    return None
+
+
+def _run_converter_once(converter, file_path, work_dir):
+    from scripts import convert_document as converter_module
+
+    if converter == 'md_to_docx':
+        result = converter_module.convert_md(file_path, work_dir)
+        if not result.get('success'):
+            raise RuntimeError(result.get('error') or 'Markdown 转换失败')
+        return
+
+    image_save_dir = os.path.join(work_dir, 'images')
+    os.makedirs(image_save_dir, exist_ok=True)
+    func = getattr(converter_module, converter)
+    if converter == 'convert_pdf':
+        func(file_path)
+    else:
+        func(file_path, image_save_dir=image_save_dir, image_rel_dir='images')
+
+
+def measure(converter, file_path, repeat):
+    """
+    在当前进程中测量一个转换器（由 --measure 子进程调用）
+
+    Returns:
+        {'wall_s': [...], 'cpu_s': [...], 'baseline_rss_bytes', 'peak_rss_bytes'} 或
+        {'status': 'skipped', 'reason': ...}
+    """
+    from scripts import convert_document as converter_module
+
+    dependency = _CONVERTERS_BY_EXT[os.path.splitext(file_path)[1].lower()][1]
+    if dependency:
+        importlib.import_module(dependency)
+    elif converter == 'md_to_docx':
+        skip_reason = _node_skip_reason(converter_module)
+        if skip_reason:
+            return {'status': 'skipped', 'reason': skip_reason}
+    baseline_rss = _peak_rss_bytes(include_children=True)
+
+    wall_times = []
+    cpu_times = []
+    with tempfile.TemporaryDirectory(prefix='bench-') as work_dir:
+        for _ in range(repeat):
+            wall_start = time.perf_counter()
+            cpu_start = time.process_time()
+            _run_converter_once(converter, file_path, work_dir)
+            wall_times.append(time.perf_counter() - wall_start)
+            cpu_times.append(time.process_time() - cpu_start)
+
+    return {
+        'status': 'ok',
+        'wall_s': wall_times,
+        'cpu_s': cpu_times,
+        'baseline_rss_bytes': baseline_rss,
+        'peak_rss_bytes': _peak_rss_bytes(include_children=converter == 'md_to_docx'),
+    }
+
+
+def _measure_in_subprocess(converter, file_path, repeat):
+    command = [sys.executable, os.path.abspath(__file__), '--measure', converter, file_path, '--repeat', str(repeat)]
+    completed = subprocess.run(command, capture_output=True, text=True, encoding='utf-8', cwd=REPO_ROOT)
+    if completed.returncode != 0:
+        error_lines = (completed.stderr or completed.stdout).strip().splitlines()
+        return {'status': 'error', 'reason': error_lines[-1] if error_lines else f'exit {completed.returncode}'}
+    return json.loads(completed.stdout)
+
+
+def _summarize_measurement(entry, measurement):
+    entry.update({key: measurement[key] for key in ('status', 'reason') if key in measurement})
+    if measurement.get('status') != 'ok':
+        return entry
+
+    wall = measurement['wall_s']
+    median_wall = statistics.median(wall)
+    entry.update({
+        'wall_s': {'min': min(wall), 'median': median_wall, 'max': max(wall)},
+        'cpu_s_median': statistics.median(measurement['cpu_s']),
+        'throughput_mb_s': (entry['input_bytes'] / (1024 * 1024)) / median_wall if median_wall > 0 else None,
+        'baseline_rss_bytes': measurement['baseline_rss_bytes'],
+        'peak_rss_bytes': measurement['peak_rss_bytes'],
+    })
+    return entry
+
+
+def _dependency_versions():
+    from importlib import metadata
+
+    versions = {}
+    for distribution in _DEPENDENCY_DISTRIBUTIONS:
+        try:
+            versions[distribution] = metadata.version(distribution)
+        except metadata.PackageNotFoundError:
+            versions[distribution] = None
+    return versions
+
+
+def _git_revision():
+    try:
+        completed = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=REPO_ROOT, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def run_benchmarks(corpus_dir, repeat=3, only=None, progress=None):
+    """
+    对语料目录中的每个文件运行基准测试
+
+    Args:
+        corpus_dir: generate_corpus.py 生成的目录（需包含 corpus.json）
+        repeat: 每个文件重复转换的次数，取中位数
+        only: 可选的语料名集合（如 {'docx', 'pdf_single'}），只测量这些文件
+        progress: 可选回调，每完成一项调用 progress(entry)
+
+    Returns:
+        可直接序列化为 JSON 的结果字典
+    """
+    from scripts.convert_document import CONVERTER_VERSION
+
+    with open(os.path.join(corpus_dir, CORPUS_MANIFEST_FILENAME), encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    benchmarks = []
+    for corpus_file in corpus['files']:
+        if only and corpus_file['name'] not in only:
+            continue
+        file_path = os.path.abspath(os.path.join(corpus_dir, corpus_file['path']))
+        converter = _CONVERTERS_BY_EXT[os.path.splitext(file_path)[1].lower()][0]
+        entry = {
+            'name': corpus_file['name'],
+            'converter': converter,
+            'file': corpus_file['path'],
+            'input_bytes': os.path.getsize(file_path),
+            'params': corpus_file['params'],
+            'repeat': repeat,
+        }
+        _summarize_measurement(entry, _measure_in_subprocess(converter, file_path, repeat))
+        benchmarks.append(entry)
+        if progress:
+            progress(entry)
+
+    return {
+        'schema_version': RESULTS_SCHEMA_VERSION,
+        'converter_version': CONVERTER_VERSION,
+        'git_revision': _git_revision(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'dependencies': _dependency_versions(),
+        },
+        'corpus': {'scale': corpus['scale'], 'seed': corpus['seed']},
+        'benchmarks': benchmarks,
+    }
+
+
+def compare_results(baseline, current):
+    """
+    按语料名对比两次结果，返回 [(name, 耗时比值, 峰值 RSS 比值)]；比值 > 1 表示当前更慢/更大
+    """
+    baseline_by_name = {entry['name']: entry for entry in baseline.get('benchmarks', [])}
+    rows = []
+    for entry in current.get('benchmarks', []):
+        previous = baseline_by_name.get(entry['name'])
+        if not previous or entry.get('status') != 'ok' or previous.get('status') != 'ok':
+            continue
+        time_ratio = entry['wall_s']['median'] / previous['wall_s']['median'] if previous['wall_s']['median'] else None
+        rss_ratio = None
+        if entry.get('peak_rss_bytes') and previous.get('peak_rss_bytes'):
+            rss_ratio = entry['peak_rss_bytes'] / previous['peak_rss_bytes']
+        rows.append((entry['name'], time_ratio, rss_ratio))
+    return rows
+
+
+def _format_entry(entry):
+    if entry.get('status') != 'ok':
+        return f"{entry['name']:<16} {entry['converter']:<13} {entry['status']}: {entry.get('reason', '')}"
+    rss = entry.get('peak_rss_bytes')
+    rss_text = f'{rss / (1024 * 1024):8.1f} MB' if rss else '       n/a'
+    return (
+        f"{entry['name']:<16} {entry['converter']:<13} "
+        f"{entry['wall_s']['median'] * 1000:9.1f} ms {entry['throughput_mb_s']:8.2f} MB/s {rss_text}"
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='运行转换器基准测试')
+    parser.add_argument('corpus_dir', nargs='?', help='语料目录（缺省时在临时目录生成）')
+    parser.add_argument('--scale', default='small', help='语料目录不存在时按此规模生成 (默认: small)')
+    parser.add_argument('--repeat', type=int, default=3, help='每个文件重复次数 (默认: 3)')
+    parser.add_argument('--only', help='只运行指定语料，逗号分隔（如 docx,pdf_single）')
+    parser.add_argument('--output', help='结果 JSON 输出路径')
+    parser.add_argument('--compare', help='与之前的结果 JSON 对比')
+    parser.add_argument('--measure', nargs=2, metavar=('CONVERTER', 'FILE'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        converter, file_path = args.measure
+        print(json.dumps(measure(converter, file_path, args.repeat)))
+        return 0
+
+    with tempfile.TemporaryDirectory(prefix='bench-corpus-') as temp_corpus:
+        corpus_dir = args.corpus_dir or temp_corpus
+        if not os.path.exists(os.path.join(corpus_dir, CORPUS_MANIFEST_FILENAME)):
+            generate_corpus(corpus_dir, args.scale)
+
+        only = set(args.only.split(',')) if args.only else None
+        results = run_benchmarks(corpus_dir, repeat=args.repeat, only=only,
+                                 progress=lambda entry: print(_format_entry(entry), flush=True))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"\n对比 {baseline.get('converter_version')} ({baseline.get('git_revision')}) -> "
+              f"{results['converter_version']} ({results['git_revision']})")
+        for name, time_ratio, rss_ratio in compare_results(baseline, results):
+            time_text = f'{time_ratio:6.2f}x' if time_ratio else '   n/a'
+            rss_text = f'{rss_ratio:6.2f}x' if rss_ratio else '   n/a'
+            print(f'{name:<16} 耗时 {time_text}  峰值 RSS {rss_text}')
+
+    return 0 if all(entry.get('status') != 'error' for entry in results['benchmarks']) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+转换器规模伸缩基准：检查耗时和峰值内存是否随文档规模线性增长
+
+对 DOCX（段落数）、XLSX（行数）、PPTX（幻灯片数）分别生成 1x、2x、4x ... 规模的合成文档，
+测量转换耗时（多次取最小值）和 tracemalloc 峰值内存，并按双对数斜率估计增长阶数：
+斜率约为 1 表示线性，明显大于 1 说明存在重复拼接等平方级开销。
+
+用法:
+    python benchmarks/run_scaling.py [--factors 1,2,4] [--repeat 2] [--only docx,pptx] [--output scaling.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.generate_corpus import CORPUS_SEED, generate_docx, generate_pptx, generate_xlsx  # noqa: E402
+
+# 名称 -> (扩展名, 生成函数, 被测函数名, 随规模增长的参数, 1x 规模参数)
+SCALING_CASES = {
+    'docx': ('.docx', generate_docx, 'convert_docx', 'paragraphs', {
+        'paragraphs': 250, 'list_items': 0, 'tables': 1, 'table_rows': 20, 'table_cols': 5, 'images': 0,
+    }),
+    'xlsx': ('.xlsx', generate_xlsx, 'convert_xlsx', 'rows', {'rows': 2000, 'cols': 10, 'merges': 0}),
+    'pptx': ('.pptx', generate_pptx, 'convert_pptx', 'slides', {'slides': 20, 'shapes': 12, 'images': 0}),
+}
+
+
+def _measure(converter, path, repeat):
+    """返回 (最小耗时秒, 峰值内存字节, 输出字符数)"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        converter(path)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        markdown, _images = converter(path)
+        _current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak, len(markdown)
+
+
+def _growth_exponent(points, key):
+    """首尾两点的双对数斜率"""
+    first, last = points[0], points[-1]
+    if first[key] <= 0 or last[key] <= 0 or first['factor'] == last['factor']:
+        return None
+    return math.log(last[key] / first[key]) / math.log(last['factor'] / first['factor'])
+
+
+def run_scaling(factors, repeat=2, only=None, work_dir=None):
+    from scripts import convert_document
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='bruce-doc-scaling-', dir=work_dir) as tmp_dir:
+        for name, (extension, generator, converter_name, grow_param, base_params) in SCALING_CASES.items():
+            if only and name not in only:
+                continue
+            converter = getattr(convert_document, converter_name)
+            points = []
+            for factor in factors:
+                params = dict(base_params)
+                params[grow_param] = base_params[grow_param] * factor
+                path = os.path.join(tmp_dir, f'{name}_{factor}x{extension}')
+                generator(path, random.Random(f'{CORPUS_SEED}:scaling:{name}:{factor}'), **params)
+                seconds, peak_bytes, output_chars = _measure(converter, path, repeat)
+                points.append({
+                    'factor': factor,
+                    grow_param: params[grow_param],
+                    'input_bytes': os.path.getsize(path),
+                    'seconds': round(seconds, 4),
+                    'peak_bytes': peak_bytes,
+                    'output_chars': output_chars,
+                    'us_per_unit': round(seconds / params[grow_param] * 1e6, 2),
+                })
+                print(f"{name:<5} {factor:>3}x {params[grow_param]:>7} {grow_param:<10} "
+                      f"{seconds:>8.3f}s  peak {peak_bytes / (1024 * 1024):>8.1f} MB", flush=True)
+
+            time_exponent = _growth_exponent(points, 'seconds')
+            memory_exponent = _growth_exponent(points, 'peak_bytes')
+            results[name] = {
+                'unit': grow_param,
+                'points': points,
+                'time_exponent': round(time_exponent, 3) if time_exponent is not None else None,
+                'memory_exponent': round(memory_exponent, 3) if memory_exponent is not None else None,
+            }
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='转换器规模伸缩基准')
+    parser.add_argument('--factors', default='1,2,4', help='规模倍数，逗号分隔 (默认: 1,2,4)')
+    parser.add_argument('--repeat', type=int, default=2, help='每个规模的重复次数，取最小耗时 (默认: 2)')
+    parser.add_argument('--only', default='', help=f'只运行指定用例，逗号分隔: {",".join(SCALING_CASES)}')
+    parser.add_argument('--output', help='结果 JSON 输出路径')
+    args = parser.parse_args(argv)
+
+    factors = sorted({int(value) for value in args.factors.split(',') if value.strip()})
+    only = {name.strip() for name in args.only.split(',') if name.strip()}
+    results = run_scaling(factors, repeat=max(args.repeat, 1), only=only)
+
+    print('')
+    for name, result in results.items():
+        print(f"{name:<5} 耗时增长阶数 {result['time_exponent']}  峰值内存增长阶数 {result['memory_exponent']}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'factors': factors, 'repeat': args.repeat, 'results': results}, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,6 +16,12 @@
 import sys
 import os
 import json
+import asyncio
+import atexit
+import collections
+import functools
+import queue
+import threading
 import importlib
 import logging
 import re
@@ -23,14 +29,46 @@ import subprocess
 import shutil
 import io
 import struct
+import tarfile
+import tempfile
+import zipfile
 import hashlib
+import posixpath
+import time
+import uuid
+import contextlib
+import contextvars
+import tracemalloc
+import multiprocessing
+import multiprocessing.connection
 import xml.etree.ElementTree as ET
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 
+CONVERTER_VERSION = "1.0.0"             # 转换输出格式变化时递增，使旧的缓存条目失效
 SUPPORTED_EXTENSIONS = ['.docx', '.xlsx', '.pptx', '.pdf', '.md']
 MAX_FILE_SIZE_BYTES = 100 * 1024 * 1024
 NODE_CONVERT_TIMEOUT_SECONDS = 120
+MD_BATCH_MIN_FILES_PER_PROCESS = 20   # 批量转换 Markdown 时每个 Node.js 进程至少分到的文件数，摊薄启动开销
+MD_WORKER_ENV = "BRUCE_DOC_CONVERTER_MD_WORKER"
+MD_WORKER_MAX_JOBS = 200              # 常驻 Node.js worker 处理这么多个文件后重启，限制内存增长
+DOCX_STREAMING_ENV = "BRUCE_DOC_CONVERTER_DOCX_STREAMING"
+BATCH_IN_FLIGHT_PER_WORKER = 2        # 每个 worker 最多预提交的任务数，限制批量转换的内存占用
 NODE_SHARED_HOME_ENV = "BRUCE_DOC_CONVERTER_NODE_HOME"
 GENERATED_OUTPUT_DIR_NAMES = {"Markdown", "Word"}
+CACHE_DIR_ENV = "BRUCE_DOC_CONVERTER_CACHE_DIR"
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+HASH_CHUNK_BYTES = 1024 * 1024
+BATCH_MANIFEST_FILENAME = ".bruce-doc-converter-manifest.json"
+BATCH_CHECKPOINT_FILENAME = ".bruce-doc-converter-checkpoint.jsonl"
+BATCH_CHECKPOINT_FSYNC_SECONDS = 5.0   # 检查点日志每行写入后立即 flush，fsync 至多每隔这么久一次
+BATCH_COST_STATS_ENV = "BRUCE_DOC_CONVERTER_BATCH_STATS"
+SPOOL_LEASE_SECONDS = 300.0           # 任务认领后超过此时间未续约视为 worker 已失联，任务退回 incoming/
+SPOOL_POLL_SECONDS = 2.0              # incoming/ 为空时的轮询间隔
+SPOOL_RESULT_FILENAME = "result.json"
+BATCH_COST_FIXED_SECONDS = 0.05       # 每个文件的固定开销估计（打开文件、写输出等）
+BATCH_COST_LEARNING_RATE = 0.3        # 新一轮实测的每 MB 耗时在历史估计中所占权重
+CONTENT_MODES = ('full', 'preview', 'none')
+DEFAULT_CONTENT_PREVIEW_BYTES = 4 * 1024
 DOCX_XML_NAMESPACES = {'w': 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'}
 DOCX_W_NS = DOCX_XML_NAMESPACES['w']
 
@@ -53,6 +91,17 @@ OOXML_IMAGE_NAMESPACES = {
     'p': 'http://schemas.openxmlformats.org/presentationml/2006/main',
 }
 
+# DOCX 正文单次遍历使用的精确标签（Clark 记法），直接与 lxml 元素的 tag 比较
+_DOCX_TAG_BODY = f"{{{DOCX_W_NS}}}body"
+_DOCX_TAG_P = f"{{{DOCX_W_NS}}}p"
+_DOCX_TAG_TBL = f"{{{DOCX_W_NS}}}tbl"
+_DOCX_TAG_T = f"{{{DOCX_W_NS}}}t"
+_DOCX_TAG_INSTR_TEXT = f"{{{DOCX_W_NS}}}instrText"
+_DOCX_TAG_DRAWING = f"{{{DOCX_W_NS}}}drawing"
+_DOCX_TAG_DOC_PR = f"{{{OOXML_IMAGE_NAMESPACES['wp']}}}docPr"
+_DOCX_TAG_BLIP = f"{{{OOXML_IMAGE_NAMESPACES['a']}}}blip"
+_OPC_RELATIONSHIPS_NS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
 # 图片格式文件头魔数
 _IMAGE_SIGNATURES = {
     b'\x89PNG\r\n\x1a\n': 'png',
@@ -73,6 +122,7 @@ _RE_COLLAPSE_EXTRA_BLANK_LINES = re.compile(r"\n{3,}")
 _RE_ESCAPE_MARKDOWN_LEADING = re.compile(r"^([>#\-\+\*])")
 _RE_ESCAPE_MARKDOWN_ORDERED_LIST = re.compile(r"^(\d+)\.\s")
 _RE_WRAP_INLINE_MARKDOWN = re.compile(r"^(\s*)(.*?)(\s*)$", re.DOTALL)
+_RE_MARKDOWN_HEADING_LINE = re.compile(r"^#{1,6}\s+\S", re.MULTILINE)
 
 def _configure_windows_stdio():
     """
@@ -141,6 +191,127 @@ def _configure_windows_stdio():
 
 _configure_windows_stdio()
 
+# ==================== 性能剖析 ====================
+
+# 当前转换的剖析数据；未启用 --profile 时为 None，各阶段埋点直接跳过
+_ACTIVE_PROFILE = contextvars.ContextVar('bruce_doc_converter_profile', default=None)
+
+def _new_stage_stats():
+    return {'calls': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0, 'peak_bytes': 0}
+
+def _merge_stage_stats(target, stats):
+    """同名阶段累加耗时和调用次数，峰值内存取最大值"""
+    target['calls'] += stats['calls']
+    target['wall_ms'] += stats['wall_ms']
+    target['cpu_ms'] += stats['cpu_ms']
+    target['peak_bytes'] = max(target['peak_bytes'], stats['peak_bytes'])
+
+# 未启用剖析时复用的空上下文，避免逐段落/逐行埋点创建生成器
+_NULL_PROFILE_STAGE = contextlib.nullcontext()
+
+def _profile_stage(name, page=None):
+    """
+    记录一个命名阶段的墙钟时间、CPU 时间和峰值内存（tracemalloc，相对阶段开始时的增量）
+
+    阶段可以嵌套；同名阶段多次调用会累加。传入 page 时额外记录一条逐页明细，
+    页内嵌套阶段同时计入该页的 stages。
+    """
+    profile = _ACTIVE_PROFILE.get()
+    if profile is None:
+        return _NULL_PROFILE_STAGE
+    return _record_profile_stage(profile, name, page)
+
+@contextlib.contextmanager
+def _record_profile_stage(profile, name, page):
+    stack = profile['_stack']
+    current_memory, current_peak = tracemalloc.get_traced_memory()
+    if stack:
+        stack[-1]['peak'] = max(stack[-1]['peak'], current_peak)
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+
+    frame = {'memory': current_memory, 'peak': current_memory}
+    stack.append(frame)
+    previous_page = profile['_page']
+    page_record = None
+    if page is not None:
+        page_record = {'page': page, 'stages': {}}
+        profile['_page'] = page_record
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        wall_ms = (time.perf_counter() - wall_start) * 1000
+        cpu_ms = (time.process_time() - cpu_start) * 1000
+        frame['peak'] = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+        stack.pop()
+        if stack:
+            stack[-1]['peak'] = max(stack[-1]['peak'], frame['peak'])
+
+        stats = {
+            'calls': 1,
+            'wall_ms': wall_ms,
+            'cpu_ms': cpu_ms,
+            'peak_bytes': max(frame['peak'] - frame['memory'], 0),
+        }
+        _merge_stage_stats(profile['stages'].setdefault(name, _new_stage_stats()), stats)
+
+        profile['_page'] = previous_page
+        if page_record is not None:
+            page_record.update({key: stats[key] for key in ('wall_ms', 'cpu_ms', 'peak_bytes')})
+            profile['pages'].append(page_record)
+        elif previous_page is not None:
+            _merge_stage_stats(previous_page['stages'].setdefault(name, _new_stage_stats()), stats)
+
+def _run_profiled(func, *args, **kwargs):
+    """
+    在剖析模式下执行 func，返回 (func 的返回值, profile 字典)
+
+    profile 包含 total（整体耗时与峰值内存）、stages（按阶段名汇总）、pages（PDF 逐页明细）
+    和 caches（按缓存名汇总的命中 / 未命中次数与命中率）。
+    """
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profile = {'stages': {}, 'pages': [], 'caches': {}, '_stack': [], '_page': None}
+    token = _ACTIVE_PROFILE.set(profile)
+    try:
+        with _profile_stage('total'):
+            value = func(*args, **kwargs)
+    finally:
+        _ACTIVE_PROFILE.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+    for stats in [profile['stages']['total'], *profile['stages'].values(), *profile['pages'],
+                  *(stats for page in profile['pages'] for stats in page['stages'].values())]:
+        stats['wall_ms'] = round(stats['wall_ms'], 3)
+        stats['cpu_ms'] = round(stats['cpu_ms'], 3)
+
+    total = profile['stages'].pop('total')
+    del total['calls']
+    return value, {
+        'total': total,
+        'stages': profile['stages'],
+        'pages': profile['pages'],
+        'caches': {name: _with_cache_hit_rate(stats) for name, stats in profile['caches'].items()},
+    }
+
+def _record_profile_cache(name, hits, misses):
+    """把一次转换中某个缓存的命中 / 未命中次数累加到当前剖析数据，未启用剖析时跳过"""
+    profile = _ACTIVE_PROFILE.get()
+    if profile is None:
+        return
+    stats = profile['caches'].setdefault(name, {'hits': 0, 'misses': 0})
+    stats['hits'] += hits
+    stats['misses'] += misses
+
+def _with_cache_hit_rate(stats):
+    lookups = stats['hits'] + stats['misses']
+    return dict(stats, hit_rate=round(stats['hits'] / lookups, 4) if lookups else 0.0)
+
 # ==================== 依赖配置 ====================
 
 _DEPENDENCIES_BY_EXT = {
@@ -151,20 +322,33 @@ _DEPENDENCIES_BY_EXT = {
     '.md': [],  # Markdown 转 DOCX 使用 Node.js，无 Python 依赖
 }
 
-# ==================== Node.js 共享依赖目录 ====================
+_ALL_PYTHON_DEPENDENCIES = [
+    ('docx', 'python-docx'),
+    ('openpyxl', 'openpyxl'),
+    ('pptx', 'python-pptx'),
+    ('pdfplumber', 'pdfplumber'),
+]
 
-def _get_node_shared_root():
-    override = os.environ.get(NODE_SHARED_HOME_ENV)
-    if override:
-        return override
+# 已通过检查的依赖集合（按扩展名，'*' 表示全部），常驻进程中避免重复 import 探测
+_DEPENDENCY_CHECK_PASSED = set()
+
+# ==================== Node.js 共享依赖目录 ====================
 
+def _get_user_data_root():
+    """用户级数据根目录（Node.js 共享依赖、转换缓存等均放在其下）"""
     if sys.platform == "win32":
         base = os.environ.get("LOCALAPPDATA") or os.environ.get("APPDATA")
         if not base:
             base = os.path.join(os.path.expanduser("~"), "AppData", "Local")
-        return os.path.join(base, "BruceDocConverter", "node")
+        return os.path.join(base, "BruceDocConverter")
+
+    return os.path.join(os.path.expanduser("~"), ".bruce-doc-converter")
 
-    return os.path.join(os.path.expanduser("~"), ".bruce-doc-converter", "node")
+def _get_node_shared_root():
+    override = os.environ.get(NODE_SHARED_HOME_ENV)
+    if override:
+        return override
+    return os.path.join(_get_user_data_root(), "node")
 
 def _sync_shared_package_files(source_dir, target_dir):
     for filename in ("package.json", "package-lock.json"):
@@ -317,20 +501,14 @@ def check_dependencies(file_ext=None, auto_install=True):
     Returns:
         (success: bool, error_message: str or None)
     """
+    check_key = file_ext or '*'
+    if check_key in _DEPENDENCY_CHECK_PASSED:
+        return True, None
+
     # 确定需要检查的依赖
-    deps = _DEPENDENCIES_BY_EXT.get(file_ext) if file_ext else [
-        ('docx', 'python-docx'),
-        ('openpyxl', 'openpyxl'),
-        ('pptx', 'python-pptx'),
-        ('pdfplumber', 'pdfplumber'),
-    ]
+    deps = _DEPENDENCIES_BY_EXT.get(file_ext) if file_ext else _ALL_PYTHON_DEPENDENCIES
     if deps is None:
-        deps = [
-            ('docx', 'python-docx'),
-            ('openpyxl', 'openpyxl'),
-            ('pptx', 'python-pptx'),
-            ('pdfplumber', 'pdfplumber'),
-        ]
+        deps = _ALL_PYTHON_DEPENDENCIES
 
     # 检查依赖是否已安装
     missing = []
@@ -357,6 +535,7 @@ def check_dependencies(file_ext=None, auto_install=True):
             if still_missing:
                 return False, f"依赖安装后仍无法加载: {', '.join(still_missing)}。请手动安装并检查 Python 环境。"
 
+            _DEPENDENCY_CHECK_PASSED.add(check_key)
             return True, None
         else:
             # 安装失败
@@ -366,6 +545,7 @@ def check_dependencies(file_ext=None, auto_install=True):
     if missing:
         return False, f"缺少依赖库: {', '.join(missing_pip_names)}。请运行: pip install --user {' '.join(missing_pip_names)}"
 
+    _DEPENDENCY_CHECK_PASSED.add(check_key)
     return True, None
 
 def _normalize_text(value, preserve_newlines=False):
@@ -464,22 +644,93 @@ def _get_docx_heading_level(style):
 
     return None
 
-def _resolve_docx_run_font_flag(run, paragraph, attr_name, *, allow_paragraph_style=False):
-    """解析 run 的实际粗体/斜体状态，支持字符样式和可选的段落样式继承"""
-    direct_value = getattr(run.font, attr_name, None)
-    if direct_value is not None:
-        return bool(direct_value)
-
-    char_style_value = _resolve_docx_style_font_flag(getattr(run, "style", None), attr_name)
-    if char_style_value is not None:
-        return char_style_value
+def _new_docx_style_resolver(styles):
+    """
+    创建单个文档内的样式解析缓存
 
-    if allow_paragraph_style:
-        paragraph_style_value = _resolve_docx_style_font_flag(getattr(paragraph, "style", None), attr_name)
-        if paragraph_style_value is not None:
-            return paragraph_style_value
+    文档通常只有少量样式却被成千上万个段落 / run 引用，而 python-docx 每次按 id 查样式都要扫描整个样式表。
+    段落格式按段落样式 id 缓存（标题层级、目录样式、列表提示、样式继承的 numPr 和粗体/斜体），
+    run 的最终粗体/斜体按 (字符样式 id, 直接格式, 段落样式 id) 签名缓存，每种组合只沿继承链解析一次。
 
-    return False
+    Args:
+        styles: python-docx 的 Styles 代理
+    """
+    return {
+        'styles': styles,
+        'paragraphs': {},
+        'runs': {},
+        'stats': {
+            'docx.paragraph_styles': {'hits': 0, 'misses': 0},
+            'docx.run_formats': {'hits': 0, 'misses': 0},
+        },
+    }
+
+def _record_docx_style_resolver_stats(resolver):
+    """把样式解析缓存的命中统计写入当前剖析数据（--profile 输出的 caches 字段）"""
+    for name, stats in resolver['stats'].items():
+        _record_profile_cache(name, stats['hits'], stats['misses'])
+
+def _resolve_docx_paragraph_format(resolver, p):
+    """解析 w:p 元素所用段落样式的格式信息，按样式 id 缓存"""
+    from docx.enum.style import WD_STYLE_TYPE
+
+    style_key = p.style
+    stats = resolver['stats']['docx.paragraph_styles']
+    paragraph_format = resolver['paragraphs'].get(style_key)
+    if paragraph_format is not None:
+        stats['hits'] += 1
+        return paragraph_format
+
+    stats['misses'] += 1
+    style = resolver['styles'].get_by_id(style_key, WD_STYLE_TYPE.PARAGRAPH)
+    style_name = (style.name if style else "") or ""
+    style_id = (getattr(style, "style_id", "") if style else "") or ""
+    paragraph_format = {
+        'key': style_key,
+        'style_name': style_name,
+        'style_id': style_id,
+        'style_hint': f"{style_name} {style_id}".lower(),
+        'heading_level': _get_docx_heading_level(style),
+        'is_toc': _is_docx_toc_style(style),
+        'numpr': _get_docx_style_numpr(style),
+        'bold': _resolve_docx_style_font_flag(style, "bold"),
+        'italic': _resolve_docx_style_font_flag(style, "italic"),
+    }
+    resolver['paragraphs'][style_key] = paragraph_format
+    return paragraph_format
+
+def _resolve_docx_run_format(resolver, r, paragraph_format):
+    """
+    解析 w:r 元素的实际 (粗体, 斜体)：直接格式优先，其次字符样式继承链，
+    非标题段落再回退段落样式；结果按 (字符样式 id, 直接格式, 段落样式 id) 签名缓存
+    """
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.text.font import Font
+
+    font = Font(r)
+    direct_bold = font.bold
+    direct_italic = font.italic
+    signature = (r.style, direct_bold, direct_italic, paragraph_format['key'])
+    stats = resolver['stats']['docx.run_formats']
+    run_format = resolver['runs'].get(signature)
+    if run_format is not None:
+        stats['hits'] += 1
+        return run_format
+
+    stats['misses'] += 1
+    char_style = resolver['styles'].get_by_id(signature[0], WD_STYLE_TYPE.CHARACTER)
+    allow_paragraph_style = paragraph_format['heading_level'] is None
+    resolved = []
+    for attr_name, direct_value in (("bold", direct_bold), ("italic", direct_italic)):
+        value = direct_value
+        if value is None:
+            value = _resolve_docx_style_font_flag(char_style, attr_name)
+        if value is None and allow_paragraph_style:
+            value = paragraph_format[attr_name]
+        resolved.append(bool(value))
+    run_format = tuple(resolved)
+    resolver['runs'][signature] = run_format
+    return run_format
 
 def _validate_input_file(file_path):
     """校验并规范化输入文件路径"""
@@ -522,13 +773,14 @@ def _iter_batch_input_files(directory, recursive=True, output_dir=None):
 
     if recursive:
         for root, dirs, files in os.walk(normalized_directory):
-            dirs[:] = [dir_name for dir_name in dirs if not _should_skip_dir(os.path.join(root, dir_name))]
-            for file in files:
+            # 排序保证不同文件系统下的遍历顺序一致，批量结果顺序可复现
+            dirs[:] = sorted(dir_name for dir_name in dirs if not _should_skip_dir(os.path.join(root, dir_name)))
+            for file in sorted(files):
                 if os.path.splitext(file)[1].lower() in SUPPORTED_EXTENSIONS:
                     yield os.path.join(root, file)
         return
 
-    for file in os.listdir(normalized_directory):
+    for file in sorted(os.listdir(normalized_directory)):
         file_path = os.path.join(normalized_directory, file)
         if os.path.isfile(file_path) and os.path.splitext(file)[1].lower() in SUPPORTED_EXTENSIONS:
             yield file_path
@@ -567,24 +819,17 @@ def _is_docx_vertical_merge_continuation(tc):
     return getattr(v_merge, "val", None) != "restart"
 
 def _extract_docx_table_cell_text(tc):
-    """从 Word 表格 XML 单元格中提取文本，保留段落换行"""
+    """从 Word 表格单元格（lxml 元素）中提取文本，保留段落换行"""
     paragraphs = []
-    try:
-        root = ET.fromstring(tc.xml)
-    except ET.ParseError:
-        return ""
-
-    for paragraph in root.findall('./w:p', DOCX_XML_NAMESPACES):
-        text_nodes = paragraph.findall('.//w:t', DOCX_XML_NAMESPACES)
-        paragraph_text = ''.join(node.text for node in text_nodes if node.text)
+    for paragraph in tc.iterchildren(_DOCX_TAG_P):
+        paragraph_text = ''.join(node.text for node in paragraph.iter(_DOCX_TAG_T) if node.text)
         if paragraph_text:
             paragraphs.append(paragraph_text)
 
     if paragraphs:
         return _normalize_table_cell("\n".join(paragraphs))
 
-    text_nodes = root.findall('.//w:t', DOCX_XML_NAMESPACES)
-    return _normalize_table_cell(''.join(node.text for node in text_nodes if node.text))
+    return _normalize_table_cell(''.join(node.text for node in tc.iter(_DOCX_TAG_T) if node.text))
 
 def _docx_attr(node, attr_name):
     """读取 WordprocessingML 命名空间属性值"""
@@ -595,8 +840,17 @@ def _docx_attr(node, attr_name):
 def _build_docx_numbering_index(doc):
     """构建 numId -> 抽象编号定义 的索引，支持多级编号渲染"""
     try:
-        root = ET.fromstring(doc.part.numbering_part.element.xml)
-    except (AttributeError, ET.ParseError, TypeError):
+        numbering_xml = doc.part.numbering_part.element.xml
+    except (AttributeError, NotImplementedError):
+        # 文档没有 numbering.xml 时 python-docx 会尝试新建编号部件并抛出 NotImplementedError
+        return {}, {}
+    return _parse_docx_numbering_xml(numbering_xml)
+
+def _parse_docx_numbering_xml(numbering_xml):
+    """解析 numbering.xml 内容，返回 (num_to_abstract, abstract_levels)"""
+    try:
+        root = ET.fromstring(numbering_xml)
+    except (ET.ParseError, TypeError):
         return {}, {}
 
     num_to_abstract = {}
@@ -663,9 +917,8 @@ def _get_docx_style_numpr(style):
 
     return (str(num_id), ilvl) if num_id is not None else (None, None)
 
-def _get_docx_paragraph_numpr(para):
-    """获取段落实际使用的 numId / ilvl，优先段落自身，再回退样式"""
-    p = getattr(para, "_p", None)
+def _get_docx_paragraph_numpr(p):
+    """读取 w:p 元素自身 pPr 中的 numId / ilvl，没有时返回 (None, None)"""
     ppr = getattr(p, "pPr", None) if p is not None else None
     num_pr = getattr(ppr, "numPr", None) if ppr is not None else None
 
@@ -681,7 +934,7 @@ def _get_docx_paragraph_numpr(para):
         if num_id is not None:
             return str(num_id), ilvl
 
-    return _get_docx_style_numpr(getattr(para, "style", None))
+    return None, None
 
 def _to_roman(value):
     if value <= 0:
@@ -801,26 +1054,31 @@ def _render_docx_list_marker(numbering_info, numbering_state):
     rendered = re.sub(r"%(\d+)", _replace, template).strip()
     return rendered or "1."
 
-def _is_docx_toc_paragraph(para):
-    """识别 Word 自动目录段落，避免被误当正文导出"""
-    style = getattr(para, "style", None)
+def _is_docx_toc_style(style):
+    """识别 Word 自动目录样式（TOC 1 / TOC Heading 等）"""
     style_name = getattr(style, "name", "") if style is not None else ""
     style_id = getattr(style, "style_id", "") if style is not None else ""
 
-    if re.match(r"(?i)^toc(?:\s+heading|\s+\d+)?$", style_name.strip()):
-        return True
-    if re.match(r"(?i)^toc(?:heading|\d+)?$", style_id.strip()):
+    if re.match(r"(?i)^toc(?:\s+heading|\s+\d+)?$", (style_name or "").strip()):
         return True
+    return bool(re.match(r"(?i)^toc(?:heading|\d+)?$", (style_id or "").strip()))
 
-    try:
-        root = ET.fromstring(para._p.xml)
-    except Exception:
-        return False
+def _scan_docx_paragraph(p):
+    """
+    单次遍历 w:p 元素子树，收集目录域代码和图片节点
 
-    for instr in root.findall('.//w:instrText', DOCX_XML_NAMESPACES):
-        if 'TOC' in (instr.text or '').upper():
-            return True
-    return False
+    Returns:
+        (has_toc_field, drawings)：是否含 TOC 域代码；按文档顺序排列的 w:drawing 元素
+        （包括 mc:AlternateContent 的 Choice / Fallback 分支内的图片）
+    """
+    has_toc_field = False
+    drawings = []
+    for node in p.iter(_DOCX_TAG_INSTR_TEXT, _DOCX_TAG_DRAWING):
+        if node.tag == _DOCX_TAG_DRAWING:
+            drawings.append(node)
+        elif not has_toc_field and 'TOC' in (node.text or '').upper():
+            has_toc_field = True
+    return has_toc_field, drawings
 
 # ==================== 图片提取公共基础设施 ====================
 
@@ -1001,6 +1259,47 @@ def _save_extracted_image(data, image_save_dir, image_rel_dir, base_name, image_
         return None
 
 
+def _make_directory_image_sink(image_save_dir, image_rel_dir):
+    """
+    图片写入目录的 sink（转换文件时的默认行为）
+
+    sink 的调用约定为 sink(data, base_name, image_counter)，返回 Markdown 中引用的相对路径，
+    返回 None 表示跳过该图片。
+    """
+    def sink(data, base_name, image_counter):
+        return _save_extracted_image(data, image_save_dir, image_rel_dir, base_name, image_counter)
+    return sink
+
+
+def _make_memory_image_sink(images, image_rel_dir=IMAGE_OUTPUT_DIR_NAME):
+    """图片保留在内存中的 sink，每张图片以 {'path', 'data', 'format'} 追加到 images 列表"""
+    def sink(data, base_name, image_counter):
+        fmt = _detect_image_format(data) or 'png'
+        rel_path = f"{image_rel_dir}/{base_name}_img_{image_counter:03d}.{fmt}"
+        images.append({'path': rel_path, 'data': bytes(data), 'format': fmt})
+        return rel_path
+    return sink
+
+
+def _resolve_image_sink(image_sink, image_save_dir, image_rel_dir):
+    """显式传入的 sink 优先；否则有 image_save_dir 时写入目录，都没有时不提取图片"""
+    if image_sink is not None:
+        return image_sink
+    if image_save_dir is not None:
+        return _make_directory_image_sink(image_save_dir, image_rel_dir)
+    return None
+
+
+def _resolve_source_base_name(source, base_name=None):
+    """图片命名用的文档基础名：优先显式传入，其次取路径或文件对象的 name 属性"""
+    if base_name:
+        return base_name
+    name = source if isinstance(source, (str, os.PathLike)) else getattr(source, 'name', None)
+    if isinstance(name, (str, os.PathLike)):
+        return os.path.splitext(os.path.basename(os.fspath(name)))[0] or 'document'
+    return 'document'
+
+
 def _make_image_markdown(rel_path, alt_text=None):
     """生成 Markdown 图片语法"""
     alt = alt_text.strip() if alt_text else "image"
@@ -1035,6 +1334,8 @@ def _check_ooxml_decorative_flag(element, namespaces=None):
     adec_ns = ns.get('adec', 'http://schemas.microsoft.com/office/drawing/2017/decorative')
     for child in element:
         tag = child.tag
+        if not isinstance(tag, str):
+            continue  # lxml 注释 / 处理指令节点
         # 处理带命名空间和不带命名空间两种情况
         if tag == f'{{{adec_ns}}}decorative' or tag.endswith('}decorative'):
             if child.get('val', '0') == '1':
@@ -1043,61 +1344,238 @@ def _check_ooxml_decorative_flag(element, namespaces=None):
 
     return is_decorative, alt_text
 
-def convert_docx(file_path, image_save_dir=None, image_rel_dir=None):
-    """转换 Word 文档，支持标题、格式、列表（含编号/层级）和图片提取"""
-    import docx
+# ==================== 转换缓存 ====================
+
+_CACHE_SIZE_ESTIMATES = {}  # cache_dir -> 当前进程估算的缓存总字节数，避免每次写入都全量扫描
+
+def _get_default_cache_dir():
+    """默认缓存目录，可通过环境变量覆盖"""
+    override = os.environ.get(CACHE_DIR_ENV)
+    if override:
+        return override
+    return os.path.join(_get_user_data_root(), "cache")
+
+def _hash_file(file_path):
+    """分块计算文件内容的 SHA-256，避免一次性读入大文件"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _conversion_cache_key(content_hash, file_ext, extract_images):
+    """缓存键 = (内容哈希, 格式, 是否提取图片, 转换器版本)"""
+    raw = json.dumps([CONVERTER_VERSION, content_hash, file_ext, bool(extract_images)])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def _cache_entry_dir(cache_dir, cache_key):
+    return os.path.join(cache_dir, 'entries', cache_key[:2], cache_key)
+
+def _rebase_extracted_images(markdown_content, extracted_images, old_base_name, new_base_name):
+    """
+    将图片文件名中的文档基础名替换为新基础名，并同步改写 Markdown 中的引用
+
+    Returns:
+        (markdown_content, [(old_rel_path, new_rel_path), ...])
+    """
+    mapping = []
+    old_prefix = f"{old_base_name}_img_"
+    new_prefix = f"{new_base_name}_img_"
+    for rel_path in extracted_images:
+        directory, _, filename = rel_path.rpartition('/')
+        if old_base_name != new_base_name and filename.startswith(old_prefix):
+            filename = new_prefix + filename[len(old_prefix):]
+        new_rel_path = f"{directory}/{filename}" if directory else filename
+        if new_rel_path != rel_path:
+            markdown_content = markdown_content.replace(f"]({rel_path})", f"]({new_rel_path})")
+        mapping.append((rel_path, new_rel_path))
+    return markdown_content, mapping
+
+def _get_directory_size(path):
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                continue
+    return total
+
+def _iter_cache_entries(cache_dir):
+    """遍历缓存条目，产出 (entry_dir, last_access_time)"""
+    entries_root = os.path.join(cache_dir, 'entries')
+    if not os.path.isdir(entries_root):
+        return
+    for shard in os.listdir(entries_root):
+        shard_dir = os.path.join(entries_root, shard)
+        if not os.path.isdir(shard_dir):
+            continue
+        for entry_name in os.listdir(shard_dir):
+            entry_dir = os.path.join(shard_dir, entry_name)
+            try:
+                last_access = os.path.getmtime(os.path.join(entry_dir, 'meta.json'))
+            except OSError:
+                # 没有 meta.json 的残缺条目优先淘汰
+                last_access = 0.0
+            yield entry_dir, last_access
+
+def _evict_conversion_cache(cache_dir, max_bytes):
+    """按最近访问时间（meta.json 的 mtime）淘汰最旧条目，直到缓存总量不超过上限"""
+    entries = []
+    total = 0
+    for entry_dir, last_access in _iter_cache_entries(cache_dir):
+        size = _get_directory_size(entry_dir)
+        entries.append((last_access, entry_dir, size))
+        total += size
+
+    entries.sort()
+    for _last_access, entry_dir, size in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+
+    _CACHE_SIZE_ESTIMATES[cache_dir] = total
+    return total
+
+def _load_cached_conversion(cache_dir, cache_key):
+    """读取缓存条目，命中时刷新访问时间；未命中或条目损坏返回 None"""
+    entry_dir = _cache_entry_dir(cache_dir, cache_key)
+    meta_path = os.path.join(entry_dir, 'meta.json')
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        with open(os.path.join(entry_dir, 'content.md'), 'r', encoding='utf-8') as f:
+            markdown_content = f.read()
+        os.utime(meta_path, None)
+    except (OSError, ValueError):
+        return None
+
+    meta['markdown_content'] = markdown_content
+    meta['entry_dir'] = entry_dir
+    return meta
+
+def _restore_cached_conversion(cached, output_path):
+    """将缓存中的 Markdown 和图片还原到输出位置，图片名按当前文档基础名改写"""
+    base_name = os.path.splitext(os.path.basename(output_path))[0]
+    markdown_content, mapping = _rebase_extracted_images(
+        cached['markdown_content'], cached.get('images', []), cached.get('base_name', base_name), base_name
+    )
 
-    doc = docx.Document(file_path)
-    content = ""
-    num_to_abstract, abstract_levels = _build_docx_numbering_index(doc)
+    extracted_images = []
+    if mapping:
+        image_save_dir, _image_rel_dir = _setup_image_output_dir(output_path)
+        for old_rel_path, new_rel_path in mapping:
+            src = os.path.join(cached['entry_dir'], *old_rel_path.split('/'))
+            dst = os.path.join(image_save_dir, new_rel_path.rpartition('/')[2])
+            shutil.copyfile(src, dst)
+            extracted_images.append(new_rel_path)
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(markdown_content)
+    return markdown_content, extracted_images
+
+def _store_cached_conversion(cache_dir, cache_key, markdown_content, extracted_images, output_path,
+                             warning=None, max_bytes=None):
+    """写入缓存条目：先写临时目录再原子重命名，避免并发 worker 读到半成品"""
+    entry_dir = _cache_entry_dir(cache_dir, cache_key)
+    if os.path.isdir(entry_dir):
+        return
+
+    tmp_dir = os.path.join(cache_dir, 'tmp', f"{os.getpid()}-{uuid.uuid4().hex}")
+    try:
+        os.makedirs(tmp_dir)
+        output_dir = os.path.dirname(output_path)
+        for rel_path in extracted_images:
+            dst = os.path.join(tmp_dir, *rel_path.split('/'))
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copyfile(os.path.join(output_dir, *rel_path.split('/')), dst)
+        with open(os.path.join(tmp_dir, 'content.md'), 'w', encoding='utf-8') as f:
+            f.write(markdown_content)
+        meta = {
+            'converter_version': CONVERTER_VERSION,
+            'base_name': os.path.splitext(os.path.basename(output_path))[0],
+            'images': list(extracted_images),
+            'warning': warning,
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+        os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+        entry_size = _get_directory_size(tmp_dir)
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        logger.debug("Failed to store conversion cache entry: %s", entry_dir, exc_info=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return
+
+    limit = DEFAULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    if cache_dir not in _CACHE_SIZE_ESTIMATES:
+        _evict_conversion_cache(cache_dir, limit)
+        return
+    _CACHE_SIZE_ESTIMATES[cache_dir] += entry_size
+    if _CACHE_SIZE_ESTIMATES[cache_dir] > limit:
+        _evict_conversion_cache(cache_dir, limit)
+
+def _render_docx_table(tbl):
+    """把 w:tbl 元素渲染为 Markdown 表格；使用底层 XML 读取真实网格，避免 python-docx 将合并单元格重复展开"""
+    all_rows_data = []
+    table_grid = getattr(getattr(tbl, "tblGrid", None), "gridCol_lst", None)
+    max_cols = len(table_grid) if table_grid is not None else 0
+
+    for tr in tbl.tr_lst:
+        row_data = []
+        for tc in tr.tc_lst:
+            span = _get_docx_grid_span(tc)
+            cell_text = "" if _is_docx_vertical_merge_continuation(tc) else _extract_docx_table_cell_text(tc)
+            row_data.append(cell_text)
+            if span > 1:
+                row_data.extend([""] * (span - 1))
+        all_rows_data.append(row_data)
+
+    if not max_cols:
+        max_cols = max((len(r) for r in all_rows_data), default=0)
+    if max_cols == 0:
+        return ""
+    return "\n".join(_iter_markdown_table_lines(all_rows_data, max_cols)) + "\n\n"
+
+def _make_docx_block_renderer(resolver, numbering_index, read_image_blob, image_sink, base_name, extracted_images):
+    """
+    构建 DOCX 正文块渲染器，整篇加载（python-docx）与流式读取两条路径共用
+
+    Args:
+        resolver: _new_docx_style_resolver 创建的样式解析缓存
+        numbering_index: (num_to_abstract, abstract_levels)，见 _parse_docx_numbering_xml
+        read_image_blob: rId -> 图片二进制数据，找不到时返回 None
+        image_sink: 图片 sink，None 表示不提取图片
+        base_name: 图片命名用的文档基础名
+        extracted_images: 提取出的图片相对路径追加到此列表
+
+    Returns:
+        render_block(element)：把正文中的 w:p / w:tbl 元素渲染为 Markdown 片段列表，其他元素返回空列表
+    """
+    num_to_abstract, abstract_levels = numbering_index
     numbering_state = {}
     image_counter = 0
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
-    extracted_images = []
 
-    def _extract_drawing_images(paragraph_element):
+    def _extract_drawing_images(drawings):
         """
-        从段落 XML 中提取图片。
-        支持 w:drawing（内联和浮动）以及 mc:AlternateContent 包裹的图片。
+        从段落扫描得到的 w:drawing 元素中提取图片（内联、浮动及 mc:AlternateContent 包裹的图片）
 
         Returns:
             图片 Markdown 字符串列表
         """
         nonlocal image_counter
 
-        if image_save_dir is None:
+        if image_sink is None or not drawings:
             return []
 
         image_markdowns = []
         ns = OOXML_IMAGE_NAMESPACES
 
-        try:
-            p_xml = ET.fromstring(paragraph_element.xml)
-        except (ET.ParseError, AttributeError):
-            return []
-
-        # 查找所有 drawing 元素（直接和通过 mc:AlternateContent 包裹的）
-        drawings = []
-        # 直接 w:drawing
-        for drawing in p_xml.findall('.//w:drawing', ns):
-            drawings.append(drawing)
-        # mc:AlternateContent -> mc:Choice -> w:drawing
-        for alt_content in p_xml.findall('.//mc:AlternateContent', ns):
-            for choice in alt_content.findall('.//mc:Choice', ns):
-                for drawing in choice.findall('.//w:drawing', ns):
-                    if drawing not in drawings:
-                        drawings.append(drawing)
-            # mc:Fallback 中也可能有图片
-            for fallback in alt_content.findall('.//mc:Fallback', ns):
-                for drawing in fallback.findall('.//w:drawing', ns):
-                    if drawing not in drawings:
-                        drawings.append(drawing)
-
         for drawing in drawings:
             # 获取 docPr 以检查装饰性标记和 alt text
-            doc_pr = drawing.find('.//wp:docPr', ns)
-            if doc_pr is None:
-                doc_pr = drawing.find('.//{http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing}docPr')
+            doc_pr = next(drawing.iter(_DOCX_TAG_DOC_PR), None)
 
             is_decorative = False
             alt_text = ""
@@ -1105,7 +1583,7 @@ def convert_docx(file_path, image_save_dir=None, image_rel_dir=None):
                 is_decorative, alt_text = _check_ooxml_decorative_flag(doc_pr, ns)
 
             # 获取图片数据：通过 a:blip 的 r:embed 属性
-            blip = drawing.find('.//a:blip', ns)
+            blip = next(drawing.iter(_DOCX_TAG_BLIP), None)
             if blip is None:
                 continue
 
@@ -1113,12 +1591,8 @@ def convert_docx(file_path, image_save_dir=None, image_rel_dir=None):
             if not embed_id:
                 continue
 
-            # 从 document part 的 related_parts 获取图片数据
             try:
-                image_part = doc.part.related_parts.get(embed_id)
-                if image_part is None:
-                    continue
-                image_data = image_part.blob
+                image_data = read_image_blob(embed_id)
             except Exception:
                 logger.debug("Failed to read DOCX image part: %s", embed_id, exc_info=True)
                 continue
@@ -1132,10 +1606,7 @@ def convert_docx(file_path, image_save_dir=None, image_rel_dir=None):
 
             # 保存图片
             image_counter += 1
-            rel_path = _save_extracted_image(
-                image_data, image_save_dir, image_rel_dir,
-                base_name, image_counter
-            )
+            rel_path = image_sink(image_data, base_name, image_counter)
             if rel_path:
                 extracted_images.append(rel_path)
                 md = _make_image_markdown(rel_path, alt_text)
@@ -1143,7 +1614,7 @@ def convert_docx(file_path, image_save_dir=None, image_rel_dir=None):
 
         return image_markdowns
 
-    def get_numbering_info(para):
+    def get_numbering_info(p, paragraph_format):
         """
         尝试从段落的 numPr / numbering.xml 解析列表信息
 
@@ -1151,7 +1622,9 @@ def convert_docx(file_path, image_save_dir=None, image_rel_dir=None):
             None 或 {'level': int, 'ordered': bool}
         """
         try:
-            num_id, level = _get_docx_paragraph_numpr(para)
+            num_id, level = _get_docx_paragraph_numpr(p)
+            if num_id is None:
+                num_id, level = paragraph_format['numpr']
             if num_id is None:
                 return None
 
@@ -1160,10 +1633,7 @@ def convert_docx(file_path, image_save_dir=None, image_rel_dir=None):
             level_def = levels.get(level) or levels.get(0) or {}
             num_fmt = level_def.get('num_fmt')
 
-            style = getattr(para, "style", None)
-            style_name = getattr(style, "name", "") if style is not None else ""
-            style_id = getattr(style, "style_id", "") if style is not None else ""
-            style_hint = f"{style_name} {style_id}".lower()
+            style_hint = paragraph_format['style_hint']
 
             if (num_fmt or "").lower() == "bullet":
                 ordered = False
@@ -1185,36 +1655,32 @@ def convert_docx(file_path, image_save_dir=None, image_rel_dir=None):
         except Exception:
             return None
 
-    def process_paragraph(para):
-        """处理单个段落，识别标题、列表和格式"""
-        if _is_docx_toc_paragraph(para):
+    def process_paragraph(p, paragraph_format, has_toc_field):
+        """处理单个段落，识别标题、列表和格式；段落样式的格式信息来自 resolver 缓存"""
+        if has_toc_field or paragraph_format['is_toc']:
             return ""
-        if not para.text.strip():
+        paragraph_text = p.text.strip()
+        if not paragraph_text:
             return ""
 
-        style = para.style if hasattr(para, "style") else None
-        style_name = style.name if style else ""
-        style_id = getattr(style, "style_id", "") if style else ""
-        heading_level = _get_docx_heading_level(style)
-        allow_paragraph_style = heading_level is None
+        style_name_str = paragraph_format['style_name']
+        style_id_str = paragraph_format['style_id']
+        heading_level = paragraph_format['heading_level']
 
         # 先拼接富文本（列表项也需要保留粗体/斜体）
         # 将相邻同格式的 run 合并后再添加 Markdown 标记，避免 **text1****text2** 碎片
         groups = []
-        for run in para.runs:
-            text = run.text
+        for r in p.r_lst:
+            text = r.text
             if not text:
                 continue
-            fmt = (
-                _resolve_docx_run_font_flag(run, para, "bold", allow_paragraph_style=allow_paragraph_style),
-                _resolve_docx_run_font_flag(run, para, "italic", allow_paragraph_style=allow_paragraph_style),
-            )
+            fmt = _resolve_docx_run_format(resolver, r, paragraph_format)
             if groups and groups[-1][0] == fmt:
                 groups[-1] = (fmt, groups[-1][1] + text)
             else:
                 groups.append((fmt, text))
         formatted_text = _compose_inline_markdown(groups)
-        text_value = _normalize_text(formatted_text.strip() or para.text.strip())
+        text_value = _normalize_text(formatted_text.strip() or paragraph_text)
         if not text_value:
             return ""
 
@@ -1225,15 +1691,13 @@ def convert_docx(file_path, image_save_dir=None, image_rel_dir=None):
 
         # 检查是否是列表项
         # 优先使用 numPr + numbering.xml 解析列表编号格式与层级
-        numbering_info = get_numbering_info(para)
+        numbering_info = get_numbering_info(p, paragraph_format)
         if numbering_info:
             indent = "    " * numbering_info["level"]
             marker = _render_docx_list_marker(numbering_info, numbering_state)
             return f"{indent}{marker} {text_value}\n"
 
         # 注意：python-docx对列表的支持有限，这里做基本处理（按样式兜底）
-        style_name_str = style_name or ""
-        style_id_str = style_id or ""
         if (isinstance(style_id_str, str) and style_id_str.startswith("List")) or (
             isinstance(style_name_str, str) and style_name_str.startswith("List")
         ):
@@ -1249,61 +1713,189 @@ def convert_docx(file_path, image_save_dir=None, image_rel_dir=None):
 
         return text_value + "\n\n"
 
-    # 处理文档中的所有元素（段落和表格）
-    # 需要按照它们在文档中的顺序处理
-    paragraphs_iter = iter(doc.paragraphs)
-    tables_iter = iter(doc.tables)
+    def render_block(element):
+        tag = element.tag
+        if tag == _DOCX_TAG_P:
+            with _profile_stage('docx.paragraphs'):
+                has_toc_field, drawings = _scan_docx_paragraph(element)
+                paragraph_format = _resolve_docx_paragraph_format(resolver, element)
+                parts = [process_paragraph(element, paragraph_format, has_toc_field)]
+            # 提取段落中的图片
+            with _profile_stage('docx.images'):
+                image_markdowns = _extract_drawing_images(drawings)
+            parts.extend(f"\n{img_md}\n\n" for img_md in image_markdowns)
+            return parts
+
+        if tag == _DOCX_TAG_TBL:
+            with _profile_stage('docx.tables'):
+                table_markdown = _render_docx_table(element)
+            return [table_markdown] if table_markdown else []
+
+        return []
+
+    return render_block
+
+def convert_docx(file_path, image_save_dir=None, image_rel_dir=None, image_sink=None, base_name=None,
+                 streaming=None):
+    """
+    转换 Word 文档，支持标题、格式、列表（含编号/层级）和图片提取
+
+    file_path 可以是路径或二进制文件对象；图片交给 image_sink（默认写入 image_save_dir）。
+    streaming 为 True 时改用 _convert_docx_streaming 增量解析正文，内存占用不随文档长度增长；
+    为 None 时由环境变量 DOCX_STREAMING_ENV 决定（默认关闭）。
+    """
+    base_name = _resolve_source_base_name(file_path, base_name)
+    image_sink = _resolve_image_sink(image_sink, image_save_dir, image_rel_dir)
+    if streaming is None:
+        streaming = os.environ.get(DOCX_STREAMING_ENV, '').strip().lower() in ('1', 'true', 'yes', 'on')
+    if streaming:
+        return _convert_docx_streaming(file_path, image_sink, base_name)
+
+    import docx
+
+    with _profile_stage('docx.open'):
+        doc = docx.Document(file_path)
+    with _profile_stage('docx.numbering_index'):
+        numbering_index = _build_docx_numbering_index(doc)
+
+    def read_image_blob(embed_id):
+        # 从 document part 的 related_parts 获取图片数据
+        image_part = doc.part.related_parts.get(embed_id)
+        return image_part.blob if image_part is not None else None
+
+    extracted_images = []
+    resolver = _new_docx_style_resolver(doc.styles)
+    render_block = _make_docx_block_renderer(
+        resolver, numbering_index, read_image_blob, image_sink, base_name, extracted_images
+    )
+
+    # 按文档顺序单次遍历正文的 lxml 元素：段落的样式、目录标记与图片节点都在这一遍中取得，
+    # 不再经由 doc.paragraphs / doc.tables 列表，也不把元素序列化成 XML 文本重新解析
+    content_parts = []
     for element in doc.element.body:
-        # 处理段落
-        if element.tag.endswith('p'):
-            para = next(paragraphs_iter, None)
-            if para is not None:
-                content += process_paragraph(para)
-                # 提取段落中的图片
-                for img_md in _extract_drawing_images(para._p):
-                    content += f"\n{img_md}\n\n"
-
-        # 处理表格
-        elif element.tag.endswith('tbl'):
-            table = next(tables_iter, None)
-            if table is not None:
-                # 使用底层 XML 读取真实网格，避免 python-docx 将合并单元格重复展开
-                all_rows_data = []
-                table_grid = getattr(getattr(table._tbl, "tblGrid", None), "gridCol_lst", None)
-                max_cols = len(table_grid) if table_grid is not None else 0
-
-                for tr in table._tbl.tr_lst:
-                    row_data = []
-                    for tc in tr.tc_lst:
-                        span = _get_docx_grid_span(tc)
-                        cell_text = "" if _is_docx_vertical_merge_continuation(tc) else _extract_docx_table_cell_text(tc)
-                        row_data.append(cell_text)
-                        if span > 1:
-                            row_data.extend([""] * (span - 1))
-                    all_rows_data.append(row_data)
-
-                if not max_cols:
-                    max_cols = max((len(r) for r in all_rows_data), default=0)
-                if max_cols == 0:
-                    continue
-                for i, row_data in enumerate(all_rows_data):
-                    padded = row_data + [""] * (max_cols - len(row_data))
-                    content += "| " + " | ".join(padded) + " |\n"
-                    if i == 0:
-                        content += "| " + " | ".join(["---"] * max_cols) + " |\n"
-                content += "\n"
+        content_parts.extend(render_block(element))
+
+    _record_docx_style_resolver_stats(resolver)
+    return "".join(content_parts).strip(), extracted_images
+
+def _read_opc_relationships(package, source_part):
+    """
+    读取 zip 包中某个部件的关系文件（如 word/_rels/document.xml.rels）
+
+    Args:
+        package: 已打开的 zipfile.ZipFile
+        source_part: 包内部件路径，'' 表示包本身（_rels/.rels）
+
+    Returns:
+        {rId: (关系类型, 包内目标路径)}；外部链接（TargetMode="External"）不包含在内
+    """
+    source_dir, source_file = posixpath.split(source_part)
+    try:
+        root = ET.fromstring(package.read(posixpath.join(source_dir, '_rels', f'{source_file}.rels')))
+    except (KeyError, ET.ParseError):
+        return {}
+
+    relationships = {}
+    for rel in root.findall(f'{{{_OPC_RELATIONSHIPS_NS}}}Relationship'):
+        target = rel.get('Target')
+        if not target or rel.get('TargetMode') == 'External':
+            continue
+        if target.startswith('/'):
+            target_part = target.lstrip('/')
+        else:
+            target_part = posixpath.normpath(posixpath.join(source_dir, target))
+        relationships[rel.get('Id')] = (rel.get('Type') or '', target_part)
+    return relationships
+
+def _find_opc_relationship_target(relationships, type_suffix):
+    """按关系类型后缀（如 '/styles'）查找目标部件路径，兼容 Transitional / Strict 两种类型 URI"""
+    for rel_type, target_part in relationships.values():
+        if rel_type.endswith(type_suffix):
+            return target_part
+    return None
+
+def _read_zip_member(package, member_name):
+    """读取 zip 成员，不存在时返回 None"""
+    if not member_name:
+        return None
+    try:
+        return package.read(member_name)
+    except KeyError:
+        return None
+
+def _convert_docx_streaming(file_path, image_sink, base_name):
+    """
+    流式转换 DOCX：不构建 python-docx 文档对象，直接从 zip 包中增量解析正文 XML
 
-    return content.strip(), extracted_images
+    样式表和编号定义预先加载一次；正文中的每个段落 / 表格解析完成后立即渲染为 Markdown，
+    随后清除已处理的元素，已解析的 XML 树不随文档长度增长。图片按需从 zip 中读取。
+    渲染逻辑与 convert_docx 共用 _make_docx_block_renderer，输出一致。
 
-def convert_xlsx(file_path, image_save_dir=None, image_rel_dir=None):
-    """转换 Excel 文件，支持多表头、空白分隔区、冻结窗格、常见格式保留和图片提取"""
+    Returns:
+        (markdown_content, extracted_images)
+    """
+    from lxml import etree
+    from docx.oxml.parser import element_class_lookup, parse_xml
+    from docx.styles.styles import Styles
+
+    extracted_images = []
+    content_parts = []
+    with zipfile.ZipFile(file_path) as package:
+        with _profile_stage('docx.open'):
+            document_part = _find_opc_relationship_target(
+                _read_opc_relationships(package, ''), '/officeDocument'
+            ) or 'word/document.xml'
+            document_rels = _read_opc_relationships(package, document_part)
+            styles_xml = _read_zip_member(package, _find_opc_relationship_target(document_rels, '/styles'))
+            styles = Styles(parse_xml(styles_xml or f'<w:styles xmlns:w="{DOCX_W_NS}"/>'))
+        with _profile_stage('docx.numbering_index'):
+            numbering_xml = _read_zip_member(package, _find_opc_relationship_target(document_rels, '/numbering'))
+            numbering_index = _parse_docx_numbering_xml(numbering_xml) if numbering_xml else ({}, {})
+
+        def read_image_blob(embed_id):
+            relationship = document_rels.get(embed_id)
+            return _read_zip_member(package, relationship[1]) if relationship else None
+
+        resolver = _new_docx_style_resolver(styles)
+        render_block = _make_docx_block_renderer(
+            resolver, numbering_index, read_image_blob, image_sink, base_name, extracted_images
+        )
+
+        with package.open(document_part) as document_stream:
+            # 与 python-docx 使用相同的元素类和解析选项，段落 / 表格元素上的 CT_P、CT_Tbl 属性照常可用
+            blocks = etree.iterparse(
+                document_stream, events=('end',), tag=(_DOCX_TAG_P, _DOCX_TAG_TBL),
+                remove_blank_text=True, resolve_entities=False,
+            )
+            blocks.set_element_class_lookup(element_class_lookup)
+            for _event, element in blocks:
+                body = element.getparent()
+                if body is None or body.tag != _DOCX_TAG_BODY:
+                    continue  # 表格单元格等内部的段落随所在的正文块一起渲染
+                content_parts.extend(render_block(element))
+                # 释放已处理的正文块（包括其前面未渲染的 w:sdt 等兄弟节点）
+                element.clear()
+                while element.getprevious() is not None:
+                    del body[0]
+
+    _record_docx_style_resolver_stats(resolver)
+    return "".join(content_parts).strip(), extracted_images
+
+def convert_xlsx(file_path, image_save_dir=None, image_rel_dir=None, image_sink=None, base_name=None):
+    """
+    转换 Excel 文件，支持多表头、空白分隔区、冻结窗格、常见格式保留和图片提取
+
+    file_path 可以是路径或二进制文件对象；图片交给 image_sink（默认写入 image_save_dir）。
+    """
     import openpyxl
     from datetime import date, datetime, time
 
-    workbook = openpyxl.load_workbook(file_path, data_only=True)
-    content = ""
+    with _profile_stage('xlsx.open'):
+        workbook = openpyxl.load_workbook(file_path, data_only=True)
+    content_parts = []
     image_counter = 0
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    base_name = _resolve_source_base_name(file_path, base_name)
+    image_sink = _resolve_image_sink(image_sink, image_save_dir, image_rel_dir)
     extracted_images = []
 
     def _build_merge_map(worksheet):
@@ -1585,105 +2177,110 @@ def convert_xlsx(file_path, image_save_dir=None, image_rel_dir=None):
     try:
         for sheet_name in workbook.sheetnames:
             if len(workbook.sheetnames) > 1:
-                content += f"## {_normalize_text(sheet_name)}\n\n"
-
-            worksheet = workbook[sheet_name]
-            merge_map = _build_merge_map(worksheet)
-            freeze_header_rows = _get_freeze_header_rows(worksheet)
-            table_blocks = []
-
-            for row_group in _iter_table_row_groups(worksheet, merge_map):
-                for col_start, col_end in _split_column_segments(row_group):
-                    table_rows = _slice_table_rows(row_group, col_start, col_end)
-                    if not table_rows:
-                        continue
-                    table_markdown = _render_table_block(table_rows, freeze_header_rows)
-                    if table_markdown:
-                        table_blocks.append(table_markdown)
+                content_parts.append(f"## {_normalize_text(sheet_name)}\n\n")
+
+            with _profile_stage('xlsx.sheet'):
+                worksheet = workbook[sheet_name]
+                merge_map = _build_merge_map(worksheet)
+                freeze_header_rows = _get_freeze_header_rows(worksheet)
+                table_blocks = []
+
+                for row_group in _iter_table_row_groups(worksheet, merge_map):
+                    for col_start, col_end in _split_column_segments(row_group):
+                        table_rows = _slice_table_rows(row_group, col_start, col_end)
+                        if not table_rows:
+                            continue
+                        table_markdown = _render_table_block(table_rows, freeze_header_rows)
+                        if table_markdown:
+                            table_blocks.append(table_markdown)
 
-            if len(table_blocks) == 1:
-                content += table_blocks[0] + "\n\n"
-            elif len(table_blocks) > 1:
-                for idx, table_markdown in enumerate(table_blocks, 1):
-                    content += f"### Table {idx}\n\n{table_markdown}\n\n"
+                if len(table_blocks) == 1:
+                    content_parts.append(table_blocks[0] + "\n\n")
+                elif len(table_blocks) > 1:
+                    for idx, table_markdown in enumerate(table_blocks, 1):
+                        content_parts.append(f"### Table {idx}\n\n{table_markdown}\n\n")
 
             # 提取 worksheet 中的嵌入图片
-            if image_save_dir is not None:
-                try:
-                    ws_images = getattr(worksheet, '_images', []) or []
-                    # 按锚定行号排序
-                    sorted_images = []
-                    for img_obj in ws_images:
-                        try:
-                            anchor = getattr(img_obj, 'anchor', None)
-                            anchor_from = getattr(anchor, '_from', None) if anchor else None
-                            row = getattr(anchor_from, 'row', 0) if anchor_from else 0
-                            col = getattr(anchor_from, 'col', 0) if anchor_from else 0
-                            sorted_images.append((row, col, img_obj))
-                        except Exception:
-                            logger.debug("Failed to read XLSX image anchor; falling back to default order", exc_info=True)
-                            sorted_images.append((0, 0, img_obj))
-                    sorted_images.sort(key=lambda x: (x[0], x[1]))
-
-                    for _row, _col, img_obj in sorted_images:
-                        try:
-                            # 获取图片数据
-                            img_ref = getattr(img_obj, 'ref', None) or getattr(img_obj, '_data', None)
-                            image_data = None
-                            if img_ref is not None:
-                                # openpyxl Image 对象的图片数据
-                                if hasattr(img_ref, 'read'):
-                                    img_ref.seek(0)
-                                    image_data = img_ref.read()
-                                elif isinstance(img_ref, bytes):
-                                    image_data = img_ref
-                            # 回退：尝试从 _data 属性读取
-                            if image_data is None and hasattr(img_obj, '_data'):
-                                raw = img_obj._data
-                                if callable(raw):
-                                    raw = raw()
-                                if isinstance(raw, bytes):
-                                    image_data = raw
-                                elif hasattr(raw, 'read'):
-                                    raw.seek(0)
-                                    image_data = raw.read()
-
-                            if not image_data:
-                                continue
-
-                            # 装饰性过滤
-                            if _is_decorative_image(image_data):
+            if image_sink is not None:
+                with _profile_stage('xlsx.images'):
+                    try:
+                        ws_images = getattr(worksheet, '_images', []) or []
+                        # 按锚定行号排序
+                        sorted_images = []
+                        for img_obj in ws_images:
+                            try:
+                                anchor = getattr(img_obj, 'anchor', None)
+                                anchor_from = getattr(anchor, '_from', None) if anchor else None
+                                row = getattr(anchor_from, 'row', 0) if anchor_from else 0
+                                col = getattr(anchor_from, 'col', 0) if anchor_from else 0
+                                sorted_images.append((row, col, img_obj))
+                            except Exception:
+                                logger.debug("Failed to read XLSX image anchor; falling back to default order", exc_info=True)
+                                sorted_images.append((0, 0, img_obj))
+                        sorted_images.sort(key=lambda x: (x[0], x[1]))
+
+                        for _row, _col, img_obj in sorted_images:
+                            try:
+                                # 获取图片数据
+                                img_ref = getattr(img_obj, 'ref', None) or getattr(img_obj, '_data', None)
+                                image_data = None
+                                if img_ref is not None:
+                                    # openpyxl Image 对象的图片数据
+                                    if hasattr(img_ref, 'read'):
+                                        img_ref.seek(0)
+                                        image_data = img_ref.read()
+                                    elif isinstance(img_ref, bytes):
+                                        image_data = img_ref
+                                # 回退：尝试从 _data 属性读取
+                                if image_data is None and hasattr(img_obj, '_data'):
+                                    raw = img_obj._data
+                                    if callable(raw):
+                                        raw = raw()
+                                    if isinstance(raw, bytes):
+                                        image_data = raw
+                                    elif hasattr(raw, 'read'):
+                                        raw.seek(0)
+                                        image_data = raw.read()
+
+                                if not image_data:
+                                    continue
+
+                                # 装饰性过滤
+                                if _is_decorative_image(image_data):
+                                    continue
+
+                                image_counter += 1
+                                rel_path = image_sink(image_data, base_name, image_counter)
+                                if rel_path:
+                                    extracted_images.append(rel_path)
+                                    content_parts.append(f"{_make_image_markdown(rel_path)}\n\n")
+                            except Exception:
+                                logger.debug("Failed to extract an XLSX embedded image; skipping it", exc_info=True)
                                 continue
-
-                            image_counter += 1
-                            rel_path = _save_extracted_image(
-                                image_data, image_save_dir, image_rel_dir,
-                                base_name, image_counter
-                            )
-                            if rel_path:
-                                extracted_images.append(rel_path)
-                                content += f"{_make_image_markdown(rel_path)}\n\n"
-                        except Exception:
-                            logger.debug("Failed to extract an XLSX embedded image; skipping it", exc_info=True)
-                            continue
-                except Exception:
-                    logger.debug("Failed to inspect XLSX worksheet images; continuing without them", exc_info=True)
+                    except Exception:
+                        logger.debug("Failed to inspect XLSX worksheet images; continuing without them", exc_info=True)
     finally:
         workbook.close()
 
-    return content.strip(), extracted_images
+    return "".join(content_parts).strip(), extracted_images
+
+def convert_pptx(file_path, image_save_dir=None, image_rel_dir=None, image_sink=None, base_name=None):
+    """
+    转换 PowerPoint 文件，提取标题、正文、表格、图表、图片和备注
 
-def convert_pptx(file_path, image_save_dir=None, image_rel_dir=None):
-    """转换 PowerPoint 文件，提取标题、正文、表格、图表、图片和备注"""
+    file_path 可以是路径或二进制文件对象；图片交给 image_sink（默认写入 image_save_dir）。
+    """
     import pptx
     from pptx.enum.shapes import MSO_SHAPE_TYPE, PP_PLACEHOLDER
 
-    presentation = pptx.Presentation(file_path)
-    content = ""
+    with _profile_stage('pptx.open'):
+        presentation = pptx.Presentation(file_path)
+    content_parts = []
     slide_width = presentation.slide_width
     slide_height = presentation.slide_height
     image_counter = 0
-    base_name = os.path.splitext(os.path.basename(file_path))[0]
+    base_name = _resolve_source_base_name(file_path, base_name)
+    image_sink = _resolve_image_sink(image_sink, image_save_dir, image_rel_dir)
     extracted_images = []
 
     def _resolve_pptx_run_font_flag(run, paragraph, attr_name, *, allow_paragraph_style=False):
@@ -1701,7 +2298,7 @@ def convert_pptx(file_path, image_save_dir=None, image_rel_dir=None):
 
     def _process_text_frame(text_frame, role="body"):
         """处理文本框，保留段落层级和格式"""
-        result = ""
+        lines = []
         for para in text_frame.paragraphs:
             if not para.text.strip():
                 continue
@@ -1728,28 +2325,28 @@ def convert_pptx(file_path, image_save_dir=None, image_rel_dir=None):
                 continue
 
             if role == "title":
-                result += f"### {text_value}\n\n"
+                lines.append(f"### {text_value}\n\n")
                 continue
 
             if role == "subtitle":
-                result += _escape_plain_markdown_text(text_value) + "\n\n"
+                lines.append(_escape_plain_markdown_text(text_value) + "\n\n")
                 continue
 
             # 检查列表层级
             level = para.level if para.level else 0
             if level > 0:
                 indent = "  " * level
-                result += f"{indent}- {text_value}\n"
+                lines.append(f"{indent}- {text_value}\n")
             elif hasattr(para, '_pPr') and para._pPr is not None and para._pPr.find(
                 './/{http://schemas.openxmlformats.org/drawingml/2006/main}buChar') is not None:
-                result += f"- {text_value}\n"
+                lines.append(f"- {text_value}\n")
             elif hasattr(para, '_pPr') and para._pPr is not None and para._pPr.find(
                 './/{http://schemas.openxmlformats.org/drawingml/2006/main}buAutoNum') is not None:
-                result += f"1. {text_value}\n"
+                lines.append(f"1. {text_value}\n")
             else:
-                result += text_value + "\n\n"
+                lines.append(text_value + "\n\n")
 
-        return result
+        return "".join(lines)
 
     def _iter_shapes(shapes):
         for shape in shapes:
@@ -1798,7 +2395,9 @@ def convert_pptx(file_path, image_save_dir=None, image_rel_dir=None):
         for row in table.rows:
             row_data = []
             seen_cells = set()
-            for cell in row.cells:
+            # 先保留整行的单元格对象：逐个迭代时临时对象被回收，id 可能被复用而误判为重复
+            row_cells = list(row.cells)
+            for cell in row_cells:
                 cell_id = id(cell)
                 if cell_id in seen_cells:
                     continue
@@ -1810,13 +2409,7 @@ def convert_pptx(file_path, image_save_dir=None, image_rel_dir=None):
         if max_cols == 0:
             return ""
 
-        content_part = ""
-        for idx, row_data in enumerate(all_rows_data):
-            padded = row_data + [""] * (max_cols - len(row_data))
-            content_part += "| " + " | ".join(padded) + " |\n"
-            if idx == 0:
-                content_part += "| " + " | ".join(["---"] * max_cols) + " |\n"
-        return content_part.strip()
+        return "\n".join(_iter_markdown_table_lines(all_rows_data, max_cols)).strip()
 
     def _render_chart_markdown(chart):
         lines = []
@@ -1944,194 +2537,192 @@ def convert_pptx(file_path, image_save_dir=None, image_rel_dir=None):
         return "\n\n".join(entry["markdown"].strip() for entry in ordered_entries if entry["markdown"].strip()).strip()
 
     for i, slide in enumerate(presentation.slides, 1):
-        slide_parts = []
-        if len(presentation.slides) > 1:
-            slide_parts.append(f"## Slide {i}")
-
-        entries = []
-
-        for shape in _iter_shapes(slide.shapes):
-            bounds = _shape_bounds(shape)
-            placeholder_type = _get_placeholder_type(shape)
-            entry = {
-                "shape": shape,
-                "kind": None,
-                "role": "body",
-                "markdown": "",
-                "raw_text": "",
-                "placeholder_type": placeholder_type,
-                **bounds,
-            }
+        with _profile_stage('pptx.slide', page=i):
+            slide_parts = []
+            if len(presentation.slides) > 1:
+                slide_parts.append(f"## Slide {i}")
+
+            entries = []
+
+            for shape in _iter_shapes(slide.shapes):
+                bounds = _shape_bounds(shape)
+                placeholder_type = _get_placeholder_type(shape)
+                entry = {
+                    "shape": shape,
+                    "kind": None,
+                    "role": "body",
+                    "markdown": "",
+                    "raw_text": "",
+                    "placeholder_type": placeholder_type,
+                    **bounds,
+                }
 
-            if getattr(shape, "has_table", False):
-                entry["kind"] = "table"
-                entry["markdown"] = _render_table_markdown(shape.table)
-            elif getattr(shape, "has_chart", False):
-                entry["kind"] = "chart"
-                entry["markdown"] = _render_chart_markdown(shape.chart)
-            elif getattr(shape, "shape_type", None) == MSO_SHAPE_TYPE.PICTURE:
-                entry["kind"] = "picture"
-                # 提取图片数据和元数据
-                entry["image_path"] = None
-                entry["image_alt"] = ""
-                if image_save_dir is not None:
-                    try:
-                        image_data = shape.image.blob
-                        # 检查装饰性标记：通过 shape XML 中的 cNvPr
-                        is_decorative = False
-                        alt_text = ""
+                if getattr(shape, "has_table", False):
+                    entry["kind"] = "table"
+                    entry["markdown"] = _render_table_markdown(shape.table)
+                elif getattr(shape, "has_chart", False):
+                    entry["kind"] = "chart"
+                    entry["markdown"] = _render_chart_markdown(shape.chart)
+                elif getattr(shape, "shape_type", None) == MSO_SHAPE_TYPE.PICTURE:
+                    entry["kind"] = "picture"
+                    # 提取图片数据和元数据
+                    entry["image_path"] = None
+                    entry["image_alt"] = ""
+                    if image_sink is not None:
                         try:
-                            sp_xml = ET.fromstring(shape._element.xml)
-                            # PPTX 中 cNvPr 可能在 p:nvPicPr/p:cNvPr 或 nvSpPr/cNvPr
-                            cnv_pr = sp_xml.find('.//{http://schemas.openxmlformats.org/presentationml/2006/main}cNvPr')
-                            if cnv_pr is None:
-                                cnv_pr = sp_xml.find('.//{http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing}cNvPr')
-                            if cnv_pr is None:
-                                # 用更通用的查找
-                                for elem in sp_xml.iter():
-                                    if elem.tag.endswith('}cNvPr') or elem.tag == 'cNvPr':
-                                        cnv_pr = elem
-                                        break
-                            if cnv_pr is not None:
-                                is_decorative, alt_text = _check_ooxml_decorative_flag(cnv_pr)
-                        except (AttributeError, ET.ParseError, TypeError):
-                            logger.debug("Failed to parse PPTX picture metadata; continuing without decorative flag", exc_info=True)
-
-                        # 检查是否为背景图（覆盖面积 >= 90% 幻灯片）
-                        is_background = False
-                        if slide_width and slide_height:
-                            shape_area = entry["width"] * entry["height"]
-                            slide_area = slide_width * slide_height
-                            if slide_area > 0 and shape_area / slide_area >= PPTX_BACKGROUND_COVERAGE_RATIO:
-                                is_background = True
-
-                        if not _is_decorative_image(
-                            image_data,
-                            is_decorative_flag=is_decorative,
-                            is_pptx_background=is_background
-                        ):
-                            image_counter += 1
-                            rel_path = _save_extracted_image(
-                                image_data, image_save_dir, image_rel_dir,
-                                base_name, image_counter
-                            )
-                            if rel_path:
-                                extracted_images.append(rel_path)
-                                entry["image_path"] = rel_path
-                                entry["image_alt"] = alt_text
-                    except Exception:
-                        logger.debug("Failed to extract a PPTX picture; skipping it", exc_info=True)
-            elif getattr(shape, "shape_type", None) == MSO_SHAPE_TYPE.DIAGRAM:
-                entry["kind"] = "diagram"
-                entry["markdown"] = _render_diagram_markdown(shape)
-            elif getattr(shape, "has_text_frame", False) and getattr(shape, "text", "").strip():
-                entry["kind"] = "text"
-                entry["raw_text"] = _normalize_text(shape.text, preserve_newlines=True)
-                if _shape_is_title(shape):
-                    entry["role"] = "title"
-                elif placeholder_type == PP_PLACEHOLDER.SUBTITLE:
-                    entry["role"] = "subtitle"
-                elif placeholder_type in (PP_PLACEHOLDER.FOOTER, PP_PLACEHOLDER.DATE, PP_PLACEHOLDER.SLIDE_NUMBER):
-                    entry["role"] = "footer"
-                entry["markdown"] = _process_text_frame(shape.text_frame, role="title" if entry["role"] == "title" else "body")
-            else:
-                continue
+                            image_data = shape.image.blob
+                            # 检查装饰性标记：通过 shape XML 中的 cNvPr
+                            is_decorative = False
+                            alt_text = ""
+                            try:
+                                sp_xml = ET.fromstring(shape._element.xml)
+                                # PPTX 中 cNvPr 可能在 p:nvPicPr/p:cNvPr 或 nvSpPr/cNvPr
+                                cnv_pr = sp_xml.find('.//{http://schemas.openxmlformats.org/presentationml/2006/main}cNvPr')
+                                if cnv_pr is None:
+                                    cnv_pr = sp_xml.find('.//{http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing}cNvPr')
+                                if cnv_pr is None:
+                                    # 用更通用的查找
+                                    for elem in sp_xml.iter():
+                                        if elem.tag.endswith('}cNvPr') or elem.tag == 'cNvPr':
+                                            cnv_pr = elem
+                                            break
+                                if cnv_pr is not None:
+                                    is_decorative, alt_text = _check_ooxml_decorative_flag(cnv_pr)
+                            except (AttributeError, ET.ParseError, TypeError):
+                                logger.debug("Failed to parse PPTX picture metadata; continuing without decorative flag", exc_info=True)
+
+                            # 检查是否为背景图（覆盖面积 >= 90% 幻灯片）
+                            is_background = False
+                            if slide_width and slide_height:
+                                shape_area = entry["width"] * entry["height"]
+                                slide_area = slide_width * slide_height
+                                if slide_area > 0 and shape_area / slide_area >= PPTX_BACKGROUND_COVERAGE_RATIO:
+                                    is_background = True
+
+                            if not _is_decorative_image(
+                                image_data,
+                                is_decorative_flag=is_decorative,
+                                is_pptx_background=is_background
+                            ):
+                                image_counter += 1
+                                rel_path = image_sink(image_data, base_name, image_counter)
+                                if rel_path:
+                                    extracted_images.append(rel_path)
+                                    entry["image_path"] = rel_path
+                                    entry["image_alt"] = alt_text
+                        except Exception:
+                            logger.debug("Failed to extract a PPTX picture; skipping it", exc_info=True)
+                elif getattr(shape, "shape_type", None) == MSO_SHAPE_TYPE.DIAGRAM:
+                    entry["kind"] = "diagram"
+                    entry["markdown"] = _render_diagram_markdown(shape)
+                elif getattr(shape, "has_text_frame", False) and getattr(shape, "text", "").strip():
+                    entry["kind"] = "text"
+                    entry["raw_text"] = _normalize_text(shape.text, preserve_newlines=True)
+                    if _shape_is_title(shape):
+                        entry["role"] = "title"
+                    elif placeholder_type == PP_PLACEHOLDER.SUBTITLE:
+                        entry["role"] = "subtitle"
+                    elif placeholder_type in (PP_PLACEHOLDER.FOOTER, PP_PLACEHOLDER.DATE, PP_PLACEHOLDER.SLIDE_NUMBER):
+                        entry["role"] = "footer"
+                    entry["markdown"] = _process_text_frame(shape.text_frame, role="title" if entry["role"] == "title" else "body")
+                else:
+                    continue
 
-            if entry["markdown"] or entry["kind"] in {"picture"}:
-                entries.append(entry)
+                if entry["markdown"] or entry["kind"] in {"picture"}:
+                    entries.append(entry)
 
-        entries.sort(key=_shape_sort_key)
+            entries.sort(key=_shape_sort_key)
 
-        title_entries = [entry for entry in entries if entry["role"] == "title"]
-        subtitle_entries = [entry for entry in entries if entry["role"] == "subtitle"]
+            title_entries = [entry for entry in entries if entry["role"] == "title"]
+            subtitle_entries = [entry for entry in entries if entry["role"] == "subtitle"]
 
-        if not title_entries:
-            for entry in entries:
-                if _looks_like_title_candidate(entry):
-                    entry["role"] = "title"
-                    entry["markdown"] = _process_text_frame(entry["shape"].text_frame, role="title")
-                    title_entries.append(entry)
-                    break
+            if not title_entries:
+                for entry in entries:
+                    if _looks_like_title_candidate(entry):
+                        entry["role"] = "title"
+                        entry["markdown"] = _process_text_frame(entry["shape"].text_frame, role="title")
+                        title_entries.append(entry)
+                        break
 
-        if title_entries and not subtitle_entries:
-            title_anchor = sorted(title_entries, key=_shape_sort_key)[0]
-            for entry in entries:
-                if entry["role"] == "body" and _looks_like_subtitle_candidate(entry, title_anchor):
-                    entry["role"] = "subtitle"
-                    subtitle_entries.append(entry)
-                    break
+            if title_entries and not subtitle_entries:
+                title_anchor = sorted(title_entries, key=_shape_sort_key)[0]
+                for entry in entries:
+                    if entry["role"] == "body" and _looks_like_subtitle_candidate(entry, title_anchor):
+                        entry["role"] = "subtitle"
+                        subtitle_entries.append(entry)
+                        break
 
-        for entry in entries:
-            if entry["role"] == "body" and _is_footer_candidate(entry):
-                entry["role"] = "footer"
-
-        for entry in [entry for entry in entries if entry["kind"] == "picture"]:
-            caption_entry = _find_picture_caption(entries, entry)
-            caption_text = caption_entry["raw_text"] if caption_entry else None
-            if caption_entry is not None:
-                caption_entry["consumed"] = True
-            entry["markdown"] = _render_picture_markdown(
-                caption_text=caption_text,
-                image_path=entry.get("image_path"),
-                alt_text=entry.get("image_alt")
-            )
+            for entry in entries:
+                if entry["role"] == "body" and _is_footer_candidate(entry):
+                    entry["role"] = "footer"
 
-        title_entries = sorted([entry for entry in entries if entry["role"] == "title"], key=_shape_sort_key)
-        subtitle_entries = sorted([entry for entry in entries if entry["role"] == "subtitle"], key=_shape_sort_key)
-        footer_entries = sorted([entry for entry in entries if entry["role"] == "footer"], key=_shape_sort_key)
-        body_entries = [
-            entry for entry in entries
-            if entry["role"] == "body" and not entry.get("consumed") and entry["kind"] in {"text", "table"}
-        ]
-        visual_entries = [
-            entry for entry in entries
-            if entry["kind"] in {"chart", "picture", "diagram"} and entry.get("markdown")
-        ]
+            for entry in [entry for entry in entries if entry["kind"] == "picture"]:
+                caption_entry = _find_picture_caption(entries, entry)
+                caption_text = caption_entry["raw_text"] if caption_entry else None
+                if caption_entry is not None:
+                    caption_entry["consumed"] = True
+                entry["markdown"] = _render_picture_markdown(
+                    caption_text=caption_text,
+                    image_path=entry.get("image_path"),
+                    alt_text=entry.get("image_alt")
+                )
 
-        for entry in title_entries:
-            if entry["markdown"].strip():
-                slide_parts.append(entry["markdown"].strip())
-
-        if subtitle_entries:
-            subtitle_body = "\n\n".join(
-                _process_text_frame(entry["shape"].text_frame, role="subtitle").strip()
-                for entry in subtitle_entries
-                if _process_text_frame(entry["shape"].text_frame, role="subtitle").strip()
-            ).strip()
-            if subtitle_body:
-                slide_parts.append("#### Subtitle\n\n" + subtitle_body)
-
-        body_markdown = _render_body_entries(body_entries)
-        if body_markdown:
-            slide_parts.append(body_markdown)
-
-        if visual_entries:
-            visuals_body = "\n\n".join(entry["markdown"].strip() for entry in sorted(visual_entries, key=_shape_sort_key) if entry["markdown"].strip())
-            if visuals_body:
-                slide_parts.append("#### Visuals\n\n" + visuals_body)
-
-        if footer_entries:
-            footer_body = "\n\n".join(
-                _process_text_frame(entry["shape"].text_frame, role="subtitle").strip()
-                for entry in footer_entries
-                if _process_text_frame(entry["shape"].text_frame, role="subtitle").strip()
-            ).strip()
-            if footer_body:
-                slide_parts.append("#### Footer\n\n" + footer_body)
-
-        if slide.has_notes_slide and slide.notes_slide.notes_text_frame:
-            notes_text = _normalize_text(slide.notes_slide.notes_text_frame.text, preserve_newlines=True)
-            if notes_text:
-                slide_parts.append(f"### Notes\n\n{notes_text}")
-
-        slide_content = "\n\n".join(part.strip() for part in slide_parts if part and part.strip()).strip()
-        if slide_content:
-            content += slide_content
-
-        if i < len(presentation.slides):
-            content += "---\n\n"
-
-    return content.strip(), extracted_images
+            title_entries = sorted([entry for entry in entries if entry["role"] == "title"], key=_shape_sort_key)
+            subtitle_entries = sorted([entry for entry in entries if entry["role"] == "subtitle"], key=_shape_sort_key)
+            footer_entries = sorted([entry for entry in entries if entry["role"] == "footer"], key=_shape_sort_key)
+            body_entries = [
+                entry for entry in entries
+                if entry["role"] == "body" and not entry.get("consumed") and entry["kind"] in {"text", "table"}
+            ]
+            visual_entries = [
+                entry for entry in entries
+                if entry["kind"] in {"chart", "picture", "diagram"} and entry.get("markdown")
+            ]
+
+            for entry in title_entries:
+                if entry["markdown"].strip():
+                    slide_parts.append(entry["markdown"].strip())
+
+            if subtitle_entries:
+                subtitle_body = "\n\n".join(
+                    _process_text_frame(entry["shape"].text_frame, role="subtitle").strip()
+                    for entry in subtitle_entries
+                    if _process_text_frame(entry["shape"].text_frame, role="subtitle").strip()
+                ).strip()
+                if subtitle_body:
+                    slide_parts.append("#### Subtitle\n\n" + subtitle_body)
+
+            body_markdown = _render_body_entries(body_entries)
+            if body_markdown:
+                slide_parts.append(body_markdown)
+
+            if visual_entries:
+                visuals_body = "\n\n".join(entry["markdown"].strip() for entry in sorted(visual_entries, key=_shape_sort_key) if entry["markdown"].strip())
+                if visuals_body:
+                    slide_parts.append("#### Visuals\n\n" + visuals_body)
+
+            if footer_entries:
+                footer_body = "\n\n".join(
+                    _process_text_frame(entry["shape"].text_frame, role="subtitle").strip()
+                    for entry in footer_entries
+                    if _process_text_frame(entry["shape"].text_frame, role="subtitle").strip()
+                ).strip()
+                if footer_body:
+                    slide_parts.append("#### Footer\n\n" + footer_body)
+
+            if slide.has_notes_slide and slide.notes_slide.notes_text_frame:
+                notes_text = _normalize_text(slide.notes_slide.notes_text_frame.text, preserve_newlines=True)
+                if notes_text:
+                    slide_parts.append(f"### Notes\n\n{notes_text}")
+
+            slide_content = "\n\n".join(part.strip() for part in slide_parts if part and part.strip()).strip()
+            if slide_content:
+                content_parts.append(slide_content)
+
+            if i < len(presentation.slides):
+                content_parts.append("---\n\n")
+
+    return "".join(content_parts).strip(), extracted_images
 
 def _render_pdf_table(table_obj):
     """将 pdfplumber 表格对象渲染为 Markdown 表格字符串"""
@@ -2146,14 +2737,14 @@ def _render_pdf_table(table_obj):
     if not filtered_table:
         return ""
     max_cols = max(len(r) for r in filtered_table)
-    normalized = [r + [""] * (max_cols - len(r)) for r in filtered_table]
-    result = ""
-    for idx, row in enumerate(normalized):
-        result += "| " + " | ".join(row) + " |\n"
-        if idx == 0:
-            result += "| " + " | ".join(["---"] * len(row)) + " |\n"
-    result += "\n"
-    return result
+    return "\n".join(_iter_markdown_table_lines(filtered_table, max_cols)) + "\n\n"
+
+def _iter_markdown_table_lines(rows, col_count):
+    """逐行产出 Markdown 表格行（不含换行），首行之后插入分隔行；不足 col_count 列的行补空单元格"""
+    for index, row in enumerate(rows):
+        yield "| " + " | ".join(list(row) + [""] * (col_count - len(row))) + " |"
+        if index == 0:
+            yield "| " + " | ".join(["---"] * col_count) + " |"
 
 # ---------- PDF 词元级文本重建辅助函数 ----------
 
@@ -2482,11 +3073,12 @@ def _extract_pdf_page_blocks(page, tables):
 
     # 使用词元提取（修复空格丢失）
     # x_tolerance=2: 学术 PDF（LaTeX）词间距约 2.7pt，默认值 3 会把相邻词粘连
-    try:
-        words = filtered_page.extract_words(x_tolerance=2, y_tolerance=3, keep_blank_chars=False)
-    except TypeError:
-        # 旧版 pdfplumber 不支持 keep_blank_chars 参数
-        words = filtered_page.extract_words(x_tolerance=2, y_tolerance=3)
+    with _profile_stage('pdf.extract_words'):
+        try:
+            words = filtered_page.extract_words(x_tolerance=2, y_tolerance=3, keep_blank_chars=False)
+        except TypeError:
+            # 旧版 pdfplumber 不支持 keep_blank_chars 参数
+            words = filtered_page.extract_words(x_tolerance=2, y_tolerance=3)
 
     # 过滤旋转文字（如 arXiv 水印），保留 upright（正向）词元
     words = [w for w in words if w.get('upright', 1)]
@@ -2518,9 +3110,10 @@ def _extract_pdf_page_blocks(page, tables):
         right_lines = _group_words_into_lines(right_words)
         spanning_lines = _group_words_into_lines(spanning_words)
 
-        left_blocks = _lines_to_markdown_blocks(left_lines, left_chars, body_size)
-        right_blocks = _lines_to_markdown_blocks(right_lines, right_chars, body_size)
-        spanning_blocks = _lines_to_markdown_blocks(spanning_lines, spanning_chars, body_size)
+        with _profile_stage('pdf.lines_to_blocks'):
+            left_blocks = _lines_to_markdown_blocks(left_lines, left_chars, body_size)
+            right_blocks = _lines_to_markdown_blocks(right_lines, right_chars, body_size)
+            spanning_blocks = _lines_to_markdown_blocks(spanning_lines, spanning_chars, body_size)
 
         left_max = max((top for top, _ in left_blocks), default=0.0)
         offset = left_max + page.height
@@ -2531,37 +3124,25 @@ def _extract_pdf_page_blocks(page, tables):
         blocks.extend(right_shifted)
     else:
         lines = _group_words_into_lines(words)
-        text_blocks = _lines_to_markdown_blocks(lines, page_chars, body_size)
+        with _profile_stage('pdf.lines_to_blocks'):
+            text_blocks = _lines_to_markdown_blocks(lines, page_chars, body_size)
         blocks.extend(text_blocks)
 
     blocks.sort(key=lambda b: b[0])
     return blocks
 
 def convert_pdf(file_path):
-    """转换 PDF 文件，支持文本和表格提取，按页面位置交错输出"""
+    """转换 PDF 文件（路径或二进制文件对象），支持文本和表格提取，按页面位置交错输出"""
     import pdfplumber
 
     content_parts = []
     page_errors = []
-    with pdfplumber.open(file_path) as pdf:
+    with _profile_stage('pdf.open'):
+        pdf_document = pdfplumber.open(file_path)
+    with pdf_document as pdf:
         for page_number, page in enumerate(pdf.pages, 1):
-            try:
-                tables = page.find_tables()
-                blocks = _extract_pdf_page_blocks(page, tables)
-            except Exception as exc:
-                page_errors.append((page_number, str(exc)))
-                try:
-                    fallback_text = _normalize_text(page.extract_text(), preserve_newlines=True)
-                except Exception:
-                    fallback_text = ""
-                if not fallback_text:
-                    continue
-                blocks = [(0.0, "\n".join(_escape_plain_markdown_text(line) for line in fallback_text.splitlines()) + "\n\n")]
-
-            if not blocks:
-                continue
-
-            page_content = "".join(block_content for _, block_content in blocks).strip()
+            with _profile_stage('pdf.page', page=page_number):
+                page_content = _convert_pdf_page(page, page_number, page_errors)
             if not page_content:
                 continue
 
@@ -2574,33 +3155,112 @@ def convert_pdf(file_path):
     if not content and page_errors:
         page_numbers = ", ".join(str(page_number) for page_number, _ in page_errors)
         raise ValueError(f"PDF 解析失败，无法提取任何内容。异常页码: {page_numbers}")
-    return _postprocess_pdf_academic_sections(content)
+    with _profile_stage('pdf.postprocess'):
+        return _postprocess_pdf_academic_sections(content)
+
+def _convert_pdf_page(page, page_number, page_errors):
+    """转换单个 PDF 页面，返回页面 Markdown；解析失败时记录到 page_errors 并回退到纯文本"""
+    try:
+        with _profile_stage('pdf.find_tables'):
+            tables = page.find_tables()
+        with _profile_stage('pdf.page_blocks'):
+            blocks = _extract_pdf_page_blocks(page, tables)
+    except Exception as exc:
+        page_errors.append((page_number, str(exc)))
+        try:
+            fallback_text = _normalize_text(page.extract_text(), preserve_newlines=True)
+        except Exception:
+            fallback_text = ""
+        if not fallback_text:
+            return ""
+        blocks = [(0.0, "\n".join(_escape_plain_markdown_text(line) for line in fallback_text.splitlines()) + "\n\n")]
 
-def convert_md(file_path, output_dir=None):
+    return "".join(block_content for _, block_content in blocks).strip()
+
+def convert_md(file_path, output_dir=None, persistent=None):
     """
     将 Markdown 文件转换为 DOCX 格式（通过 Node.js 脚本）
 
     Args:
         file_path: Markdown 文件路径
         output_dir: 可选的输出目录
+        persistent: 是否交给常驻的 Node.js worker 转换（见 _convert_md_with_worker），
+            省去每次启动 Node.js 和加载模块的开销。默认由环境变量 BRUCE_DOC_CONVERTER_MD_WORKER 决定
 
     Returns:
         包含 'success'、'output_path' 和可选 'error' 的字典
     """
-    # 检查 Node.js 是否可用
-    node_cmd = shutil.which('node')
-    if not node_cmd:
+    if persistent is None:
+        persistent = os.environ.get(MD_WORKER_ENV, '').strip().lower() in ('1', 'true', 'yes', 'on')
+    if persistent:
+        return _convert_md_with_worker(file_path, output_dir)
+
+    command, error_result = _prepare_md_conversion(file_path, output_dir)
+    if error_result:
+        return error_result
+    cmd, env = command
+
+    try:
+        result = subprocess.run(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=NODE_CONVERT_TIMEOUT_SECONDS,
+            env=env,
+        )
+        return _parse_md_conversion_output(result.returncode, result.stdout, result.stderr)
+
+    except subprocess.TimeoutExpired:
         return {
             'success': False,
-            'error': '未找到 Node.js。Markdown 转 DOCX 需要 Node.js 环境。请安装 Node.js: https://nodejs.org/'
+            'error': '转换超时（超过2分钟）'
         }
-
-    # 获取 Node.js 脚本路径
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'调用 Node.js 脚本失败: {str(e)}'
+        }
+
+def _prepare_md_conversion(file_path, output_dir=None):
+    """
+    准备 Markdown 转 DOCX 的 Node.js 命令（必要时安装共享依赖）
+
+    Returns:
+        ((cmd, env), None) 或 (None, 失败结果字典)
+    """
+    command, error_result = _prepare_md_node_command()
+    if error_result:
+        return None, error_result
+    cmd, env = command
+    cmd = cmd + [file_path]
+    if output_dir:
+        cmd.append(output_dir)
+    return (cmd, env), None
+
+def _prepare_md_node_command():
+    """
+    准备运行 md_to_docx/index.js 的基础命令和环境变量（不含输入参数）
+
+    Returns:
+        (([node, index.js], env), None) 或 (None, 失败结果字典)
+    """
+    # 检查 Node.js 是否可用
+    node_cmd = shutil.which('node')
+    if not node_cmd:
+        return None, {
+            'success': False,
+            'error': '未找到 Node.js。Markdown 转 DOCX 需要 Node.js 环境。请安装 Node.js: https://nodejs.org/'
+        }
+
+    # 获取 Node.js 脚本路径
+    script_dir = os.path.dirname(os.path.abspath(__file__))
     node_script = os.path.join(script_dir, 'md_to_docx', 'index.js')
 
     if not os.path.exists(node_script):
-        return {
+        return None, {
             'success': False,
             'error': f'Node.js 转换脚本不存在: {node_script}。请运行 npm install 安装依赖。'
         }
@@ -2619,7 +3279,7 @@ def convert_md(file_path, output_dir=None):
     if need_shared and shared_mmdc is None:
         ok, err = _ensure_shared_node_modules(shared_dir, source_dir)
         if not ok:
-            return {
+            return None, {
                 'success': False,
                 'error': (
                     f"{err}\n"
@@ -2634,67 +3294,285 @@ def convert_md(file_path, output_dir=None):
     if need_shared and shared_mmdc:
         use_shared = True
 
-    try:
-        # 调用 Node.js 脚本
-        cmd = [node_cmd, node_script, file_path]
-        if output_dir:
-            cmd.append(output_dir)
-
-        env = os.environ.copy()
-        if use_shared:
-            existing = env.get("NODE_PATH")
-            if existing:
-                env["NODE_PATH"] = os.pathsep.join([shared_node_modules, existing])
-            else:
-                env["NODE_PATH"] = shared_node_modules
+    cmd = [node_cmd, node_script]
 
-        mmdc_binary = local_mmdc or shared_mmdc
-        if mmdc_binary:
-            env["BRUCE_DOC_CONVERTER_MMDC_PATH"] = mmdc_binary
+    env = os.environ.copy()
+    if use_shared:
+        existing = env.get("NODE_PATH")
+        if existing:
+            env["NODE_PATH"] = os.pathsep.join([shared_node_modules, existing])
+        else:
+            env["NODE_PATH"] = shared_node_modules
 
-        result = subprocess.run(
-            cmd,
+    mmdc_binary = local_mmdc or shared_mmdc
+    if mmdc_binary:
+        env["BRUCE_DOC_CONVERTER_MMDC_PATH"] = mmdc_binary
+
+    return (cmd, env), None
+
+# 常驻 Node.js worker 的状态（每个进程一个）；pid 用于识别 fork 继承的父进程状态
+_md_worker_lock = threading.Lock()
+_md_worker_state = {'process': None, 'pid': None, 'jobs': 0, 'next_id': 0, 'lines': None, 'stderr': None}
+
+def _pump_md_worker_stream(stream, sink):
+    for line in stream:
+        sink(line)
+    sink(None)
+
+def _start_md_worker():
+    """启动常驻的 `node index.js --serve`，返回 None 或失败结果字典"""
+    command, error_result = _prepare_md_node_command()
+    if error_result:
+        return error_result
+    cmd, env = command
+    try:
+        process = subprocess.Popen(
+            cmd + ['--serve'],
+            stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             text=True,
             encoding="utf-8",
             errors="replace",
-            timeout=NODE_CONVERT_TIMEOUT_SECONDS,
             env=env,
         )
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'启动 Node.js 转换 worker 失败: {str(e)}'
+        }
+
+    # 后台线程读取输出，主线程可以按超时等待结果；stderr 只保留最后几行用于报告崩溃原因
+    lines = queue.Queue()
+    stderr_tail = collections.deque(maxlen=20)
+    threading.Thread(target=_pump_md_worker_stream, args=(process.stdout, lines.put), daemon=True).start()
+    threading.Thread(
+        target=_pump_md_worker_stream,
+        args=(process.stderr, lambda line: line is not None and stderr_tail.append(line)),
+        daemon=True,
+    ).start()
+    _md_worker_state.update(process=process, pid=os.getpid(), jobs=0, lines=lines, stderr=stderr_tail)
+    return None
 
-        # 解析输出
+def _stop_md_worker(kill=False):
+    process = _md_worker_state['process']
+    _md_worker_state['process'] = None
+    if process is None or _md_worker_state['pid'] != os.getpid():
+        return
+    if not kill:
         try:
-            stdout_text = result.stdout or ""
-            output = json.loads(stdout_text)
-            return output
-        except json.JSONDecodeError:
-            if result.returncode == 0:
+            # 关闭 stdin 后 worker 处理完手头的请求自行退出
+            process.stdin.close()
+            process.wait(timeout=5)
+            return
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    process.kill()
+    process.wait()
+
+def shutdown_md_worker():
+    """停止当前进程的常驻 Node.js worker（进程退出时也会自动调用）"""
+    with _md_worker_lock:
+        _stop_md_worker()
+
+atexit.register(shutdown_md_worker)
+
+def _convert_md_with_worker(file_path, output_dir=None):
+    """
+    通过常驻的 Node.js worker 转换 Markdown：docx、jsdom、样式和编号定义只加载一次，
+    单个文件的延迟只剩转换本身
+
+    worker 崩溃后下次调用自动重启；处理 MD_WORKER_MAX_JOBS 个文件后重启；单个文件超过
+    NODE_CONVERT_TIMEOUT_SECONDS 时终止 worker。同一进程内的调用串行执行。
+    """
+    with _md_worker_lock:
+        if _md_worker_state['pid'] != os.getpid():
+            # fork 出的子进程继承了父进程的 worker 句柄，不能与父进程共用管道
+            _md_worker_state.update(process=None, pid=os.getpid())
+        process = _md_worker_state['process']
+        if process is not None and (process.poll() is not None or _md_worker_state['jobs'] >= MD_WORKER_MAX_JOBS):
+            _stop_md_worker()
+            process = None
+        if process is None:
+            error_result = _start_md_worker()
+            if error_result:
+                return error_result
+            process = _md_worker_state['process']
+
+        _md_worker_state['next_id'] += 1
+        job_id = _md_worker_state['next_id']
+        request = {
+            'id': job_id,
+            'input': os.path.abspath(str(file_path)),
+            'output_dir': os.path.abspath(str(output_dir)) if output_dir else None,
+        }
+        try:
+            process.stdin.write(json.dumps(request, ensure_ascii=False) + "\n")
+            process.stdin.flush()
+        except (OSError, ValueError) as e:
+            _stop_md_worker(kill=True)
+            return {
+                'success': False,
+                'error': f'Node.js 转换 worker 已退出: {str(e)}'
+            }
+        _md_worker_state['jobs'] += 1
+
+        deadline = time.monotonic() + NODE_CONVERT_TIMEOUT_SECONDS
+        while True:
+            try:
+                line = _md_worker_state['lines'].get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                _stop_md_worker(kill=True)
                 return {
-                    'success': True,
-                    'output_path': (result.stdout or "").strip(),
-                    'message': '转换成功'
+                    'success': False,
+                    'error': '转换超时（超过2分钟）'
                 }
-            else:
-                stdout_text = (result.stdout or "").strip()
-                stderr_text = (result.stderr or "").strip()
+            if line is None:
+                process.wait()
+                stderr_text = "".join(_md_worker_state['stderr']).strip()
+                _stop_md_worker()
                 return {
                     'success': False,
-                    'error': f'Node.js 脚本输出解析失败: {stdout_text}\n{stderr_text}'
+                    'error': f'Node.js 转换 worker 异常退出（退出码 {process.returncode}）: {stderr_text}'
                 }
+            try:
+                reply = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(reply, dict) and reply.get('id') == job_id and isinstance(reply.get('result'), dict):
+                return reply['result']
 
-    except subprocess.TimeoutExpired:
-        return {
-            'success': False,
-            'error': '转换超时（超过2分钟）'
-        }
+def convert_md_batch(file_paths, output_dir=None, timeout=None):
+    """
+    在同一个 Node.js 进程中依次转换多个 Markdown 文件
+
+    单独调用 convert_md 时每个文件都要支付 Node.js 启动和 docx/jsdom 加载开销（约 0.5 秒），
+    这里只支付一次。
+
+    Args:
+        file_paths: Markdown 文件路径列表
+        output_dir: 可选的输出目录（默认各文件同目录下的 Word/）
+        timeout: 单个文件的超时（秒，默认 NODE_CONVERT_TIMEOUT_SECONDS），整批超时为其乘以文件数
+
+    Returns:
+        与 file_paths 一一对应的结果列表，格式同 convert_md
+    """
+    results = [None] * len(file_paths)
+    jobs = []
+    for index, file_path in enumerate(file_paths):
+        normalized_path, _file_ext, error_result = _validate_conversion_request(file_path, 'full')
+        if error_result:
+            results[index] = error_result
+        else:
+            jobs.append({'index': index, 'input': normalized_path, 'output_dir': output_dir or None})
+    if not jobs:
+        return results
+
+    command, error_result = _prepare_md_node_command()
+    if error_result:
+        for job in jobs:
+            results[job['index']] = dict(error_result)
+        return results
+    cmd, env = command
+
+    batch_timeout = (timeout or NODE_CONVERT_TIMEOUT_SECONDS) * len(jobs)
+    failure = None
+    try:
+        completed = subprocess.run(
+            cmd + ['--stdin'],
+            input=json.dumps(jobs, ensure_ascii=False),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=batch_timeout,
+            env=env,
+        )
+        stdout = completed.stdout
+        if completed.returncode not in (0, 1):
+            failure = f'Node.js 批量转换进程异常退出（退出码 {completed.returncode}）: {(completed.stderr or "").strip()}'
+    except subprocess.TimeoutExpired as e:
+        stdout = e.stdout or ""
+        if isinstance(stdout, bytes):
+            stdout = stdout.decode("utf-8", errors="replace")
+        failure = f'转换超时（Node.js 批量转换超过 {batch_timeout:g} 秒）'
     except Exception as e:
-        return {
-            'success': False,
-            'error': f'调用 Node.js 脚本失败: {str(e)}'
-        }
+        stdout = ""
+        failure = f'调用 Node.js 脚本失败: {str(e)}'
+
+    # 每行一个 {"index": ..., "result": {...}}；进程中途退出时已完成的结果仍然有效
+    for line in stdout.splitlines():
+        try:
+            item = json.loads(line)
+        except ValueError:
+            continue
+        index = item.get('index') if isinstance(item, dict) else None
+        if isinstance(index, int) and 0 <= index < len(results) and isinstance(item.get('result'), dict):
+            results[index] = item['result']
+
+    for job in jobs:
+        if results[job['index']] is None:
+            results[job['index']] = {
+                'success': False,
+                'error': failure or 'Node.js 批量转换进程未返回该文件的结果'
+            }
+    return results
+
+def _parse_md_conversion_output(returncode, stdout, stderr):
+    """解析 Node.js 脚本输出：优先按 JSON 解析，否则按退出码判断"""
+    # 解析输出
+    try:
+        stdout_text = stdout or ""
+        output = json.loads(stdout_text)
+        return output
+    except json.JSONDecodeError:
+        if returncode == 0:
+            return {
+                'success': True,
+                'output_path': (stdout or "").strip(),
+                'message': '转换成功'
+            }
+        else:
+            stdout_text = (stdout or "").strip()
+            stderr_text = (stderr or "").strip()
+            return {
+                'success': False,
+                'error': f'Node.js 脚本输出解析失败: {stdout_text}\n{stderr_text}'
+            }
+
+def _apply_content_mode(result, content='full', preview_bytes=DEFAULT_CONTENT_PREVIEW_BYTES):
+    """
+    按 content 模式裁剪结果中的 markdown_content
+
+    - full: 保持完整内容（默认）
+    - preview: 仅保留前 preview_bytes 字节（按 UTF-8 字符边界截断），附带 content_stats
+    - none: 移除 markdown_content，仅返回 content_stats 与输出路径
+    """
+    if content == 'full' or 'markdown_content' not in result:
+        return result
+
+    markdown_content = result['markdown_content']
+    encoded = markdown_content.encode('utf-8')
+    stats = {
+        'bytes': len(encoded),
+        'lines': markdown_content.count('\n') + 1 if markdown_content else 0,
+        'headings': len(_RE_MARKDOWN_HEADING_LINE.findall(markdown_content)),
+    }
+
+    if content == 'preview':
+        limit = max(int(preview_bytes), 0)
+        stats['truncated'] = len(encoded) > limit
+        if stats['truncated']:
+            result['markdown_content'] = encoded[:limit].decode('utf-8', errors='ignore')
+    else:
+        del result['markdown_content']
+
+    result['content_stats'] = stats
+    return result
 
-def convert_document(file_path, extract_images=True, output_dir=None):
+def convert_document(file_path, extract_images=True, output_dir=None, cache_dir=None, cache_max_bytes=None,
+                     content='full', content_preview_bytes=DEFAULT_CONTENT_PREVIEW_BYTES, profile=False):
     """
     将文档转换为 Markdown 格式
 
@@ -2702,14 +3580,39 @@ def convert_document(file_path, extract_images=True, output_dir=None):
         file_path: 文档文件路径
         extract_images: 是否提取图片（默认 True，支持 Word/Excel/PowerPoint）
         output_dir: 可选的输出目录（默认为同目录下的 Markdown/ 子目录）
+        cache_dir: 可选的转换缓存目录；命中时直接还原 Markdown 和图片，不再打开原文档
+        cache_max_bytes: 缓存容量上限（默认 DEFAULT_CACHE_MAX_BYTES），超出后按 LRU 淘汰
+        content: 结果中 markdown_content 的返回方式，'full'（默认）、'preview' 或 'none'
+        content_preview_bytes: preview 模式下保留的最大字节数
+        profile: 是否记录各阶段的墙钟时间、CPU 时间和峰值内存（结果中的 'profile' 字段）
+
+    Returns:
+        包含 'success'、'markdown_content'、'output_path'、可选 'extracted_images'、'cache'、
+        'content_stats'、'profile' 和 'error' 的字典
+    """
+    if not profile:
+        return _convert_document(
+            file_path, extract_images, output_dir, cache_dir, cache_max_bytes, content, content_preview_bytes
+        )
+
+    result, result_profile = _run_profiled(
+        _convert_document, file_path, extract_images, output_dir, cache_dir, cache_max_bytes,
+        content, content_preview_bytes
+    )
+    result['profile'] = result_profile
+    return result
+
+def _validate_conversion_request(file_path, content):
+    """
+    校验输入文件、大小、content 模式和扩展名
 
     Returns:
-        包含 'success'、'markdown_content'、'output_path'、可选 'extracted_images' 和 'error' 的字典
+        (规范化后的路径, 小写扩展名, None) 或 (None, None, 失败结果字典)
     """
     # 验证输入文件
     file_path, input_error = _validate_input_file(file_path)
     if input_error:
-        return {
+        return None, None, {
             'success': False,
             'error': input_error
         }
@@ -2718,30 +3621,69 @@ def convert_document(file_path, extract_images=True, output_dir=None):
     try:
         file_size = os.path.getsize(file_path)
         if file_size > MAX_FILE_SIZE_BYTES:
-            return {
+            return None, None, {
                 'success': False,
                 'error': f'文件过大: {file_size / (1024*1024):.2f}MB，超过限制 {MAX_FILE_SIZE_BYTES / (1024*1024):.0f}MB'
             }
     except OSError as e:
-        return {
+        return None, None, {
             'success': False,
             'error': f'无法读取文件大小: {str(e)}'
         }
 
+    if content not in CONTENT_MODES:
+        return None, None, {
+            'success': False,
+            'error': f'不支持的 content 模式: {content}。可选: {", ".join(CONTENT_MODES)}'
+        }
+
     # 检查文件扩展名
     file_ext = os.path.splitext(file_path)[1].lower()
     if file_ext not in SUPPORTED_EXTENSIONS:
-        return {
+        return None, None, {
             'success': False,
             'error': f'不支持的文件格式: {file_ext}。支持的格式: {", ".join(SUPPORTED_EXTENSIONS)}'
         }
 
+    return file_path, file_ext, None
+
+def _convert_document(file_path, extract_images, output_dir, cache_dir, cache_max_bytes,
+                      content, content_preview_bytes):
+    file_path, file_ext, error_result = _validate_conversion_request(file_path, content)
+    if error_result:
+        return error_result
+
     # Markdown 转 DOCX 使用单独的处理流程
     if file_ext == '.md':
         return convert_md(file_path, output_dir)
 
+    # 查询转换缓存（命中时无需加载任何解析库）
+    cache_key = None
+    if cache_dir:
+        try:
+            with _profile_stage('cache_lookup'):
+                cache_key = _conversion_cache_key(_hash_file(file_path), file_ext, extract_images)
+                cached = _load_cached_conversion(cache_dir, cache_key)
+            if cached is not None:
+                output_path = _resolve_markdown_output_path(file_path, output_dir)
+                markdown_content, extracted_images = _restore_cached_conversion(cached, output_path)
+                result = {
+                    'success': True,
+                    'markdown_content': markdown_content,
+                    'output_path': output_path,
+                    'cache': 'hit'
+                }
+                if extracted_images:
+                    result['extracted_images'] = extracted_images
+                if cached.get('warning'):
+                    result['warning'] = cached['warning']
+                return _apply_content_mode(result, content, content_preview_bytes)
+        except OSError:
+            logger.debug("Conversion cache lookup failed; converting normally: %s", file_path, exc_info=True)
+
     # 检查依赖（按格式按需检查，避免无关依赖阻塞）
-    deps_ok, error_msg = check_dependencies(file_ext)
+    with _profile_stage('dependencies'):
+        deps_ok, error_msg = check_dependencies(file_ext)
     if not deps_ok:
         return {
             'success': False,
@@ -2759,39 +3701,20 @@ def convert_document(file_path, extract_images=True, output_dir=None):
             image_save_dir, image_rel_dir = _setup_image_output_dir(output_path)
 
         # 根据文件类型转换
-        extracted_images = []
-        if file_ext == '.docx':
-            markdown_content, extracted_images = convert_docx(
-                file_path, image_save_dir=image_save_dir, image_rel_dir=image_rel_dir
-            )
-        elif file_ext == '.xlsx':
-            markdown_content, extracted_images = convert_xlsx(
-                file_path, image_save_dir=image_save_dir, image_rel_dir=image_rel_dir
-            )
-        elif file_ext == '.pptx':
-            markdown_content, extracted_images = convert_pptx(
-                file_path, image_save_dir=image_save_dir, image_rel_dir=image_rel_dir
-            )
-        elif file_ext == '.pdf':
-            markdown_content = convert_pdf(file_path)
-        else:
+        image_sink = _make_directory_image_sink(image_save_dir, image_rel_dir) if image_save_dir else None
+        markdown_content, extracted_images = _convert_source(file_path, file_ext, image_sink=image_sink)
+
+        empty_error, warning = _check_converted_content(file_ext, markdown_content)
+        if empty_error:
             return {
                 'success': False,
-                'error': f'不支持的文件类型: {file_ext}'
+                'error': empty_error
             }
 
-        warning = None
-        if not markdown_content.strip():
-            if file_ext == '.pdf':
-                return {
-                    'success': False,
-                    'error': 'PDF 未提取到任何文本或表格，文件可能是扫描件、受保护文档，或仅包含图片。请先进行 OCR 或解除保护后再试。'
-                }
-            warning = '未提取到任何可写入的内容，原文档可能为空，或仅包含当前版本暂不支持的对象。'
-
         # 保存 Markdown 文件
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
+        with _profile_stage('write_output'):
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(markdown_content)
 
         result = {
             'success': True,
@@ -2802,122 +3725,2431 @@ def convert_document(file_path, extract_images=True, output_dir=None):
             result['extracted_images'] = extracted_images
         if warning:
             result['warning'] = warning
-        return result
+        if cache_key is not None:
+            with _profile_stage('cache_store'):
+                _store_cached_conversion(
+                    cache_dir, cache_key, markdown_content, extracted_images, output_path,
+                    warning=warning, max_bytes=cache_max_bytes
+                )
+            result['cache'] = 'miss'
+        return _apply_content_mode(result, content, content_preview_bytes)
 
-    except PermissionError as e:
-        return {
-            'success': False,
-            'error': f'权限不足: 无法读取文件或写入输出目录 - {str(e)}'
-        }
-    except MemoryError:
+    except Exception as e:
+        return _conversion_error_result(e)
+
+def _convert_source(source, file_ext, image_sink=None, base_name=None):
+    """
+    按格式分派到对应转换器
+
+    Args:
+        source: 文件路径或可 seek 的二进制文件对象
+        file_ext: 带点的小写扩展名，如 '.docx'
+        image_sink: 图片 sink（见 _make_directory_image_sink），None 表示不提取图片
+        base_name: 图片命名用的文档基础名，默认取自 source
+
+    Returns:
+        (markdown_content, extracted_images)
+    """
+    with _profile_stage('convert'):
+        if file_ext == '.docx':
+            return convert_docx(source, image_sink=image_sink, base_name=base_name)
+        if file_ext == '.xlsx':
+            return convert_xlsx(source, image_sink=image_sink, base_name=base_name)
+        if file_ext == '.pptx':
+            return convert_pptx(source, image_sink=image_sink, base_name=base_name)
+        if file_ext == '.pdf':
+            return convert_pdf(source), []
+    raise ValueError(f'不支持的文件类型: {file_ext}')
+
+def _check_converted_content(file_ext, markdown_content):
+    """检查转换结果是否为空，返回 (error, warning)：PDF 为空视为失败，其他格式仅给出警告"""
+    if markdown_content.strip():
+        return None, None
+    if file_ext == '.pdf':
+        return 'PDF 未提取到任何文本或表格，文件可能是扫描件、受保护文档，或仅包含图片。请先进行 OCR 或解除保护后再试。', None
+    return None, '未提取到任何可写入的内容，原文档可能为空，或仅包含当前版本暂不支持的对象。'
+
+def _conversion_error_result(error):
+    """将转换过程中的异常映射为统一的失败结果"""
+    if isinstance(error, PermissionError):
         return {
             'success': False,
-            'error': '内存不足: 文件可能过大，请尝试处理较小的文件'
+            'error': f'权限不足: 无法读取文件或写入输出目录 - {str(error)}'
         }
-    except FileNotFoundError as e:
+    if isinstance(error, MemoryError):
         return {
             'success': False,
-            'error': f'文件未找到: {str(e)}'
+            'error': '内存不足: 文件可能过大，请尝试处理较小的文件',
+            'error_type': 'memory'
         }
-    except OSError as e:
+    if isinstance(error, FileNotFoundError):
         return {
             'success': False,
-            'error': f'系统错误: {str(e)}'
+            'error': f'文件未找到: {str(error)}'
         }
-    except Exception as e:
+    if isinstance(error, OSError):
         return {
             'success': False,
-            'error': f'转换错误 ({type(e).__name__}): {str(e)}'
+            'error': f'系统错误: {str(error)}'
         }
+    return {
+        'success': False,
+        'error': f'转换错误 ({type(error).__name__}): {str(error)}'
+    }
 
-def batch_convert(directory, recursive=True, extract_images=True, output_dir=None):
+def convert_stream(source, file_format, extract_images=True, base_name=None, image_rel_dir=IMAGE_OUTPUT_DIR_NAME,
+                   content='full', content_preview_bytes=DEFAULT_CONTENT_PREVIEW_BYTES, profile=False):
     """
-    批量转换目录中的所有支持的文档
+    在内存中转换文档，不读写任何文件
 
     Args:
-        directory: 要扫描的目录
-        recursive: 是否递归扫描子目录
-        extract_images: 是否提取图片
-        output_dir: 可选的输出目录
+        source: 文档内容，bytes / bytearray / memoryview 或二进制文件对象（不可 seek 时会先读入内存）
+        file_format: 格式提示，如 'docx' 或 '.pdf'（支持 docx、xlsx、pptx、pdf）
+        extract_images: 是否提取图片（支持 Word/Excel/PowerPoint）
+        base_name: 图片命名用的文档基础名（默认取文件对象的 name，否则为 'document'）
+        image_rel_dir: Markdown 中图片引用的相对目录（默认 images）
+        content / content_preview_bytes / profile: 同 convert_document
 
     Returns:
-        转换结果列表
+        包含 'success'、'markdown_content'、'images'（[{'path', 'data', 'format'}, ...]，
+        path 与 Markdown 中的引用一致）、可选 'warning'、'content_stats'、'profile' 和 'error' 的字典
     """
-    results = []
+    if not profile:
+        return _convert_stream(
+            source, file_format, extract_images, base_name, image_rel_dir, content, content_preview_bytes
+        )
 
-    normalized_directory = os.path.abspath(os.path.normpath(os.path.expanduser(str(directory))))
-    if not os.path.exists(normalized_directory):
-        return [{
-            'file': normalized_directory,
-            'result': {
-                'success': False,
-                'error': f'目录不存在: {normalized_directory}'
-            }
-        }]
-    if not os.path.isdir(normalized_directory):
-        return [{
-            'file': normalized_directory,
-            'result': {
+    result, result_profile = _run_profiled(
+        _convert_stream, source, file_format, extract_images, base_name, image_rel_dir,
+        content, content_preview_bytes
+    )
+    result['profile'] = result_profile
+    return result
+
+def _convert_stream(source, file_format, extract_images, base_name, image_rel_dir, content, content_preview_bytes):
+    file_ext = str(file_format or '').strip().lower()
+    if file_ext and not file_ext.startswith('.'):
+        file_ext = '.' + file_ext
+    if file_ext not in ('.docx', '.xlsx', '.pptx', '.pdf'):
+        return {
+            'success': False,
+            'error': f'不支持的内存转换格式: {file_format}。支持的格式: .docx, .xlsx, .pptx, .pdf'
+        }
+    if content not in CONTENT_MODES:
+        return {
+            'success': False,
+            'error': f'不支持的 content 模式: {content}。可选: {", ".join(CONTENT_MODES)}'
+        }
+
+    base_name = _resolve_source_base_name(source, base_name)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        stream = io.BytesIO(source)
+    elif hasattr(source, 'read'):
+        stream = source
+        # OOXML 是 zip 包、PDF 需要随机访问，不可 seek 的流先读入内存
+        if not (hasattr(source, 'seekable') and source.seekable()):
+            stream = io.BytesIO(source.read())
+    else:
+        return {
+            'success': False,
+            'error': f'不支持的输入类型: {type(source).__name__}，需要 bytes 或二进制文件对象'
+        }
+
+    try:
+        size = stream.seek(0, io.SEEK_END) - stream.seek(0)
+    except (OSError, ValueError) as e:
+        return {
+            'success': False,
+            'error': f'无法读取输入流: {str(e)}'
+        }
+    if size > MAX_FILE_SIZE_BYTES:
+        return {
+            'success': False,
+            'error': f'文件过大: {size / (1024*1024):.2f}MB，超过限制 {MAX_FILE_SIZE_BYTES / (1024*1024):.0f}MB'
+        }
+
+    with _profile_stage('dependencies'):
+        deps_ok, error_msg = check_dependencies(file_ext)
+    if not deps_ok:
+        return {
+            'success': False,
+            'error': error_msg
+        }
+
+    try:
+        images = []
+        image_sink = _make_memory_image_sink(images, image_rel_dir) if extract_images else None
+        markdown_content, _extracted = _convert_source(stream, file_ext, image_sink=image_sink, base_name=base_name)
+        empty_error, warning = _check_converted_content(file_ext, markdown_content)
+        if empty_error:
+            return {
                 'success': False,
-                'error': f'输入路径不是目录: {normalized_directory}'
+                'error': empty_error
             }
-        }]
+    except Exception as e:
+        return _conversion_error_result(e)
+
+    result = {
+        'success': True,
+        'markdown_content': markdown_content,
+        'images': images
+    }
+    if warning:
+        result['warning'] = warning
+    return _apply_content_mode(result, content, content_preview_bytes)
+
+def _resolve_batch_jobs(jobs):
+    """解析并行 worker 数，默认使用 CPU 核数"""
+    if jobs is None:
+        return os.cpu_count() or 1
+    try:
+        return max(int(jobs), 1)
+    except (TypeError, ValueError):
+        return 1
 
-    for file_path in _iter_batch_input_files(normalized_directory, recursive=recursive, output_dir=output_dir):
-        result = convert_document(file_path, extract_images, output_dir)
-        results.append({
-            'file': file_path,
-            'result': result
-        })
+def _init_batch_worker():
+    """进程池 worker 初始化：每个 worker 只导入一次解析库，后续任务直接复用"""
+    # Ctrl+C 由主进程统一处理，worker 不再各自打印 KeyboardInterrupt 堆栈
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _import_batch_dependencies()
 
-    return results
+def _import_batch_dependencies():
+    for module_name, _pip_name in _ALL_PYTHON_DEPENDENCIES:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            continue
 
-def main():
-    if len(sys.argv) < 2:
-        print('用法: python convert_document.py <file_path> [extract_images] [output_dir]')
-        print('  file_path: 文档文件路径')
-        print('  extract_images: true/false (默认: true，提取图片到 images/ 子目录)')
-        print('  output_dir: 可选的输出目录')
-        print('')
-        print('支持的格式:')
-        print('  - Office/PDF 转 Markdown: .docx, .xlsx, .pptx, .pdf')
-        print('  - Markdown 转 Word: .md')
-        print('')
-        print('批量转换: python convert_document.py --batch <directory> [recursive]')
-        print('  directory: 要扫描的目录')
-        print('  recursive: true/false (默认: true)')
-        sys.exit(1)
+def _prepare_batch_dependencies(file_paths):
+    """并行转换前在主进程统一检查依赖，避免多个 worker 同时触发 pip 安装"""
+    file_exts = {os.path.splitext(file_path)[1].lower() for file_path in file_paths}
+    for file_ext in sorted(file_exts):
+        if _DEPENDENCIES_BY_EXT.get(file_ext):
+            check_dependencies(file_ext)
 
-    # 批量转换模式
-    if sys.argv[1] == '--batch':
-        if len(sys.argv) < 3:
-            print('错误: 批量转换需要指定目录')
-            sys.exit(1)
+def _convert_batch_file(file_path, convert_kwargs, convert_func=None):
+    """
+    在 worker 中转换单个文件，返回 (result, 耗时秒数)，耗时不含排队时间
+
+    convert_func 默认为 convert_document；归档输出等模式传入其他模块级函数（需可 pickle）。
+    """
+    started = time.perf_counter()
+    result = (convert_func or convert_document)(file_path, **convert_kwargs)
+    return result, time.perf_counter() - started
 
-        directory = sys.argv[2]
-        recursive = sys.argv[3].lower() == 'true' if len(sys.argv) > 3 else True
+def _start_md_batch_groups(file_paths, jobs=1, output_dir=None, timeout=None):
+    """
+    把批量输入中的 Markdown 文件分成若干组，每组由一个 Node.js 进程（convert_md_batch）转换，立即在后台线程中开始
 
-        results = batch_convert(directory, recursive)
+    组数不超过 jobs，且每组至少 MD_BATCH_MIN_FILES_PER_PROCESS 个文件（文件较少时只用一个进程）。
+    """
+    group_count = max(1, min(jobs, -(-len(file_paths) // MD_BATCH_MIN_FILES_PER_PROCESS)))
+    groups = [list(range(start, len(file_paths), group_count)) for start in range(group_count)]
+    executor = ThreadPoolExecutor(max_workers=group_count)
+    futures = {
+        executor.submit(convert_md_batch, [file_paths[index] for index in group], output_dir, timeout): group
+        for group in groups
+    }
+    return {'file_paths': file_paths, 'executor': executor, 'futures': futures}
+
+def _iter_md_batch_group_results(md_batches):
+    """按组完成顺序产出 (index, entry)，index 为文件在 _start_md_batch_groups 输入列表中的位置"""
+    file_paths = md_batches['file_paths']
+    for future in as_completed(md_batches['futures']):
+        group = md_batches['futures'][future]
+        try:
+            results = future.result()
+        except Exception as e:
+            results = [{
+                'success': False,
+                'error': f'Markdown 批量转换异常 ({type(e).__name__}): {str(e)}'
+            } for _index in group]
+        for index, result in zip(group, results):
+            yield index, {
+                'file': file_paths[index],
+                'result': result
+            }
 
-        # 输出结果统计
-        success_count = sum(1 for r in results if r['result']['success'])
-        total_count = len(results)
+def _iter_batch_results(file_paths, jobs=1, timeout=None, max_memory=None, dispatch_order=None,
+                        on_timing=None, convert_func=None, **convert_kwargs):
+    """
+    执行批量转换，按完成顺序产出 (index, entry)
 
-        print(json.dumps({
-            'total': total_count,
-            'success': success_count,
-            'failed': total_count - success_count,
-            'results': results
-        }, ensure_ascii=False, indent=2))
+    jobs > 1 时使用进程池并行转换；同一时刻最多预提交 jobs * BATCH_IN_FLIGHT_PER_WORKER 个任务，
+    避免一次性提交大量文件导致结果堆积。index 为文件在输入列表中的位置，调用方据此恢复确定性顺序。
+    设置 timeout 或 max_memory 时改用隔离 worker（见 _iter_isolated_batch_results），即使 jobs 为 1。
 
-        sys.exit(0 if success_count == total_count else 1)
+    dispatch_order 为可选的提交顺序（file_paths 的下标列表，默认按列表顺序）；
+    on_timing(file_path, seconds, result) 在每个文件转换完成后回调，用于学习各格式的耗时。
+    convert_func 为单个文件的转换函数（默认 convert_document）。
+    """
+    if dispatch_order is None:
+        dispatch_order = range(len(file_paths))
 
-    # 单文件转换模式
-    file_path = sys.argv[1]
-    extract_images = sys.argv[2].lower() == 'true' if len(sys.argv) > 2 else True
-    output_dir = sys.argv[3] if len(sys.argv) > 3 else None
+    if timeout or max_memory:
+        yield from _iter_isolated_batch_results(
+            file_paths, jobs, timeout, max_memory, dispatch_order=dispatch_order, on_timing=on_timing,
+            convert_func=convert_func, **convert_kwargs
+        )
+        return
+
+    if jobs <= 1 or len(file_paths) <= 1:
+        for index in dispatch_order:
+            file_path = file_paths[index]
+            result, elapsed = _convert_batch_file(file_path, convert_kwargs, convert_func)
+            if on_timing:
+                on_timing(file_path, elapsed, result)
+            yield index, {
+                'file': file_path,
+                'result': result
+            }
+        return
+
+    _prepare_batch_dependencies(file_paths)
+
+    worker_count = min(jobs, len(file_paths))
+    max_in_flight = worker_count * BATCH_IN_FLIGHT_PER_WORKER
+    pending_tasks = ((index, file_paths[index]) for index in dispatch_order)
+    in_flight = {}
+    ready = []
+
+    with ProcessPoolExecutor(max_workers=worker_count, initializer=_init_batch_worker) as executor:
+        def _submit_more():
+            while len(in_flight) < max_in_flight:
+                task = next(pending_tasks, None)
+                if task is None:
+                    return
+                index, file_path = task
+                try:
+                    future = executor.submit(_convert_batch_file, file_path, convert_kwargs, convert_func)
+                except Exception as e:
+                    ready.append((index, {
+                        'file': file_path,
+                        'result': {
+                            'success': False,
+                            'error': f'无法提交批量转换任务 ({type(e).__name__}): {str(e)}'
+                        }
+                    }))
+                    continue
+                in_flight[future] = (index, file_path)
+
+        _submit_more()
+        while in_flight or ready:
+            while ready:
+                yield ready.pop(0)
+            if not in_flight:
+                _submit_more()
+                continue
+
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                index, file_path = in_flight.pop(future)
+                try:
+                    result, elapsed = future.result()
+                except Exception as e:
+                    result = {
+                        'success': False,
+                        'error': f'批量转换 worker 异常 ({type(e).__name__}): {str(e)}'
+                    }
+                else:
+                    if on_timing:
+                        on_timing(file_path, elapsed, result)
+                yield index, {
+                    'file': file_path,
+                    'result': result
+                }
+            _submit_more()
 
-    result = convert_document(file_path, extract_images, output_dir)
+# ==================== 隔离 worker（超时与内存限制） ====================
+
+def _apply_worker_memory_limit(max_memory):
+    """限制 worker 进程的地址空间；超限时分配失败抛出 MemoryError，而不是触发系统 OOM killer"""
+    if not max_memory:
+        return
+    try:
+        import resource
+    except ImportError:
+        # Windows 无 resource 模块，只能依靠超时兜底
+        logger.debug("RLIMIT_AS is not available on this platform; ignoring max_memory")
+        return
+    _soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = int(max_memory) if hard == resource.RLIM_INFINITY else min(int(max_memory), hard)
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    except (ValueError, OSError):
+        logger.debug("Failed to apply worker memory limit: %s", max_memory, exc_info=True)
+
+def _isolated_batch_worker(conn, max_memory):
+    """隔离 worker 主循环：逐个接收 (file_path, convert_kwargs, convert_func)，转换后回传结果；收到 None 时退出"""
+    _init_batch_worker()
+    _apply_worker_memory_limit(max_memory)
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            return
+        if task is None:
+            return
+        file_path, convert_kwargs, convert_func = task
+        try:
+            result = (convert_func or convert_document)(file_path, **convert_kwargs)
+        except MemoryError:
+            result = {
+                'success': False,
+                'error': '内存不足: 超出 worker 内存限制',
+                'error_type': 'memory'
+            }
+        try:
+            conn.send(result)
+        except MemoryError:
+            conn.send({
+                'success': False,
+                'error': '内存不足: 无法回传转换结果',
+                'error_type': 'memory'
+            })
+
+def _start_isolated_batch_worker(max_memory):
+    parent_conn, child_conn = multiprocessing.Pipe()
+    process = multiprocessing.Process(
+        target=_isolated_batch_worker, args=(child_conn, max_memory), daemon=True
+    )
+    process.start()
+    child_conn.close()
+    return {'process': process, 'conn': parent_conn, 'task': None, 'started': None, 'deadline': None}
+
+def _stop_isolated_batch_worker(worker, kill=False):
+    process = worker['process']
+    if kill:
+        process.kill()
+    else:
+        try:
+            worker['conn'].send(None)
+        except (OSError, ValueError):
+            process.kill()
+    process.join(timeout=5)
+    if process.is_alive():
+        process.kill()
+        process.join()
+    worker['conn'].close()
+
+def _describe_worker_exit(exitcode, max_memory=None):
+    """将 worker 异常退出码转换为 (error_type, 错误信息)"""
+    import signal
+    if exitcode is not None and exitcode < 0:
+        if -exitcode == getattr(signal, 'SIGKILL', 9):
+            # 被外部 SIGKILL 终止，最常见的原因是系统 OOM killer
+            return 'memory', 'worker 被系统终止（可能内存不足）'
+        if max_memory:
+            # 原生扩展（如 pdfium）在 RLIMIT_AS 下分配失败时往往直接崩溃，而不是抛出 MemoryError
+            return 'memory', f'worker 被信号 {-exitcode} 终止（可能超出内存上限）'
+    return 'crash', f'worker 异常退出（退出码 {exitcode}）'
+
+def _iter_isolated_batch_results(file_paths, jobs, timeout=None, max_memory=None, dispatch_order=None,
+                                 on_timing=None, convert_func=None, **convert_kwargs):
+    """
+    在隔离 worker 中执行批量转换，按完成顺序产出 (index, entry)
+
+    每个 worker 是长期存活的独立进程，一次只处理一个文件：超过 timeout 秒未返回时强制终止，
+    被 OOM killer 杀死或崩溃时同样只影响当前文件。出问题的 worker 会被替换，批量转换继续；
+    对应结果为 success: False，并带 error_type（'timeout'、'memory' 或 'crash'）。
+    """
+    if not file_paths:
+        return
+
+    _prepare_batch_dependencies(file_paths)
+    # fork 启动方式下子进程直接继承已导入的解析库
+    _import_batch_dependencies()
+
+    worker_count = min(max(jobs, 1), len(file_paths))
+    if dispatch_order is None:
+        dispatch_order = range(len(file_paths))
+    pending_tasks = ((index, file_paths[index]) for index in dispatch_order)
+    idle = []
+    busy = []
+
+    def _failure(task, error_type, error):
+        index, file_path = task
+        return index, {
+            'file': file_path,
+            'result': {
+                'success': False,
+                'error': error,
+                'error_type': error_type
+            }
+        }
+
+    try:
+        while True:
+            while len(busy) < worker_count:
+                task = next(pending_tasks, None)
+                if task is None:
+                    break
+                if idle:
+                    worker = idle.pop()
+                else:
+                    worker = _start_isolated_batch_worker(max_memory)
+                worker['task'] = task
+                worker['started'] = time.monotonic()
+                worker['deadline'] = worker['started'] + timeout if timeout else None
+                try:
+                    worker['conn'].send((task[1], convert_kwargs, convert_func))
+                except (OSError, ValueError) as e:
+                    _stop_isolated_batch_worker(worker, kill=True)
+                    yield _failure(task, 'crash', f'无法提交批量转换任务 ({type(e).__name__}): {str(e)}')
+                    continue
+                busy.append(worker)
+
+            if not busy:
+                return
+
+            wait_timeout = None
+            deadlines = [worker['deadline'] for worker in busy if worker['deadline'] is not None]
+            if deadlines:
+                wait_timeout = max(min(deadlines) - time.monotonic(), 0)
+            wait_objects = [worker['conn'] for worker in busy] + [worker['process'].sentinel for worker in busy]
+            ready = set(multiprocessing.connection.wait(wait_objects, timeout=wait_timeout))
+
+            now = time.monotonic()
+            for worker in list(busy):
+                task = worker['task']
+                if worker['conn'] in ready:
+                    try:
+                        result = worker['conn'].recv()
+                    except (EOFError, OSError):
+                        result = None
+                    if result is not None:
+                        busy.remove(worker)
+                        worker['task'] = None
+                        idle.append(worker)
+                        if on_timing:
+                            on_timing(task[1], now - worker['started'], result)
+                        yield task[0], {'file': task[1], 'result': result}
+                        continue
+
+                if worker['conn'] in ready or worker['process'].sentinel in ready:
+                    busy.remove(worker)
+                    worker['process'].join(timeout=5)
+                    error_type, error = _describe_worker_exit(worker['process'].exitcode, max_memory)
+                    _stop_isolated_batch_worker(worker, kill=True)
+                    yield _failure(task, error_type, error)
+                elif worker['deadline'] is not None and now >= worker['deadline']:
+                    busy.remove(worker)
+                    _stop_isolated_batch_worker(worker, kill=True)
+                    yield _failure(task, 'timeout', f'转换超时（超过 {timeout:g} 秒）')
+    finally:
+        for worker in idle + busy:
+            _stop_isolated_batch_worker(worker, kill=bool(worker['task']))
+
+# ==================== 批量调度（按预估耗时排序） ====================
+
+# 各格式每 MB 的默认耗时估计（秒），来自 benchmarks/ 的 small 语料；PDF 逐页做版面分析，远慢于 OOXML
+_DEFAULT_BATCH_SECONDS_PER_MB = {
+    '.pdf': 40.0,
+    '.docx': 15.0,
+    '.xlsx': 5.0,
+    '.pptx': 0.5,
+    '.md': 1.0,
+}
+
+def _get_batch_cost_stats_path():
+    """历史耗时统计文件路径，可通过环境变量覆盖"""
+    override = os.environ.get(BATCH_COST_STATS_ENV)
+    if override:
+        return override
+    return os.path.join(_get_user_data_root(), "batch-cost-stats.json")
+
+def _load_batch_cost_model(stats_path):
+    """读取历史统计，返回 {扩展名: 每 MB 秒数}；缺失或损坏时使用默认估计"""
+    model = dict(_DEFAULT_BATCH_SECONDS_PER_MB)
+    try:
+        with open(stats_path, 'r', encoding='utf-8') as f:
+            stats = json.load(f)
+    except (OSError, ValueError):
+        return model
+    if not isinstance(stats, dict) or stats.get('version') != 1:
+        return model
+    for file_ext, record in (stats.get('formats') or {}).items():
+        try:
+            seconds_per_mb = float(record['seconds_per_mb'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if seconds_per_mb > 0:
+            model[file_ext] = seconds_per_mb
+    return model
+
+def _estimate_batch_cost(model, file_path, file_size):
+    file_ext = os.path.splitext(file_path)[1].lower()
+    seconds_per_mb = model.get(file_ext, _DEFAULT_BATCH_SECONDS_PER_MB['.docx'])
+    return BATCH_COST_FIXED_SECONDS + seconds_per_mb * file_size / (1024 * 1024)
+
+def _plan_batch_dispatch_order(file_paths, model):
+    """
+    预先 stat 所有输入，按预估耗时从大到小排列提交顺序（最长处理时间优先），
+    避免大文件最后才开始、拖长整体完成时间。返回 (dispatch_order, file_sizes)
+    """
+    file_sizes = []
+    for file_path in file_paths:
+        try:
+            file_sizes.append(os.path.getsize(file_path))
+        except OSError:
+            file_sizes.append(0)
+    costs = [_estimate_batch_cost(model, file_path, size) for file_path, size in zip(file_paths, file_sizes)]
+    # sorted 是稳定排序，预估耗时相同的文件保持遍历顺序
+    dispatch_order = sorted(range(len(file_paths)), key=lambda index: -costs[index])
+    return dispatch_order, file_sizes
+
+def _record_batch_timing(samples, file_path, file_size, seconds, result):
+    """累计本轮各格式的实测耗时；缓存命中、跳过和失败的文件不代表真实转换开销，不计入"""
+    if not result.get('success') or result.get('cache') == 'hit' or file_size <= 0:
+        return
+    file_ext = os.path.splitext(file_path)[1].lower()
+    sample = samples.setdefault(file_ext, {'seconds': 0.0, 'bytes': 0, 'files': 0})
+    sample['seconds'] += max(seconds - BATCH_COST_FIXED_SECONDS, 0.0)
+    sample['bytes'] += file_size
+    sample['files'] += 1
+
+def _save_batch_cost_stats(stats_path, model, samples):
+    """将本轮实测与历史估计按 BATCH_COST_LEARNING_RATE 加权合并后写回统计文件"""
+    if not samples:
+        return
+    formats = {}
+    for file_ext, sample in samples.items():
+        measured = sample['seconds'] / (sample['bytes'] / (1024 * 1024))
+        if measured <= 0:
+            continue
+        previous = model.get(file_ext, measured)
+        formats[file_ext] = previous + (measured - previous) * BATCH_COST_LEARNING_RATE
+
+    stats = {'version': 1, 'formats': {}}
+    try:
+        with open(stats_path, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+        if isinstance(existing, dict) and existing.get('version') == 1:
+            stats['formats'].update(existing.get('formats') or {})
+    except (OSError, ValueError):
+        pass
+    for file_ext, seconds_per_mb in formats.items():
+        stats['formats'][file_ext] = {'seconds_per_mb': round(seconds_per_mb, 6)}
+
+    try:
+        os.makedirs(os.path.dirname(stats_path) or '.', exist_ok=True)
+        tmp_path = f"{stats_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(tmp_path, stats_path)
+    except OSError:
+        logger.debug("Failed to save batch cost stats: %s", stats_path, exc_info=True)
+
+# ==================== 批量转换去重 ====================
+
+def _plan_batch_dedup(file_paths, indices):
+    """
+    在待转换文件中找出内容完全相同的副本
+
+    先按 (扩展名, 大小) 分组，只对大小相同的文件计算哈希，避免读取所有文件。
+    Markdown 输入走 Node.js 流程、输出位置由脚本决定，不参与去重。
+
+    Returns:
+        (unique_indices, duplicates)：duplicates 为 {首个副本下标: [其余副本下标, ...]}，
+        首个副本按遍历顺序确定
+    """
+    by_size = {}
+    for index in indices:
+        file_ext = os.path.splitext(file_paths[index])[1].lower()
+        if file_ext == '.md':
+            continue
+        try:
+            size = os.path.getsize(file_paths[index])
+        except OSError:
+            continue
+        by_size.setdefault((file_ext, size), []).append(index)
+
+    duplicates = {}
+    duplicate_indices = set()
+    for group in by_size.values():
+        if len(group) < 2:
+            continue
+        by_hash = {}
+        for index in group:
+            try:
+                content_hash = _hash_file(file_paths[index])
+            except OSError:
+                continue
+            by_hash.setdefault(content_hash, []).append(index)
+        for same_content in by_hash.values():
+            if len(same_content) > 1:
+                duplicates[same_content[0]] = same_content[1:]
+                duplicate_indices.update(same_content[1:])
+
+    unique_indices = [index for index in indices if index not in duplicate_indices]
+    return unique_indices, duplicates
+
+def _link_or_copy(src, dst):
+    """优先创建硬链接（不占额外空间），跨文件系统或不支持时退回复制"""
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            return
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def _materialize_duplicate(file_path, source_path, source_result, output_dir=None,
+                           content='full', content_preview_bytes=DEFAULT_CONTENT_PREVIEW_BYTES, **_ignored):
+    """
+    根据首个副本的转换结果生成重复文件的输出，不再重新解析文档
+
+    图片文件名中的文档基础名按副本改写（与缓存还原一致），Markdown 和图片尽量使用硬链接。
+    """
+    if not source_result.get('success'):
+        result = {key: value for key, value in source_result.items() if key != 'profile'}
+        result['deduplicated_from'] = source_path
+        return result
+
+    try:
+        source_output = source_result['output_path']
+        output_path = _resolve_markdown_output_path(file_path, output_dir)
+        with open(source_output, 'r', encoding='utf-8') as f:
+            source_markdown = f.read()
+
+        markdown_content, mapping = _rebase_extracted_images(
+            source_markdown,
+            source_result.get('extracted_images') or [],
+            os.path.splitext(os.path.basename(source_output))[0],
+            os.path.splitext(os.path.basename(output_path))[0],
+        )
+
+        extracted_images = []
+        if mapping:
+            image_save_dir, _image_rel_dir = _setup_image_output_dir(output_path)
+            source_dir = os.path.dirname(source_output)
+            for old_rel_path, new_rel_path in mapping:
+                _link_or_copy(
+                    os.path.join(source_dir, *old_rel_path.split('/')),
+                    os.path.join(image_save_dir, new_rel_path.rpartition('/')[2]),
+                )
+                extracted_images.append(new_rel_path)
+
+        if markdown_content == source_markdown:
+            _link_or_copy(source_output, output_path)
+        else:
+            with open(output_path, 'w', encoding='utf-8') as f:
+                f.write(markdown_content)
+    except (OSError, KeyError) as e:
+        return {
+            'success': False,
+            'error': f'无法生成重复文件的输出 ({type(e).__name__}): {str(e)}',
+            'deduplicated_from': source_path
+        }
+
+    result = {
+        'success': True,
+        'markdown_content': markdown_content,
+        'output_path': output_path,
+        'deduplicated_from': source_path
+    }
+    if extracted_images:
+        result['extracted_images'] = extracted_images
+    if source_result.get('warning'):
+        result['warning'] = source_result['warning']
+    return _apply_content_mode(result, content, content_preview_bytes)
+
+# ==================== 归档输出 ====================
+
+# 已压缩的图片格式直接存储，避免对 zip 重复压缩浪费 CPU
+_ARCHIVE_STORED_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.docx'}
+
+def _convert_file_for_archive(file_path, extract_images=True, content='full',
+                              content_preview_bytes=DEFAULT_CONTENT_PREVIEW_BYTES, profile=False, **_ignored):
+    """
+    归档模式下的单文件转换：不写任何输出文件，把要写入归档的成员放在结果的 '_archive_members' 中
+
+    成员为 [(相对名称, bytes), ...]，名称相对于该文件的输出位置（如 'report.md'、'images/report_img_001.png'），
+    由主进程加上目录前缀后顺序写入归档。
+    """
+    file_path, file_ext, error_result = _validate_conversion_request(file_path, content)
+    if error_result:
+        return error_result
+    base_name = os.path.splitext(os.path.basename(file_path))[0]
+
+    if file_ext == '.md':
+        # Node.js 脚本只能写文件，先输出到临时目录再读回
+        with tempfile.TemporaryDirectory(prefix='bruce-doc-converter-') as tmp_dir:
+            result = convert_md(file_path, tmp_dir)
+            if not result.get('success'):
+                return result
+            try:
+                with open(result['output_path'], 'rb') as f:
+                    docx_data = f.read()
+            except (OSError, KeyError) as e:
+                return _conversion_error_result(e)
+        return {
+            'success': True,
+            '_archive_members': [(f'{base_name}.docx', docx_data)]
+        }
+
+    with open(file_path, 'rb') as f:
+        result = convert_stream(f, file_ext, extract_images, base_name=base_name, profile=profile)
+    if not result.get('success'):
+        return result
+
+    images = result.pop('images')
+    result['_archive_members'] = [(f'{base_name}.md', result['markdown_content'].encode('utf-8'))] + [
+        (image['path'], image['data']) for image in images
+    ]
+    if images:
+        result['extracted_images'] = [image['path'] for image in images]
+    return _apply_content_mode(result, content, content_preview_bytes)
+
+def _open_batch_archive(archive_path):
+    """
+    打开批量输出归档（.zip、.tar、.tar.gz/.tgz），先写入同目录的临时文件，完成后再原子替换
+
+    Returns:
+        {'path', 'tmp_path', 'kind', 'handle', 'names'}
+    """
+    archive_path = os.path.abspath(os.path.expanduser(str(archive_path)))
+    lower_path = archive_path.lower()
+    if lower_path.endswith('.zip'):
+        kind, mode = 'zip', 'w'
+    elif lower_path.endswith(('.tar.gz', '.tgz')):
+        kind, mode = 'tar', 'w:gz'
+    elif lower_path.endswith('.tar'):
+        kind, mode = 'tar', 'w'
+    else:
+        raise ValueError(f'不支持的归档格式: {archive_path}（支持 .zip、.tar、.tar.gz、.tgz）')
+
+    os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+    tmp_path = f"{archive_path}.{os.getpid()}.tmp"
+    if kind == 'zip':
+        handle = zipfile.ZipFile(tmp_path, mode, compression=zipfile.ZIP_DEFLATED)
+    else:
+        handle = tarfile.open(tmp_path, mode)
+    return {'path': archive_path, 'tmp_path': tmp_path, 'kind': kind, 'handle': handle, 'names': set()}
+
+def _write_archive_member(archive, name, data):
+    if name in archive['names']:
+        raise ValueError(f'归档中已存在同名输出: {name}')
+    archive['names'].add(name)
+    if archive['kind'] == 'zip':
+        stored = os.path.splitext(name)[1].lower() in _ARCHIVE_STORED_EXTENSIONS
+        archive['handle'].writestr(name, data, compress_type=zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+    else:
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        info.mode = 0o644
+        archive['handle'].addfile(info, io.BytesIO(data))
+
+def _close_batch_archive(archive, commit=True):
+    archive['handle'].close()
+    if commit:
+        os.replace(archive['tmp_path'], archive['path'])
+    else:
+        try:
+            os.remove(archive['tmp_path'])
+        except OSError:
+            pass
+
+def _store_archive_result(archive, prefix, result, duplicate_base_name=None):
+    """
+    将结果中的 '_archive_members' 写入归档并从结果中移除，成功时设置 'archive_path'
+
+    duplicate_base_name 用于去重时把首个副本的成员改名为当前副本的基础名（图片引用同步改写）。
+    """
+    members = result.pop('_archive_members', None)
+    if not result.get('success') or not members:
+        return result
+
+    if duplicate_base_name:
+        main_name, main_data = members[0]
+        old_base_name, main_ext = os.path.splitext(main_name)
+        image_paths = [name for name, _data in members[1:]]
+        if main_ext == '.md':
+            markdown_content, mapping = _rebase_extracted_images(
+                main_data.decode('utf-8'), image_paths, old_base_name, duplicate_base_name
+            )
+            main_data = markdown_content.encode('utf-8')
+        else:
+            mapping = [(name, name) for name in image_paths]
+        renamed = dict(mapping)
+        members = [(duplicate_base_name + main_ext, main_data)] + [
+            (renamed.get(name, name), data) for name, data in members[1:]
+        ]
+        if result.get('extracted_images'):
+            result['extracted_images'] = [renamed.get(name, name) for name in result['extracted_images']]
+        if 'markdown_content' in result and main_ext == '.md':
+            result['markdown_content'] = _rebase_extracted_images(
+                result['markdown_content'], image_paths, old_base_name, duplicate_base_name
+            )[0]
+
+    try:
+        for name, data in members:
+            _write_archive_member(archive, prefix + name, data)
+    except (OSError, ValueError, tarfile.TarError, zipfile.BadZipFile) as e:
+        return {
+            'success': False,
+            'error': f'写入归档失败 ({type(e).__name__}): {str(e)}'
+        }
+    result['archive_path'] = prefix + members[0][0]
+    return result
+
+# ==================== 增量批量转换（清单） ====================
+
+def _resolve_batch_state_dir(directory, output_dir=None):
+    """批量转换状态文件（清单等）所在目录：自定义输出目录，或输入目录下的 Markdown/"""
+    if output_dir:
+        return os.path.abspath(os.path.normpath(os.path.expanduser(str(output_dir))))
+    return os.path.join(directory, 'Markdown')
+
+def _batch_relative_path(directory, file_path):
+    """批量输入文件相对输入目录的路径，统一使用正斜杠，作为清单等状态文件的键"""
+    return os.path.relpath(file_path, directory).replace(os.sep, '/')
+
+def _load_batch_manifest(manifest_path):
+    """读取增量转换清单；不存在、损坏或由其他转换器版本生成时返回空清单"""
+    empty = {'converter_version': CONVERTER_VERSION, 'files': {}}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty
+
+    if not isinstance(manifest, dict) or manifest.get('converter_version') != CONVERTER_VERSION:
+        return empty
+    if not isinstance(manifest.get('files'), dict):
+        return empty
+    return manifest
+
+def _save_batch_manifest(manifest_path, manifest):
+    """原子写入清单，避免中断时留下半截 JSON"""
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def _is_manifest_record_current(record, file_path, extract_images):
+    """
+    判断清单记录是否仍与源文件一致：大小和 mtime 相同直接视为未变化；
+    仅 mtime 变化时再比较内容哈希（如被 touch 或复制），避免无谓的重复转换
+    """
+    if not record or record.get('extract_images') != bool(extract_images):
+        return False
+    outputs = record.get('outputs') or []
+    if not outputs or not all(os.path.exists(path) for path in outputs):
+        return False
+
+    stat = os.stat(file_path)
+    if record.get('size') != stat.st_size:
+        return False
+    if record.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    if _hash_file(file_path) != record.get('sha256'):
+        return False
+
+    record['mtime_ns'] = stat.st_mtime_ns
+    return True
+
+def _collect_result_outputs(result):
+    """收集一次成功转换生成的全部输出文件（Markdown/Word 文件及提取的图片）"""
+    output_path = result.get('output_path')
+    if not output_path:
+        return []
+    outputs = [output_path]
+    output_dir = os.path.dirname(output_path)
+    for rel_path in result.get('extracted_images') or []:
+        outputs.append(os.path.join(output_dir, *rel_path.split('/')))
+    return outputs
+
+def _build_manifest_record(file_path, result, extract_images):
+    stat = os.stat(file_path)
+    return {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': _hash_file(file_path),
+        'extract_images': bool(extract_images),
+        'outputs': _collect_result_outputs(result),
+    }
+
+def _remove_output_files(paths, keep=()):
+    """删除不再需要的输出文件，返回实际删除的路径列表"""
+    keep_set = {os.path.normcase(os.path.abspath(path)) for path in keep}
+    removed = []
+    for path in paths:
+        if os.path.normcase(os.path.abspath(path)) in keep_set:
+            continue
+        try:
+            os.remove(path)
+            removed.append(path)
+        except FileNotFoundError:
+            continue
+        except OSError:
+            logger.debug("Failed to remove stale output: %s", path, exc_info=True)
+    return removed
+
+def _plan_incremental_batch(directory, file_paths, manifest, extract_images, recursive=True):
+    """
+    对比清单与当前源文件，返回 (待转换的下标列表, {下标: 跳过结果}, 已删除源文件的清单键列表)
+
+    只检查 stat（必要时哈希），不导入任何解析库。
+    """
+    records = manifest['files']
+    pending_indices = []
+    skipped = {}
+    seen_keys = set()
+
+    for index, file_path in enumerate(file_paths):
+        rel_path = _batch_relative_path(directory, file_path)
+        seen_keys.add(rel_path)
+        record = records.get(rel_path)
+        try:
+            is_current = _is_manifest_record_current(record, file_path, extract_images)
+        except OSError:
+            is_current = False
+
+        if is_current:
+            skipped[index] = {
+                'file': file_path,
+                'result': {
+                    'success': True,
+                    'skipped': True,
+                    'output_path': record['outputs'][0],
+                }
+            }
+        else:
+            pending_indices.append(index)
+
+    deleted_keys = []
+    for rel_path in sorted(records):
+        if rel_path in seen_keys:
+            continue
+        # 非递归模式下子目录中的记录不在本次扫描范围内，不能视为已删除
+        if not recursive and '/' in rel_path:
+            continue
+        deleted_keys.append(rel_path)
+
+    return pending_indices, skipped, deleted_keys
+
+# ==================== 断点续转（检查点日志） ====================
+
+def _batch_checkpoint_header(directory, extract_images):
+    """检查点日志首行：转换器版本或转换参数不同的日志不能用于续转"""
+    return {
+        'converter_version': CONVERTER_VERSION,
+        'directory': directory,
+        'extract_images': bool(extract_images),
+    }
+
+def _load_batch_checkpoint(checkpoint_path, header):
+    """
+    读取检查点日志，返回 {相对路径: 记录}（同一文件以最后一条为准）
+
+    日志不存在或首行与 header 不一致时返回 None；中断时写了一半的行直接忽略。
+    """
+    try:
+        f = open(checkpoint_path, 'r', encoding='utf-8')
+    except OSError:
+        return None
+
+    records = {}
+    with f:
+        try:
+            if json.loads(f.readline()) != header:
+                return None
+        except ValueError:
+            return None
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and isinstance(record.get('file'), str) and isinstance(record.get('result'), dict):
+                records[record['file']] = record
+    return records
+
+def _open_batch_checkpoint(checkpoint_path, header, append=False):
+    """打开检查点日志：续转时追加，否则重新写入首行"""
+    os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+    if append:
+        with open(checkpoint_path, 'rb') as f:
+            torn = False
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b'\n'
+        handle = open(checkpoint_path, 'a', encoding='utf-8')
+        if torn:
+            # 上次中断留下了没有换行的半行，补上换行，避免与新记录拼成一行
+            handle.write('\n')
+    else:
+        handle = open(checkpoint_path, 'w', encoding='utf-8')
+        handle.write(json.dumps(header, ensure_ascii=False, separators=(',', ':')) + '\n')
+        handle.flush()
+    return {'handle': handle, 'last_sync': time.monotonic()}
+
+def _append_batch_checkpoint(checkpoint, rel_path, file_path, result):
+    """
+    追加一条完成记录（不含 markdown_content，续转时从输出文件读回）
+
+    每行写入后立即 flush，进程崩溃也不会丢失；fsync 按 BATCH_CHECKPOINT_FSYNC_SECONDS 节流，
+    断电时最多丢失最近几秒的记录，这些文件在续转时会重新转换。
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return
+    record = {
+        'file': rel_path,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'result': {key: value for key, value in result.items() if key != 'markdown_content'},
+    }
+    handle = checkpoint['handle']
+    handle.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+    handle.flush()
+    now = time.monotonic()
+    if now - checkpoint['last_sync'] >= BATCH_CHECKPOINT_FSYNC_SECONDS:
+        os.fsync(handle.fileno())
+        checkpoint['last_sync'] = now
+
+def _close_batch_checkpoint(checkpoint):
+    handle = checkpoint['handle']
+    try:
+        handle.flush()
+        os.fsync(handle.fileno())
+    finally:
+        handle.close()
+
+def _restore_checkpoint_result(record, file_path, content='full', content_preview_bytes=DEFAULT_CONTENT_PREVIEW_BYTES):
+    """
+    从检查点记录还原已完成文件的结果；源文件已变化、上次失败或输出文件缺失时返回 None（需要重新转换）
+    """
+    if not record or not record['result'].get('success'):
+        return None
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    if record.get('size') != stat.st_size or record.get('mtime_ns') != stat.st_mtime_ns:
+        return None
+
+    result = {key: value for key, value in record['result'].items() if key != 'content_stats'}
+    outputs = _collect_result_outputs(result)
+    if not outputs or not all(os.path.exists(path) for path in outputs):
+        return None
+    if result['output_path'].endswith('.md'):
+        try:
+            with open(result['output_path'], 'r', encoding='utf-8') as f:
+                result['markdown_content'] = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+    result['resumed'] = True
+    return _apply_content_mode(result, content, content_preview_bytes)
+
+def _plan_resumed_batch(directory, file_paths, pending_indices, records, content='full',
+                        content_preview_bytes=DEFAULT_CONTENT_PREVIEW_BYTES):
+    """返回 (仍需转换的下标列表, {下标: 从检查点还原的条目})"""
+    remaining = []
+    resumed = {}
+    for index in pending_indices:
+        file_path = file_paths[index]
+        result = _restore_checkpoint_result(
+            records.get(_batch_relative_path(directory, file_path)), file_path, content, content_preview_bytes
+        )
+        if result is None:
+            remaining.append(index)
+        else:
+            resumed[index] = {'file': file_path, 'result': result}
+    return remaining, resumed
+
+# ==================== 分片 ====================
+
+def _parse_batch_shard(value):
+    """
+    解析分片参数：'i/N' 字符串或 (i, N)，i 从 1 开始
+
+    Returns:
+        (i, N)；value 为空时返回 None
+    """
+    if value is None or value == '':
+        return None
+    try:
+        if isinstance(value, str):
+            index_text, count_text = value.split('/')
+            index, count = int(index_text), int(count_text)
+        else:
+            index, count = (int(part) for part in value)
+    except (TypeError, ValueError):
+        raise ValueError(f'分片参数格式应为 i/N: {value}')
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f'分片编号应满足 1 <= i <= N: {value}')
+    return index, count
+
+def _batch_shard_of(rel_path, count):
+    """按相对路径的 SHA-1 计算文件所属分片（1..count），与机器、Python 进程和遍历顺序无关"""
+    digest = hashlib.sha1(rel_path.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+def _shard_state_filename(filename, shard):
+    """分片运行各自使用独立的清单和检查点文件，多个节点共享输出目录时互不覆盖"""
+    if not shard:
+        return filename
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.shard-{shard[0]}-of-{shard[1]}{ext}"
+
+def _load_shard_summary(path):
+    """
+    读取单个分片的批量输出：完整 JSON 汇总（含 results），或 --stream 的 NDJSON（最后一行为汇总）
+
+    Returns:
+        {'results': [...], 'shard': {...} 或 None}
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    try:
+        summary = json.loads(text)
+    except ValueError:
+        summary = None
+
+    if isinstance(summary, dict) and isinstance(summary.get('results'), list):
+        return {'results': summary['results'], 'shard': summary.get('shard')}
+
+    results = []
+    shard = None
+    for line_number, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            raise ValueError(f'{path} 第 {line_number} 行不是合法的 JSON')
+        if isinstance(item, dict) and 'file' in item and 'result' in item:
+            results.append(item)
+        elif isinstance(item, dict) and 'total' in item:
+            shard = item.get('shard')
+    return {'results': results, 'shard': shard}
+
+def _batch_walk_order_key(entry):
+    """按批量遍历顺序（同目录文件在前，子目录按名称排序）排列结果，已删除源文件的条目排在末尾"""
+    parts = str(entry.get('file', '')).replace('\\', '/').split('/')
+    return ('removed_outputs' in entry.get('result', {}), parts[:-1], parts[-1])
+
+def merge_batch_summaries(paths):
+    """
+    合并各分片的批量输出为一份汇总，格式与单机批量转换相同
+
+    汇总额外带 'shards': {'count', 'merged', 'missing'}，用于发现遗漏或重复的分片。
+    """
+    results = []
+    shard_count = None
+    merged = []
+    for path in paths:
+        loaded = _load_shard_summary(path)
+        results.extend(loaded['results'])
+        shard = loaded['shard']
+        if not shard:
+            continue
+        if shard_count is None:
+            shard_count = shard['count']
+        elif shard['count'] != shard_count:
+            raise ValueError(f"分片总数不一致: {path} 为 {shard['count']}，其他为 {shard_count}")
+        if shard['index'] in merged:
+            raise ValueError(f"分片 {shard['index']}/{shard_count} 重复: {path}")
+        merged.append(shard['index'])
+
+    results.sort(key=_batch_walk_order_key)
+    summary = _summarize_batch_results(results)
+    if shard_count is not None:
+        summary['shards'] = {
+            'count': shard_count,
+            'merged': sorted(merged),
+            'missing': [index for index in range(1, shard_count + 1) if index not in merged],
+        }
+    summary['results'] = results
+    return summary
+
+def _iter_batch_convert_entries(directory, recursive=True, extract_images=True, output_dir=None, jobs=None,
+                                incremental=False, timeout=None, max_memory=None, dedup=False,
+                                output_archive=None, checkpoint=False, resume=False, shard=None,
+                                **convert_options):
+    """
+    批量转换核心流程，按完成顺序产出 (order, entry)
+
+    order 为条目在确定性结果列表中的位置：输入文件按遍历顺序编号，
+    增量模式下已删除源文件的条目排在其后。convert_options 原样传给 convert_document。
+    设置 output_archive 时所有输出按输入目录结构顺序写入该归档，不创建任何输出目录。
+    checkpoint 时每完成一个文件就追加一条检查点记录；resume 时跳过检查点中已成功且未变化的文件。
+    shard=(i, N) 时只处理按相对路径哈希分到第 i 片的文件，order 为分片内的位置。
+    """
+    normalized_directory = os.path.abspath(os.path.normpath(os.path.expanduser(str(directory))))
+    if not os.path.exists(normalized_directory):
+        yield 0, {
+            'file': normalized_directory,
+            'result': {
+                'success': False,
+                'error': f'目录不存在: {normalized_directory}'
+            }
+        }
+        return
+    if not os.path.isdir(normalized_directory):
+        yield 0, {
+            'file': normalized_directory,
+            'result': {
+                'success': False,
+                'error': f'输入路径不是目录: {normalized_directory}'
+            }
+        }
+        return
+
+    if output_archive and incremental:
+        yield 0, {
+            'file': normalized_directory,
+            'result': {
+                'success': False,
+                'error': '归档输出不支持增量模式：增量清单依赖输出目录中的文件'
+            }
+        }
+        return
+    if output_archive and (checkpoint or resume):
+        yield 0, {
+            'file': normalized_directory,
+            'result': {
+                'success': False,
+                'error': '归档输出不支持检查点和续转：归档每次都会重新生成'
+            }
+        }
+        return
+
+    shard = _parse_batch_shard(shard)
+    file_paths = list(_iter_batch_input_files(normalized_directory, recursive=recursive, output_dir=output_dir))
+    if shard:
+        shard_index, shard_count = shard
+        file_paths = [
+            file_path for file_path in file_paths
+            if _batch_shard_of(_batch_relative_path(normalized_directory, file_path), shard_count) == shard_index
+        ]
+    pending_indices = list(range(len(file_paths)))
+
+    manifest = None
+    manifest_path = None
+    deleted_keys = []
+    if incremental:
+        manifest_path = os.path.join(
+            _resolve_batch_state_dir(normalized_directory, output_dir),
+            _shard_state_filename(BATCH_MANIFEST_FILENAME, shard)
+        )
+        manifest = _load_batch_manifest(manifest_path)
+        pending_indices, skipped, deleted_keys = _plan_incremental_batch(
+            normalized_directory, file_paths, manifest, extract_images, recursive=recursive
+        )
+        for index in sorted(skipped):
+            yield index, skipped[index]
+
+    checkpoint_state = None
+    if checkpoint or resume:
+        checkpoint_path = os.path.join(
+            _resolve_batch_state_dir(normalized_directory, output_dir),
+            _shard_state_filename(BATCH_CHECKPOINT_FILENAME, shard)
+        )
+        checkpoint_header = _batch_checkpoint_header(normalized_directory, extract_images)
+        checkpoint_records = _load_batch_checkpoint(checkpoint_path, checkpoint_header) if resume else None
+        if checkpoint_records:
+            pending_indices, resumed = _plan_resumed_batch(
+                normalized_directory, file_paths, pending_indices, checkpoint_records,
+                content=convert_options.get('content', 'full'),
+                content_preview_bytes=convert_options.get('content_preview_bytes', DEFAULT_CONTENT_PREVIEW_BYTES),
+            )
+            for index in sorted(resumed):
+                yield index, resumed[index]
+        checkpoint_state = _open_batch_checkpoint(
+            checkpoint_path, checkpoint_header, append=checkpoint_records is not None
+        )
+
+    duplicates = {}
+    if dedup:
+        pending_indices, duplicates = _plan_batch_dedup(file_paths, pending_indices)
+
+    # 多个 Markdown 文件分组交给少数几个 Node.js 进程，避免每个文件都启动一次 Node.js
+    md_indices = []
+    if not output_archive:
+        md_indices = [index for index in pending_indices if file_paths[index].lower().endswith('.md')]
+        if len(md_indices) > 1:
+            md_index_set = set(md_indices)
+            pending_indices = [index for index in pending_indices if index not in md_index_set]
+        else:
+            md_indices = []
+
+    pending_paths = [file_paths[index] for index in pending_indices]
+    resolved_jobs = _resolve_batch_jobs(jobs)
+    dispatch_order = None
+    on_timing = None
+    if len(pending_paths) > 1 and (resolved_jobs > 1 or timeout or max_memory):
+        # 并行时按预估耗时从大到小提交，并用本轮实测更新各格式的耗时估计
+        cost_stats_path = _get_batch_cost_stats_path()
+        cost_model = _load_batch_cost_model(cost_stats_path)
+        dispatch_order, file_sizes = _plan_batch_dispatch_order(pending_paths, cost_model)
+        size_by_path = dict(zip(pending_paths, file_sizes))
+        timing_samples = {}
+
+        def on_timing(file_path, seconds, result):
+            _record_batch_timing(timing_samples, file_path, size_by_path.get(file_path, 0), seconds, result)
+
+    archive = None
+    convert_func = None
+    if output_archive:
+        try:
+            archive = _open_batch_archive(output_archive)
+        except (OSError, ValueError, tarfile.TarError) as e:
+            yield 0, {
+                'file': str(output_archive),
+                'result': {
+                    'success': False,
+                    'error': f'无法创建归档: {str(e)}'
+                }
+            }
+            return
+        convert_func = _convert_file_for_archive
+
+    def _archive_prefix(file_path):
+        rel_dir = _batch_relative_path(normalized_directory, file_path).rpartition('/')[0]
+        return f"{rel_dir}/" if rel_dir else ""
+
+    batch_results = _iter_batch_results(
+        pending_paths,
+        resolved_jobs,
+        dispatch_order=dispatch_order,
+        on_timing=on_timing,
+        convert_func=convert_func,
+        timeout=timeout,
+        max_memory=max_memory,
+        extract_images=extract_images,
+        output_dir=output_dir,
+        **convert_options
+    )
+
+    def _record_in_manifest(entry):
+        rel_path = _batch_relative_path(normalized_directory, entry['file'])
+        previous = manifest['files'].pop(rel_path, None)
+        if entry['result'].get('success'):
+            try:
+                record = _build_manifest_record(entry['file'], entry['result'], extract_images)
+            except OSError:
+                logger.debug("Failed to record manifest entry: %s", entry['file'], exc_info=True)
+            else:
+                manifest['files'][rel_path] = record
+                if previous:
+                    # 新结果不再包含的旧输出（例如图片数量减少）一并清理
+                    _remove_output_files(previous.get('outputs') or [], keep=record['outputs'])
+
+    md_batches = None
+    if md_indices:
+        md_batches = _start_md_batch_groups(
+            [file_paths[index] for index in md_indices], resolved_jobs, output_dir=output_dir, timeout=timeout
+        )
+
+    def _iter_converted():
+        for pending_index, entry in batch_results:
+            yield pending_indices[pending_index], entry
+        if md_batches is not None:
+            for md_position, entry in _iter_md_batch_group_results(md_batches):
+                yield md_indices[md_position], entry
+
+    archive_committed = False
+    try:
+        for index, entry in _iter_converted():
+            entries = [(index, entry)]
+            for duplicate_index in duplicates.pop(index, ()):
+                duplicate_path = file_paths[duplicate_index]
+                if archive is not None:
+                    duplicate_result = {key: value for key, value in entry['result'].items() if key != 'profile'}
+                    duplicate_result['deduplicated_from'] = entry['file']
+                    duplicate_result = _store_archive_result(
+                        archive, _archive_prefix(duplicate_path), duplicate_result,
+                        duplicate_base_name=os.path.splitext(os.path.basename(duplicate_path))[0]
+                    )
+                else:
+                    duplicate_result = _materialize_duplicate(
+                        duplicate_path, entry['file'], entry['result'], output_dir=output_dir, **convert_options
+                    )
+                entries.append((duplicate_index, {
+                    'file': duplicate_path,
+                    'result': duplicate_result
+                }))
+            if archive is not None:
+                entry['result'] = _store_archive_result(archive, _archive_prefix(entry['file']), entry['result'])
+            for entry_index, batch_entry in entries:
+                if manifest is not None:
+                    _record_in_manifest(batch_entry)
+                if checkpoint_state is not None:
+                    _append_batch_checkpoint(
+                        checkpoint_state, _batch_relative_path(normalized_directory, batch_entry['file']),
+                        batch_entry['file'], batch_entry['result']
+                    )
+                yield entry_index, batch_entry
+
+        if archive is not None:
+            _close_batch_archive(archive)
+            archive_committed = True
+    finally:
+        if archive is not None and not archive_committed:
+            _close_batch_archive(archive, commit=False)
+        if checkpoint_state is not None:
+            _close_batch_checkpoint(checkpoint_state)
+        if md_batches is not None:
+            md_batches['executor'].shutdown(wait=True)
+
+    if on_timing is not None:
+        _save_batch_cost_stats(cost_stats_path, cost_model, timing_samples)
+
+    if manifest is not None:
+        for offset, rel_path in enumerate(deleted_keys):
+            record = manifest['files'].pop(rel_path)
+            removed = _remove_output_files(record.get('outputs') or [])
+            yield len(file_paths) + offset, {
+                'file': os.path.join(normalized_directory, *rel_path.split('/')),
+                'result': {
+                    'success': True,
+                    'removed_outputs': removed,
+                }
+            }
+        _save_batch_manifest(manifest_path, manifest)
+
+def iter_batch_convert(directory, *args, **kwargs):
+    """
+    流式批量转换：每个文件转换完成后立即产出 {'file': ..., 'result': ...}（按完成顺序）
+
+    不在内存中累积结果，适合超大目录；参数同 batch_convert。
+    """
+    for _order, entry in _iter_batch_convert_entries(directory, *args, **kwargs):
+        yield entry
+
+def batch_convert(directory, recursive=True, extract_images=True, output_dir=None, jobs=None,
+                  incremental=False, cache_dir=None, cache_max_bytes=None,
+                  content='full', content_preview_bytes=DEFAULT_CONTENT_PREVIEW_BYTES, profile=False,
+                  timeout=None, max_memory=None, dedup=False, output_archive=None, checkpoint=False, resume=False,
+                  shard=None):
+    """
+    批量转换目录中的所有支持的文档
+
+    Args:
+        directory: 要扫描的目录
+        recursive: 是否递归扫描子目录
+        extract_images: 是否提取图片
+        output_dir: 可选的输出目录
+        jobs: 并行 worker 数（默认 CPU 核数；1 表示在当前进程串行转换）
+        incremental: 增量同步模式。根据输出目录中的清单跳过未变化的文件，
+            并删除源文件已不存在的输出
+        cache_dir / cache_max_bytes / content / content_preview_bytes / profile: 传给 convert_document
+        timeout: 单个文件的转换超时（秒）；设置后每个文件在隔离 worker 中转换，超时即终止该 worker
+        max_memory: 单个 worker 的内存上限（字节，POSIX 下通过 RLIMIT_AS 限制）；同样启用隔离 worker
+        dedup: 内容相同的文件只转换一次，其余副本通过硬链接/复制生成输出，结果带 'deduplicated_from'
+        output_archive: 输出归档路径（.zip/.tar/.tar.gz/.tgz）。设置后所有输出按输入目录结构写入该归档，
+            不创建输出目录，成功结果带归档内路径 'archive_path'；不支持增量模式，也不使用转换缓存
+        checkpoint: 每完成一个文件就向状态目录中的检查点日志追加一条记录（不含 Markdown 正文）
+        resume: 从检查点日志续转（隐含 checkpoint）：上次已成功且源文件未变化的文件直接还原结果
+            （带 'resumed': True），失败或未完成的文件重新转换；返回的列表合并新旧结果
+        shard: 'i/N' 或 (i, N)（i 从 1 开始）。按相对路径的稳定哈希只处理第 i 片文件，
+            各节点无需协调即可分得互不相交的子集；清单和检查点文件按分片区分。汇总用 merge_batch_summaries 合并
+
+    Returns:
+        转换结果列表（顺序与目录遍历顺序一致，与并行度无关）。增量模式下未变化的文件
+        带 'skipped': True，已删除源文件的条目带 'removed_outputs'，排在列表末尾
+    """
+    batch_entries = _iter_batch_convert_entries(
+        directory,
+        recursive=recursive,
+        extract_images=extract_images,
+        output_dir=output_dir,
+        jobs=jobs,
+        incremental=incremental,
+        cache_dir=cache_dir,
+        cache_max_bytes=cache_max_bytes,
+        content=content,
+        content_preview_bytes=content_preview_bytes,
+        profile=profile,
+        timeout=timeout,
+        max_memory=max_memory,
+        dedup=dedup,
+        output_archive=output_archive,
+        checkpoint=checkpoint,
+        resume=resume,
+        shard=shard,
+    )
+    ordered = sorted(batch_entries, key=lambda item: item[0])
+    return [entry for _order, entry in ordered]
+
+# ==================== asyncio API ====================
+
+async def convert_md_async(file_path, output_dir=None, executor=None):
+    """
+    convert_md 的异步版本：准备阶段（可能需要安装 Node.js 依赖）放到 executor 中执行，
+    Node.js 子进程由 asyncio 管理；任务被取消或超时时会终止子进程
+    """
+    loop = asyncio.get_running_loop()
+    command, error_result = await loop.run_in_executor(executor, _prepare_md_conversion, file_path, output_dir)
+    if error_result:
+        return error_result
+    cmd, env = command
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE, env=env
+        )
+    except Exception as e:
+        return {
+            'success': False,
+            'error': f'调用 Node.js 脚本失败: {str(e)}'
+        }
+
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), NODE_CONVERT_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return {
+            'success': False,
+            'error': '转换超时（超过2分钟）'
+        }
+    except asyncio.CancelledError:
+        process.kill()
+        raise
+
+    return _parse_md_conversion_output(
+        process.returncode,
+        stdout.decode('utf-8', errors='replace'),
+        stderr.decode('utf-8', errors='replace'),
+    )
+
+async def convert_document_async(file_path, extract_images=True, output_dir=None, executor=None, limiter=None,
+                                 **options):
+    """
+    convert_document 的异步版本，解析工作放到 executor 中执行，不阻塞事件循环
+
+    Args:
+        file_path / extract_images / output_dir / options: 同 convert_document
+        executor: concurrent.futures 执行器（默认使用事件循环的线程池）。解析是 CPU 密集型，
+            高并发服务建议传入以 _init_batch_worker 初始化的 ProcessPoolExecutor
+        limiter: 可选的 asyncio.Semaphore，多个调用共享以限制同时进行的转换数
+
+    取消任务时立即释放 limiter；尚未开始的执行器任务不会再运行，Markdown 转换的 Node.js
+    子进程会被终止，已在 worker 中运行的解析无法中断，其结果会被丢弃。
+    """
+    if limiter is not None:
+        await limiter.acquire()
+    try:
+        if os.path.splitext(str(file_path))[1].lower() == '.md':
+            file_path, _file_ext, error_result = _validate_conversion_request(file_path, options.get('content', 'full'))
+            if error_result:
+                return error_result
+            return await convert_md_async(file_path, output_dir, executor=executor)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, functools.partial(convert_document, file_path, extract_images, output_dir, **options)
+        )
+    finally:
+        if limiter is not None:
+            limiter.release()
+
+async def iter_batch_convert_async(directory, recursive=True, extract_images=True, output_dir=None,
+                                   executor=None, max_concurrency=None, **options):
+    """
+    异步批量转换：按完成顺序逐个产出 {'file': ..., 'result': ...}
+
+    同时最多进行 max_concurrency 个转换（默认 CPU 核数），其余文件在前面的任务完成后才提交。
+    提前退出迭代（break / aclose）或任务被取消时，尚未完成的转换会一并取消。
+    options 原样传给 convert_document（如 cache_dir、content、profile）。
+    """
+    normalized_directory = os.path.abspath(os.path.normpath(os.path.expanduser(str(directory))))
+    if not os.path.isdir(normalized_directory):
+        error = f'目录不存在: {normalized_directory}' if not os.path.exists(normalized_directory) \
+            else f'输入路径不是目录: {normalized_directory}'
+        yield {
+            'file': normalized_directory,
+            'result': {
+                'success': False,
+                'error': error
+            }
+        }
+        return
+
+    loop = asyncio.get_running_loop()
+    file_paths = await loop.run_in_executor(
+        None, lambda: list(_iter_batch_input_files(normalized_directory, recursive=recursive, output_dir=output_dir))
+    )
+    limit = max(int(max_concurrency or _resolve_batch_jobs(None)), 1)
+
+    async def _convert(file_path):
+        result = await convert_document_async(file_path, extract_images, output_dir, executor=executor, **options)
+        return {
+            'file': file_path,
+            'result': result
+        }
+
+    pending = iter(file_paths)
+    tasks = set()
+    try:
+        while True:
+            while len(tasks) < limit:
+                file_path = next(pending, None)
+                if file_path is None:
+                    break
+                tasks.add(asyncio.ensure_future(_convert(file_path)))
+            if not tasks:
+                return
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+# ==================== 常驻服务模式 ====================
+
+_SERVE_REQUEST_OPTIONS = (
+    'extract_images', 'output_dir', 'cache_dir', 'cache_max_bytes', 'content', 'content_preview_bytes', 'profile',
+)
+
+def _parse_serve_request(line, defaults):
+    """
+    解析一行 JSON 请求，返回 (request_id, convert_document 参数字典, 错误信息)
+
+    请求格式: {"id": ..., "file_path": "...", "extract_images": true, "output_dir": "..."}
+    """
+    try:
+        request = json.loads(line)
+    except ValueError as e:
+        return None, None, f'请求不是合法的 JSON: {str(e)}'
+    if not isinstance(request, dict):
+        return None, None, '请求必须是 JSON 对象'
+
+    request_id = request.get('id')
+    file_path = request.get('file_path')
+    if not file_path:
+        return request_id, None, '请求缺少 file_path'
+
+    kwargs = dict(defaults)
+    for key in _SERVE_REQUEST_OPTIONS:
+        if key in request:
+            kwargs[key] = request[key]
+    kwargs['file_path'] = file_path
+    return request_id, kwargs, None
+
+def _serve_stream(lines, write_line, executor, defaults):
+    """
+    处理一个 JSON-lines 请求流：每行一个请求，转换完成后立即写回一行结果（可能乱序，靠 id 对应）
+
+    返回前等待本流中提交的全部请求都已写回结果。
+    """
+    checked_exts = set()
+    outstanding = [0]
+    outstanding_changed = threading.Condition()
+
+    def _respond(request_id, result):
+        write_line(json.dumps({'id': request_id, 'result': result}, ensure_ascii=False))
+
+    for line in lines:
+        if not line.strip():
+            continue
+        request_id, kwargs, error = _parse_serve_request(line, defaults)
+        if error:
+            _respond(request_id, {'success': False, 'error': error})
+            continue
+
+        # 首次遇到某种格式时在主进程检查依赖，避免多个 worker 同时触发安装
+        file_ext = os.path.splitext(str(kwargs['file_path']))[1].lower()
+        if file_ext not in checked_exts:
+            checked_exts.add(file_ext)
+            if _DEPENDENCIES_BY_EXT.get(file_ext):
+                check_dependencies(file_ext)
+
+        try:
+            future = executor.submit(convert_document, **kwargs)
+        except Exception as e:
+            _respond(request_id, {'success': False, 'error': f'无法提交转换任务 ({type(e).__name__}): {str(e)}'})
+            continue
+
+        def _on_done(done_future, request_id=request_id):
+            try:
+                result = done_future.result()
+            except Exception as e:
+                result = {'success': False, 'error': f'转换 worker 异常 ({type(e).__name__}): {str(e)}'}
+            try:
+                _respond(request_id, result)
+            finally:
+                with outstanding_changed:
+                    outstanding[0] -= 1
+                    outstanding_changed.notify_all()
+
+        with outstanding_changed:
+            outstanding[0] += 1
+        future.add_done_callback(_on_done)
+
+    # 不能只等待 future 完成：回调在 future 状态变更后才执行，需等结果真正写出
+    with outstanding_changed:
+        while outstanding[0]:
+            outstanding_changed.wait()
+
+def serve(input_stream=None, output_stream=None, jobs=None, socket_path=None, **defaults):
+    """
+    常驻转换服务：读取 JSON-lines 请求并逐行输出 JSON 结果
+
+    解析库在 worker 进程中只导入一次、依赖检查结果在进程内缓存，
+    多次小文件转换无需重复支付解释器启动与 import 开销。
+
+    Args:
+        input_stream: 请求输入流（默认 stdin）；指定 socket_path 时忽略
+        output_stream: 结果输出流（默认 stdout）；指定 socket_path 时忽略
+        jobs: 并发转换的 worker 进程数（默认 CPU 核数）
+        socket_path: 可选的 Unix socket 路径，每个连接是一条独立的 JSON-lines 会话
+        **defaults: 请求未指定时使用的 convert_document 参数（如 cache_dir）
+    """
+    worker_count = _resolve_batch_jobs(jobs)
+    with ProcessPoolExecutor(max_workers=worker_count, initializer=_init_batch_worker) as executor:
+        if socket_path:
+            _serve_unix_socket(socket_path, executor, defaults)
+            return
+
+        input_stream = input_stream or sys.stdin
+        output_stream = output_stream or sys.stdout
+        write_lock = threading.Lock()
+
+        def _write_line(text):
+            with write_lock:
+                output_stream.write(text + "\n")
+                output_stream.flush()
+
+        _serve_stream(input_stream, _write_line, executor, defaults)
+
+def _serve_unix_socket(socket_path, executor, defaults):
+    """在 Unix socket 上提供服务，每个连接由独立线程处理，共享同一个 worker 进程池"""
+    import socket
+    import socketserver
+
+    if not hasattr(socket, 'AF_UNIX'):
+        raise OSError('当前平台不支持 Unix socket，请改用 stdin/stdout 模式')
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    class _Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            write_lock = threading.Lock()
+
+            def _write_line(text):
+                with write_lock:
+                    try:
+                        self.wfile.write((text + "\n").encode('utf-8'))
+                        self.wfile.flush()
+                    except (OSError, ValueError):
+                        logger.debug("Serve client disconnected before receiving a result", exc_info=True)
+
+            lines = (raw.decode('utf-8', errors='replace') for raw in self.rfile)
+            _serve_stream(lines, _write_line, executor, defaults)
+
+    class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    with _Server(socket_path, _Handler) as server:
+        print(f"[BruceDocConverter] 转换服务已启动: {socket_path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            try:
+                os.remove(socket_path)
+            except OSError:
+                pass
+
+# ==================== 共享目录任务队列 ====================
+
+def _prepare_spool_dirs(spool_dir):
+    """创建并返回队列目录：incoming/（待处理）、processing/<worker>/（已认领）、done/、failed/"""
+    spool_dir = os.path.abspath(os.path.normpath(os.path.expanduser(str(spool_dir))))
+    dirs = {'root': spool_dir}
+    for name in ('incoming', 'processing', 'done', 'failed'):
+        dirs[name] = os.path.join(spool_dir, name)
+        os.makedirs(dirs[name], exist_ok=True)
+    return dirs
+
+def _default_spool_worker_id():
+    import socket
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+def _is_spool_job_name(name):
+    """提交方应先写入临时名再改名放入 incoming/，隐藏文件和 .tmp/.part 文件视为尚未写完"""
+    return not name.startswith('.') and not name.endswith(('.tmp', '.part'))
+
+def _list_spool_incoming(incoming_dir):
+    """按修改时间（先提交先处理）列出待认领的任务名"""
+    jobs = []
+    try:
+        names = os.listdir(incoming_dir)
+    except OSError:
+        return []
+    for name in names:
+        if not _is_spool_job_name(name):
+            continue
+        try:
+            stat = os.stat(os.path.join(incoming_dir, name))
+        except OSError:
+            continue
+        if os.path.isfile(os.path.join(incoming_dir, name)):
+            jobs.append((stat.st_mtime, name))
+    return [name for _mtime, name in sorted(jobs)]
+
+def _claim_spool_job(dirs, worker_dir, name):
+    """
+    通过原子 rename 认领任务，成功时返回认领后的路径，已被其他 worker 抢先认领时返回 None
+
+    rename 保留原 mtime，认领后立即刷新 mtime 作为租约起点。
+    """
+    claimed_path = os.path.join(worker_dir, name)
+    try:
+        os.rename(os.path.join(dirs['incoming'], name), claimed_path)
+        os.utime(claimed_path)
+    except FileNotFoundError:
+        return None
+    return claimed_path
+
+def _recover_stale_spool_claims(dirs, lease_seconds, now=None):
+    """
+    把租约过期（mtime 超过 lease_seconds 未刷新）的已认领任务退回 incoming/，返回退回的任务名
+
+    多个 worker 同时回收时只有一个 rename 成功；失联 worker 留下的半成品目录一并删除。
+    """
+    now = time.time() if now is None else now
+    recovered = []
+    try:
+        worker_names = os.listdir(dirs['processing'])
+    except OSError:
+        return recovered
+
+    for worker_name in worker_names:
+        worker_dir = os.path.join(dirs['processing'], worker_name)
+        try:
+            names = os.listdir(worker_dir)
+        except OSError:
+            continue
+        for name in names:
+            claimed_path = os.path.join(worker_dir, name)
+            if name.endswith('.out') or not os.path.isfile(claimed_path):
+                continue
+            try:
+                if now - os.stat(claimed_path).st_mtime <= lease_seconds:
+                    continue
+                os.rename(claimed_path, os.path.join(dirs['incoming'], name))
+            except FileNotFoundError:
+                continue
+            shutil.rmtree(f"{claimed_path}.out", ignore_errors=True)
+            recovered.append(name)
+    return recovered
+
+@contextlib.contextmanager
+def _spool_lease_heartbeat(claimed_path, lease_seconds):
+    """
+    转换期间由后台线程定期刷新已认领任务的 mtime 续约
+
+    产出 {'lost': bool}：任务被其他 worker 当作过期回收后置为 True。
+    """
+    state = {'lost': False}
+    stopped = threading.Event()
+
+    def _renew():
+        while not stopped.wait(lease_seconds / 3):
+            try:
+                os.utime(claimed_path)
+            except FileNotFoundError:
+                state['lost'] = True
+                return
+            except OSError:
+                logger.debug("Failed to renew spool lease: %s", claimed_path, exc_info=True)
+
+    thread = threading.Thread(target=_renew, name='spool-lease', daemon=True)
+    thread.start()
+    try:
+        yield state
+    finally:
+        stopped.set()
+        thread.join()
+
+def _build_spool_request(dirs, claimed_path, work_dir, defaults):
+    """
+    把认领的任务转换为 convert_document 参数，返回 (kwargs, 错误信息)
+
+    文档文件直接转换；.json 任务文件格式同 --serve 请求，相对 file_path 按队列根目录解析。
+    未指定 output_dir 时输出写入任务自己的结果目录。
+    """
+    name = os.path.basename(claimed_path)
+    if name.lower().endswith('.json'):
+        try:
+            with open(claimed_path, 'r', encoding='utf-8') as f:
+                request_text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            return None, f'无法读取任务文件: {str(e)}'
+        _request_id, kwargs, error = _parse_serve_request(request_text, defaults)
+        if error:
+            return None, error
+        kwargs['file_path'] = os.path.join(dirs['root'], os.path.expanduser(str(kwargs['file_path'])))
+    elif os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS:
+        kwargs = dict(defaults, file_path=claimed_path)
+    else:
+        return None, f'不支持的任务文件: {name}（应为 {", ".join(SUPPORTED_EXTENSIONS)} 文档或 .json 任务）'
+    kwargs.setdefault('output_dir', work_dir)
+    return kwargs, None
+
+def _publish_spool_job(dirs, claimed_path, work_dir, worker_id, result):
+    """
+    发布任务：把认领的文件和结果 JSON 放进结果目录，再整体 rename 到 done/ 或 failed/
+
+    结果目录一次性出现，读取方不会看到写了一半的输出。租约已被回收时返回 None。
+    """
+    name = os.path.basename(claimed_path)
+    target_root = dirs['done'] if result.get('success') else dirs['failed']
+    final_dir = os.path.join(target_root, name)
+    if os.path.exists(final_dir):
+        final_dir = f"{final_dir}.{uuid.uuid4().hex[:8]}"
+
+    try:
+        os.rename(claimed_path, os.path.join(work_dir, name))
+    except FileNotFoundError:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return None
+
+    output_path = result.get('output_path')
+    if output_path and os.path.dirname(output_path) == work_dir:
+        result = dict(result, output_path=os.path.join(final_dir, os.path.basename(output_path)))
+    with open(os.path.join(work_dir, SPOOL_RESULT_FILENAME), 'w', encoding='utf-8') as f:
+        json.dump({'job': name, 'worker': worker_id, 'result': result}, f, ensure_ascii=False, indent=2)
+    os.rename(work_dir, final_dir)
+    return final_dir
+
+def _process_spool_job(dirs, claimed_path, worker_id, lease_seconds, defaults):
+    """转换一个已认领的任务并发布，返回 {'job', 'success', 'path'}；租约丢失时返回 None"""
+    work_dir = f"{claimed_path}.out"
+    os.makedirs(work_dir, exist_ok=True)
+    with _spool_lease_heartbeat(claimed_path, lease_seconds) as lease:
+        kwargs, error = _build_spool_request(dirs, claimed_path, work_dir, defaults)
+        if error:
+            result = {'success': False, 'error': error}
+        else:
+            try:
+                result = convert_document(**kwargs)
+            except Exception as e:
+                result = _conversion_error_result(e)
+    if lease['lost']:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        return None
+
+    final_dir = _publish_spool_job(dirs, claimed_path, work_dir, worker_id, result)
+    if final_dir is None:
+        return None
+    return {'job': os.path.basename(claimed_path), 'success': bool(result.get('success')), 'path': final_dir}
+
+def run_spool_worker(spool_dir, worker_id=None, lease_seconds=SPOOL_LEASE_SECONDS, poll_interval=SPOOL_POLL_SECONDS,
+                     once=False, on_job=None, **defaults):
+    """
+    共享目录任务队列 worker：从 incoming/ 认领任务，转换后发布到 done/ 或 failed/
+
+    多个 worker（同一主机或共享文件系统上的多台主机）可同时运行，无需中心调度：
+    认领通过 rename 原子完成，worker 失联后其任务在租约过期后由其他 worker 退回 incoming/。
+    每个任务的结果目录 done/<任务名>/ 包含原始任务文件、转换输出和 result.json。
+
+    Args:
+        spool_dir: 队列根目录
+        worker_id: worker 名称（默认 主机名-进程号），决定 processing/ 下的认领目录
+        lease_seconds: 租约时长，转换期间每隔 lease_seconds / 3 续约一次
+        poll_interval: incoming/ 为空时的轮询间隔（秒）
+        once: 处理完当前所有任务后退出，而不是持续轮询
+        on_job: 可选回调，每发布一个任务调用一次，参数为 {'job', 'success', 'path'}
+        **defaults: 传给 convert_document 的默认参数（如 content、cache_dir）
+
+    Returns:
+        {'processed', 'success', 'failed', 'recovered'} 统计
+    """
+    dirs = _prepare_spool_dirs(spool_dir)
+    worker_id = (worker_id or _default_spool_worker_id()).replace(os.sep, '_')
+    worker_dir = os.path.join(dirs['processing'], worker_id)
+    os.makedirs(worker_dir, exist_ok=True)
+    stats = {'processed': 0, 'success': 0, 'failed': 0, 'recovered': 0}
+
+    try:
+        while True:
+            stats['recovered'] += len(_recover_stale_spool_claims(dirs, lease_seconds))
+            claimed_any = False
+            for name in _list_spool_incoming(dirs['incoming']):
+                claimed_path = _claim_spool_job(dirs, worker_dir, name)
+                if claimed_path is None:
+                    continue
+                claimed_any = True
+                job = _process_spool_job(dirs, claimed_path, worker_id, lease_seconds, defaults)
+                if job is None:
+                    continue
+                stats['processed'] += 1
+                stats['success' if job['success'] else 'failed'] += 1
+                if on_job is not None:
+                    on_job(job)
+            if not claimed_any:
+                if once:
+                    return stats
+                time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        return stats
+
+# ==================== 命令行入口 ====================
+
+_CLI_VALUE_OPTIONS = {
+    '--jobs', '--cache-dir', '--cache-max-mb', '--socket', '--content', '--content-preview-kb',
+    '--timeout', '--max-memory-mb', '--output-archive', '--shard', '--spool', '--worker-id', '--lease',
+}
+_CLI_FLAG_OPTIONS = {
+    '--batch', '--cache', '--checkpoint', '--dedup', '--incremental', '--merge-shards', '--once', '--profile',
+    '--resume', '--serve', '--stream',
+}
+
+def _parse_cli_args(argv):
+    """
+    拆分命令行参数为位置参数和选项
+
+    支持 `--name value`、`--name=value` 两种写法；未知选项抛出 ValueError。
+
+    Returns:
+        (positional: list, options: dict)
+    """
+    positional = []
+    options = {}
+    index = 0
+    while index < len(argv):
+        arg = argv[index]
+        index += 1
+        if not arg.startswith('--'):
+            positional.append(arg)
+            continue
+
+        name, has_inline_value, inline_value = arg.partition('=')
+        if name in _CLI_FLAG_OPTIONS and not has_inline_value:
+            options[name] = True
+        elif name in _CLI_VALUE_OPTIONS:
+            if has_inline_value:
+                options[name] = inline_value
+            elif index < len(argv):
+                options[name] = argv[index]
+                index += 1
+            else:
+                raise ValueError(f'选项 {name} 需要一个参数值')
+        else:
+            raise ValueError(f'未知选项: {arg}')
+
+    return positional, options
+
+def _resolve_cli_cache_options(options):
+    """
+    解析缓存相关选项：--cache / --cache-dir 或设置了缓存目录环境变量时启用缓存
+
+    Returns:
+        (cache_dir or None, cache_max_bytes or None)
+    """
+    cache_dir = options.get('--cache-dir')
+    if not cache_dir and (options.get('--cache') or os.environ.get(CACHE_DIR_ENV)):
+        cache_dir = _get_default_cache_dir()
+    if cache_dir:
+        cache_dir = os.path.abspath(os.path.normpath(os.path.expanduser(str(cache_dir))))
+
+    cache_max_bytes = None
+    if '--cache-max-mb' in options:
+        try:
+            cache_max_bytes = int(float(options['--cache-max-mb']) * 1024 * 1024)
+        except ValueError:
+            raise ValueError(f"--cache-max-mb 需要数字参数: {options['--cache-max-mb']}")
+    return cache_dir, cache_max_bytes
+
+def _resolve_cli_content_options(options):
+    """解析 --content / --content-preview-kb，返回 (content, content_preview_bytes)"""
+    content = options.get('--content', 'full')
+    if content not in CONTENT_MODES:
+        raise ValueError(f'--content 可选值: {"|".join(CONTENT_MODES)}，当前: {content}')
+
+    preview_bytes = DEFAULT_CONTENT_PREVIEW_BYTES
+    if '--content-preview-kb' in options:
+        try:
+            preview_bytes = int(float(options['--content-preview-kb']) * 1024)
+        except ValueError:
+            raise ValueError(f"--content-preview-kb 需要数字参数: {options['--content-preview-kb']}")
+    return content, preview_bytes
+
+def _resolve_cli_limit_options(options):
+    """解析 --timeout / --max-memory-mb，返回 (timeout 秒, max_memory 字节)，未指定时为 None"""
+    timeout = None
+    if '--timeout' in options:
+        try:
+            timeout = float(options['--timeout'])
+        except ValueError:
+            raise ValueError(f"--timeout 需要数字参数（秒）: {options['--timeout']}")
+        if timeout <= 0:
+            raise ValueError(f"--timeout 必须大于 0: {options['--timeout']}")
+
+    max_memory = None
+    if '--max-memory-mb' in options:
+        try:
+            max_memory = int(float(options['--max-memory-mb']) * 1024 * 1024)
+        except ValueError:
+            raise ValueError(f"--max-memory-mb 需要数字参数: {options['--max-memory-mb']}")
+        if max_memory <= 0:
+            raise ValueError(f"--max-memory-mb 必须大于 0: {options['--max-memory-mb']}")
+    return timeout, max_memory
+
+def _resolve_cli_lease_option(options):
+    """解析 --lease，返回租约秒数（默认 SPOOL_LEASE_SECONDS）"""
+    if '--lease' not in options:
+        return SPOOL_LEASE_SECONDS
+    try:
+        lease_seconds = float(options['--lease'])
+    except ValueError:
+        raise ValueError(f"--lease 需要数字参数（秒）: {options['--lease']}")
+    if lease_seconds <= 0:
+        raise ValueError(f"--lease 必须大于 0: {options['--lease']}")
+    return lease_seconds
+
+def _accumulate_batch_summary(summary, entry):
+    """将单条批量结果计入汇总（总数、成功/失败、跳过/删除/去重/续转数、缓存命中、剖析数据），供流式输出逐条累计"""
+    result = entry['result']
+    summary['total'] += 1
+    if result.get('success'):
+        summary['success'] += 1
+    else:
+        summary['failed'] += 1
+
+    if result.get('skipped'):
+        summary['skipped'] = summary.get('skipped', 0) + 1
+    if 'removed_outputs' in result:
+        summary['removed'] = summary.get('removed', 0) + 1
+    if result.get('deduplicated_from'):
+        summary['deduplicated'] = summary.get('deduplicated', 0) + 1
+    if result.get('resumed'):
+        summary['resumed'] = summary.get('resumed', 0) + 1
+
+    cache_state = result.get('cache')
+    if cache_state:
+        cache_summary = summary.setdefault('cache', {'hits': 0, 'misses': 0})
+        cache_summary['hits' if cache_state == 'hit' else 'misses'] += 1
+
+    file_profile = result.get('profile')
+    if file_profile:
+        profile_summary = summary.setdefault('profile', {'files': 0, 'total': _new_stage_stats(), 'stages': {}})
+        profile_summary['files'] += 1
+        _merge_stage_stats(profile_summary['total'], dict(file_profile['total'], calls=1))
+        for stage_name, stats in file_profile['stages'].items():
+            _merge_stage_stats(profile_summary['stages'].setdefault(stage_name, _new_stage_stats()), stats)
+        for cache_name, stats in file_profile.get('caches', {}).items():
+            cache_stats = profile_summary.setdefault('caches', {}).get(cache_name, {'hits': 0, 'misses': 0})
+            profile_summary['caches'][cache_name] = _with_cache_hit_rate({
+                'hits': cache_stats['hits'] + stats['hits'],
+                'misses': cache_stats['misses'] + stats['misses'],
+            })
+    return summary
+
+def _summarize_batch_results(results):
+    """汇总批量转换结果：总数、成功/失败数，以及跳过、删除、去重和缓存命中统计"""
+    summary = {'total': 0, 'success': 0, 'failed': 0}
+    for entry in results:
+        _accumulate_batch_summary(summary, entry)
+    return summary
+
+def _print_usage():
+    print('用法: python convert_document.py <file_path> [extract_images] [output_dir]')
+    print('  file_path: 文档文件路径')
+    print('  extract_images: true/false (默认: true，提取图片到 images/ 子目录)')
+    print('  output_dir: 可选的输出目录')
+    print('')
+    print('支持的格式:')
+    print('  - Office/PDF 转 Markdown: .docx, .xlsx, .pptx, .pdf')
+    print('  - Markdown 转 Word: .md')
+    print('')
+    print('批量转换: python convert_document.py --batch <directory> [recursive] [--jobs N] [--incremental]')
+    print('  directory: 要扫描的目录')
+    print('  recursive: true/false (默认: true)')
+    print('  --jobs N: 并行转换的进程数 (默认: CPU 核数)')
+    print(f'  --incremental: 增量同步，依据输出目录中的 {BATCH_MANIFEST_FILENAME} 跳过未变化文件并清理已删除源文件的输出')
+    print('  --dedup: 内容相同的文件只转换一次，其余副本的输出通过硬链接或复制生成（结果带 deduplicated_from）')
+    print('  --output-archive FILE: 把所有输出（Markdown、图片、Word）按目录结构直接写入一个 .zip/.tar/.tar.gz 归档，')
+    print('            不创建 Markdown/ 等输出目录；不能与 --incremental、--checkpoint、--resume 同时使用')
+    print(f'  --checkpoint: 每完成一个文件就向输出目录中的 {BATCH_CHECKPOINT_FILENAME} 追加一条记录')
+    print('  --resume: 从检查点续转（隐含 --checkpoint），跳过上次已成功且未变化的文件，失败的文件重试；')
+    print('            汇总合并新旧结果，续转还原的条目带 resumed: true')
+    print('  --shard i/N: 只处理按相对路径哈希分到第 i 片（共 N 片，i 从 1 开始）的文件，多台机器各取一片即可无协调分工')
+    print('')
+    print('  --stream: 每个文件完成后立即输出一行紧凑 JSON {"file": ..., "result": ...}，')
+    print('            最后一行输出汇总 {"total": ..., "success": ..., "failed": ...}，内存占用与目录规模无关')
+    print('  --timeout SECONDS: 单个文件的转换超时，超时的文件记为失败 (error_type: timeout) 并继续处理其余文件')
+    print('  --max-memory-mb N: 单个 worker 的内存上限，超限的文件记为失败 (error_type: memory)')
+    print('            指定任一限制时，每个文件都在隔离的 worker 进程中转换，崩溃或被系统终止也不影响整个批次')
+    print('')
+    print('合并分片汇总: python convert_document.py --merge-shards <shard1.json> <shard2.json> ...')
+    print('  输入为各分片 --batch 的 JSON 输出（或 --stream 的逐行输出），按单机批量转换的格式输出合并后的汇总，')
+    print('  并在 shards 字段列出已合并和缺失的分片')
+    print('')
+    print('任务队列: python convert_document.py --spool <dir> [--worker-id NAME] [--lease SECONDS] [--once]')
+    print('  多个 worker 共享同一目录：把文档或 JSON 任务（格式同 --serve 请求）放入 <dir>/incoming/，')
+    print('  worker 以原子 rename 认领到 processing/<worker>/，完成后整体发布到 done/<任务名>/ 或 failed/<任务名>/')
+    print('  （含原始任务文件、转换输出和 result.json）。提交时请先写临时名（.tmp/.part 或 . 开头）再改名')
+    print(f'  --lease SECONDS: 认领租约时长，超时未续约的任务会被退回 incoming/ 重新处理 (默认: {int(SPOOL_LEASE_SECONDS)})')
+    print('  --once: 处理完当前所有任务后退出（默认持续轮询）')
+    print('')
+    print('常驻服务: python convert_document.py --serve [--socket PATH] [--jobs N]')
+    print('  每行读取一个 JSON 请求 {"id": ..., "file_path": "...", "extract_images": true, "output_dir": "..."}')
+    print('  每行输出一个 JSON 结果 {"id": ..., "result": {...}}，并发处理，结果按完成顺序输出')
+    print('  --socket PATH: 监听 Unix socket 而不是 stdin/stdout')
+    print(f'  设置环境变量 {MD_WORKER_ENV}=1 时，Markdown 转 Word 交给常驻的 Node.js worker，')
+    print(f'  省去每个文件启动 Node.js 和加载模块的开销（处理 {MD_WORKER_MAX_JOBS} 个文件或崩溃后自动重启）')
+    print('')
+    print('通用选项:')
+    print(f'  --cache: 启用转换缓存 (默认目录: {_get_default_cache_dir()}，可用环境变量 {CACHE_DIR_ENV} 覆盖)')
+    print('  --cache-dir DIR: 指定转换缓存目录（隐含 --cache）')
+    print(f'  --cache-max-mb N: 缓存容量上限，超出后按最近最少使用淘汰 (默认: {DEFAULT_CACHE_MAX_BYTES // (1024 * 1024)})')
+    print('  --content full|preview|none: 结果中 markdown_content 的返回方式 (默认: full)')
+    print('      preview 仅返回前 N KB 并附带 content_stats（字节数、行数、标题数）；none 只返回路径和统计')
+    print(f'  --content-preview-kb N: preview 模式返回的大小 (默认: {DEFAULT_CONTENT_PREVIEW_BYTES // 1024})')
+    print('  --profile: 记录各阶段（以及 PDF 逐页）的墙钟时间、CPU 时间和峰值内存，写入结果的 profile 字段；')
+    print('             批量模式在汇总中按阶段累计')
+    print(f'  设置环境变量 {DOCX_STREAMING_ENV}=1 时，Word 文档改为从 zip 包中流式解析正文，不构建完整的文档对象，')
+    print('  峰值内存不随文档长度增长，适合以表格为主的超大导出文件（输出与默认方式一致）')
+
+def main():
+    try:
+        positional, options = _parse_cli_args(sys.argv[1:])
+        cache_dir, cache_max_bytes = _resolve_cli_cache_options(options)
+        content, content_preview_bytes = _resolve_cli_content_options(options)
+        timeout, max_memory = _resolve_cli_limit_options(options)
+        shard = _parse_batch_shard(options.get('--shard'))
+        lease_seconds = _resolve_cli_lease_option(options)
+    except ValueError as e:
+        print(f'错误: {str(e)}')
+        sys.exit(1)
+
+    jobs = None
+    if '--jobs' in options:
+        try:
+            jobs = int(options['--jobs'])
+        except ValueError:
+            print(f"错误: --jobs 需要整数参数: {options['--jobs']}")
+            sys.exit(1)
+
+    # 常驻服务模式
+    if options.get('--serve'):
+        serve(
+            jobs=jobs,
+            socket_path=options.get('--socket'),
+            cache_dir=cache_dir,
+            cache_max_bytes=cache_max_bytes,
+            content=content,
+            content_preview_bytes=content_preview_bytes,
+            profile=bool(options.get('--profile')),
+        )
+        sys.exit(0)
+
+    # 共享目录任务队列 worker
+    if options.get('--spool'):
+        def _print_job(job):
+            print(json.dumps(job, ensure_ascii=False, separators=(',', ':')), flush=True)
+
+        stats = run_spool_worker(
+            options['--spool'],
+            worker_id=options.get('--worker-id'),
+            lease_seconds=lease_seconds,
+            once=bool(options.get('--once')),
+            on_job=_print_job,
+            cache_dir=cache_dir,
+            cache_max_bytes=cache_max_bytes,
+            content=content,
+            content_preview_bytes=content_preview_bytes,
+            profile=bool(options.get('--profile')),
+        )
+        print(json.dumps(stats, ensure_ascii=False, separators=(',', ':')), flush=True)
+        sys.exit(0)
+
+    # 合并分片汇总
+    if options.get('--merge-shards'):
+        if not positional:
+            print('错误: 合并分片需要指定各分片的输出文件')
+            sys.exit(1)
+        try:
+            summary = merge_batch_summaries(positional)
+        except (OSError, ValueError) as e:
+            print(f'错误: {str(e)}')
+            sys.exit(1)
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        sys.exit(0 if summary['failed'] == 0 and not summary.get('shards', {}).get('missing') else 1)
+
+    if not positional and not options.get('--batch'):
+        _print_usage()
+        sys.exit(1)
+
+    # 批量转换模式
+    if options.get('--batch'):
+        if not positional:
+            print('错误: 批量转换需要指定目录')
+            sys.exit(1)
+
+        directory = positional[0]
+        recursive = positional[1].lower() == 'true' if len(positional) > 1 else True
+        batch_kwargs = {
+            'jobs': jobs,
+            'cache_dir': cache_dir,
+            'cache_max_bytes': cache_max_bytes,
+            'incremental': bool(options.get('--incremental')),
+            'content': content,
+            'content_preview_bytes': content_preview_bytes,
+            'profile': bool(options.get('--profile')),
+            'timeout': timeout,
+            'max_memory': max_memory,
+            'dedup': bool(options.get('--dedup')),
+            'output_archive': options.get('--output-archive'),
+            'checkpoint': bool(options.get('--checkpoint')),
+            'resume': bool(options.get('--resume')),
+            'shard': shard,
+        }
+
+        if options.get('--stream'):
+            summary = {'total': 0, 'success': 0, 'failed': 0}
+            for entry in iter_batch_convert(directory, recursive, **batch_kwargs):
+                _accumulate_batch_summary(summary, entry)
+                print(json.dumps(entry, ensure_ascii=False, separators=(',', ':')), flush=True)
+            if shard:
+                summary['shard'] = {'index': shard[0], 'count': shard[1]}
+            print(json.dumps(summary, ensure_ascii=False, separators=(',', ':')), flush=True)
+            sys.exit(0 if summary['failed'] == 0 else 1)
+
+        results = batch_convert(directory, recursive, **batch_kwargs)
+
+        # 输出结果统计
+        summary = _summarize_batch_results(results)
+        if shard:
+            summary['shard'] = {'index': shard[0], 'count': shard[1]}
+        summary['results'] = results
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+        sys.exit(0 if summary['failed'] == 0 else 1)
+
+    # 单文件转换模式
+    file_path = positional[0]
+    extract_images = positional[1].lower() == 'true' if len(positional) > 1 else True
+    output_dir = positional[2] if len(positional) > 2 else None
+
+    result = convert_document(
+        file_path,
+        extract_images,
+        output_dir,
+        cache_dir=cache_dir,
+        cache_max_bytes=cache_max_bytes,
+        content=content,
+        content_preview_bytes=content_preview_bytes,
+        profile=bool(options.get('--profile')),
+    )
 
     # 输出结果为 JSON
     print(json.dumps(result, ensure_ascii=False, indent=2))
@@ -2,10 +2,46 @@
 /**
  * Markdown 转 DOCX 命令行工具
  * 用法: node index.js <input.md> [output_dir]
+ *       node index.js --stdin < jobs.json
+ *
+ * --stdin 模式从标准输入读取 JSON 任务列表 [{"index": 0, "input": "a.md", "output_dir": null}, ...]，
+ * 在同一进程中依次转换，每完成一个任务输出一行 JSON {"index": ..., "result": {...}}。
+ * docx、jsdom 等模块只加载一次，适合批量转换大量 Markdown 文件。
+ *
+ *       node index.js --serve
+ *
+ * --serve 模式常驻运行：每从标准输入读到一行 JSON 请求 {"id": ..., "input": "a.md", "output_dir": null}，
+ * 转换后输出一行 {"id": ..., "result": {...}}，标准输入关闭时退出。启动时即预加载模块、样式和编号定义。
  */
 
 const fs = require('fs');
 const path = require('path');
+const readline = require('readline');
+
+let converterModules = null;
+
+/**
+ * 加载转换所需的模块以及样式、编号、页边距定义；进程内只加载一次
+ * @returns {Object} 转换模块与文档定义
+ */
+function loadConverterModules() {
+  if (!converterModules) {
+    const { Document, Packer } = require('docx');
+    const { markdownToHTML } = require('./markdown-converter');
+    const { convertHTMLToDocx } = require('./html-converter');
+    const { createStyles, createNumbering, createMargins } = require('./styles');
+    converterModules = {
+      Document,
+      Packer,
+      markdownToHTML,
+      convertHTMLToDocx,
+      styles: createStyles(),
+      numbering: createNumbering(),
+      margins: createMargins()
+    };
+  }
+  return converterModules;
+}
 
 /**
  * 将 Markdown 文件转换为 DOCX
@@ -15,10 +51,7 @@ const path = require('path');
  */
 async function convertMarkdownToDocx(inputPath, outputDir) {
   try {
-    const { Document, Packer } = require('docx');
-    const { markdownToHTML } = require('./markdown-converter');
-    const { convertHTMLToDocx } = require('./html-converter');
-    const { createStyles, createNumbering, createMargins } = require('./styles');
+    const { Document, Packer, markdownToHTML, convertHTMLToDocx, styles, numbering, margins } = loadConverterModules();
 
     // 验证输入文件
     if (!fs.existsSync(inputPath)) {
@@ -37,10 +70,10 @@ async function convertMarkdownToDocx(inputPath, outputDir) {
 
     // 创建文档
     const doc = new Document({
-      styles: createStyles(),
-      numbering: createNumbering(),
+      styles,
+      numbering,
       sections: [{
-        properties: { page: { margin: createMargins() } },
+        properties: { page: { margin: margins } },
         children: docxChildren
       }]
     });
@@ -81,14 +114,108 @@ async function convertMarkdownToDocx(inputPath, outputDir) {
   }
 }
 
+/**
+ * 依次转换任务列表中的 Markdown 文件
+ * @param {Array<Object>} jobs - 任务列表，每项包含 input、可选的 output_dir 和 index
+ * @param {Function} onResult - 每个任务完成后以 {index, result} 调用
+ * @returns {boolean} 是否全部成功
+ */
+async function convertJobList(jobs, onResult) {
+  let allSucceeded = true;
+  for (let position = 0; position < jobs.length; position++) {
+    const job = jobs[position] || {};
+    const index = job.index !== undefined ? job.index : position;
+    const result = job.input
+      ? await convertMarkdownToDocx(job.input, job.output_dir || null)
+      : { success: false, error: '任务缺少 input' };
+    allSucceeded = allSucceeded && result.success;
+    onResult({ index, result });
+  }
+  return allSucceeded;
+}
+
+function readStdin() {
+  return new Promise((resolve, reject) => {
+    const chunks = [];
+    process.stdin.on('data', chunk => chunks.push(chunk));
+    process.stdin.on('end', () => resolve(Buffer.concat(chunks).toString('utf-8')));
+    process.stdin.on('error', reject);
+  });
+}
+
+function exitAfterFlush(code) {
+  // 标准输出为管道时写入可能是异步的，等缓冲区写完再退出，避免截断最后几行结果
+  process.stdout.write('', () => process.exit(code));
+}
+
+async function runJobListFromStdin() {
+  let jobs;
+  try {
+    jobs = JSON.parse(await readStdin());
+  } catch (error) {
+    console.log(JSON.stringify({ success: false, error: `任务列表不是合法的 JSON: ${error.message}` }));
+    exitAfterFlush(1);
+    return;
+  }
+  if (!Array.isArray(jobs)) {
+    console.log(JSON.stringify({ success: false, error: '任务列表必须是 JSON 数组' }));
+    exitAfterFlush(1);
+    return;
+  }
+
+  const allSucceeded = await convertJobList(jobs, item => {
+    process.stdout.write(JSON.stringify(item) + '\n');
+  });
+  exitAfterFlush(allSucceeded ? 0 : 1);
+}
+
+async function serve() {
+  try {
+    loadConverterModules();
+  } catch (error) {
+    // 依赖缺失时不退出，每个请求都会返回同样的错误
+  }
+
+  const lines = readline.createInterface({ input: process.stdin, crlfDelay: Infinity });
+  for await (const line of lines) {
+    if (!line.trim()) {
+      continue;
+    }
+    let request;
+    try {
+      request = JSON.parse(line);
+    } catch (error) {
+      process.stdout.write(JSON.stringify({
+        id: null,
+        result: { success: false, error: `请求不是合法的 JSON: ${error.message}` }
+      }) + '\n');
+      continue;
+    }
+    const result = request && request.input
+      ? await convertMarkdownToDocx(request.input, request.output_dir || null)
+      : { success: false, error: '请求缺少 input' };
+    process.stdout.write(JSON.stringify({ id: request ? request.id : null, result }) + '\n');
+  }
+  exitAfterFlush(0);
+}
+
 // 命令行入口
 async function main() {
   const args = process.argv.slice(2);
 
+  if (args[0] === '--stdin') {
+    await runJobListFromStdin();
+    return;
+  }
+  if (args[0] === '--serve') {
+    await serve();
+    return;
+  }
+
   if (args.includes('-h') || args.includes('--help')) {
     console.log(JSON.stringify({
       success: true,
-      usage: 'node index.js <input.md> [output_dir]'
+      usage: 'node index.js <input.md> [output_dir] | node index.js --stdin < jobs.json | node index.js --serve'
     }, null, 2));
     process.exit(0);
   }
@@ -110,4 +237,11 @@ async function main() {
   process.exit(result.success ? 0 : 1);
 }
 
-main();
+if (require.main === module) {
+  main();
+}
+
+module.exports = {
+  convertMarkdownToDocx,
+  convertJobList
+};
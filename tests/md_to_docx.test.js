@@ -60,3 +60,17 @@ test('fenced code block 保留首个空行，只移除 fence 结尾带来的一
 
   assert.equal(html, '<pre><code class="language-js">\nconst x = 1;\n</code></pre>');
 });
+
+test('convertJobList 在同一进程中按顺序转换任务并回传原始 index', async () => {
+  const { convertJobList } = require('../scripts/md_to_docx/index');
+  const seen = [];
+
+  const allSucceeded = await convertJobList(
+    [{ index: 7, input: '' }, { input: '' }],
+    item => seen.push(item)
+  );
+
+  assert.equal(allSucceeded, false);
+  assert.deepEqual(seen.map(item => item.index), [7, 1]);
+  assert.equal(seen[0].result.error, '任务缺少 input');
+});
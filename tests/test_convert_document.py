@@ -1,6 +1,17 @@
+import asyncio
 import base64
+import io
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import tarfile
 import tempfile
+import time
 import unittest
+import zipfile
 from datetime import date
 from pathlib import Path
 from unittest.mock import patch
@@ -8,20 +19,39 @@ from unittest.mock import patch
 import openpyxl
 from docx import Document
 from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
 from pptx.chart.data import CategoryChartData
 from pptx.enum.chart import XL_CHART_TYPE
 from pptx import Presentation
 from pptx.util import Inches
 
 from scripts.convert_document import (
+    BATCH_CHECKPOINT_FILENAME,
     _detect_image_format,
     _extract_pdf_page_blocks,
+    _load_batch_cost_model,
+    _make_memory_image_sink,
+    _plan_batch_dispatch_order,
     _get_image_dimensions,
     _is_decorative_image,
     _postprocess_pdf_academic_sections,
     _render_docx_list_marker,
+    _summarize_batch_results,
     batch_convert,
     convert_document,
+    convert_document_async,
+    convert_md_async,
+    convert_docx,
+    convert_md,
+    convert_md_batch,
+    convert_pptx,
+    convert_stream,
+    iter_batch_convert_async,
+    merge_batch_summaries,
+    run_spool_worker,
+    shutdown_md_worker,
+    serve,
 )
 
 
@@ -47,6 +77,35 @@ class ConvertDocumentTests(unittest.TestCase):
             self.assertNotIn("目录", result["markdown_content"])
             self.assertIn("正文开始", result["markdown_content"])
 
+    def test_convert_docx_single_pass_walk_keeps_body_order_and_skips_toc_fields(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            docx_path = tmp_path / "walk.docx"
+
+            document = Document()
+            toc_run = document.add_paragraph().add_run()
+            for tag, value in (("w:fldChar", "begin"), ("w:instrText", ' TOC \\o "1-3" '), ("w:fldChar", "end")):
+                node = OxmlElement(tag)
+                if tag == "w:instrText":
+                    node.text = value
+                else:
+                    node.set(qn("w:fldCharType"), value)
+                toc_run._r.append(node)
+            toc_run.add_text("第一章 ...... 1")
+            document.add_paragraph("表格之前")
+            table = document.add_table(rows=1, cols=2)
+            table.cell(0, 0).text = "第一行"
+            table.cell(0, 0).add_paragraph("第二行")
+            table.cell(0, 1).text = "B"
+            document.add_paragraph("表格之后")
+            document.save(docx_path)
+
+            markdown, _images = convert_docx(str(docx_path))
+
+            self.assertNotIn("第一章", markdown)
+            self.assertLess(markdown.index("表格之前"), markdown.index("| 第一行 第二行 | B |"))
+            self.assertLess(markdown.index("| 第一行 第二行 | B |"), markdown.index("表格之后"))
+
     def test_render_docx_list_marker_preserves_multilevel_and_common_formats(self):
         numbering_state = {}
         levels = {
@@ -183,6 +242,22 @@ class ConvertDocumentTests(unittest.TestCase):
             self.assertIn("普通文本框", result["markdown_content"])
             self.assertTrue(Path(result["output_path"]).exists())
 
+    def test_convert_pptx_table_keeps_every_cell(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pptx_path = Path(tmp_dir) / "table.pptx"
+            presentation = Presentation()
+            slide = presentation.slides.add_slide(presentation.slide_layouts[6])
+            table = slide.shapes.add_table(3, 3, Inches(1), Inches(1), Inches(6), Inches(2)).table
+            for row_index, row in enumerate(table.rows):
+                for col_index, cell in enumerate(row.cells):
+                    cell.text = f"r{row_index}c{col_index}"
+            presentation.save(pptx_path)
+
+            markdown, _images = convert_pptx(str(pptx_path))
+
+            self.assertIn("| r0c0 | r0c1 | r0c2 |\n| --- | --- | --- |\n| r1c0 | r1c1 | r1c2 |", markdown)
+            self.assertIn("| r2c0 | r2c1 | r2c2 |", markdown)
+
     def test_convert_pptx_sorts_visual_order_and_splits_columns(self):
         with tempfile.TemporaryDirectory() as tmp_dir:
             tmp_path = Path(tmp_dir)
@@ -479,6 +554,495 @@ class ConvertDocumentTests(unittest.TestCase):
             self.assertEqual(["source.docx"], seen)
             self.assertEqual(1, len(results))
 
+    def test_batch_convert_parallel_keeps_walk_order(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            for name in ("b.docx", "a.docx", "c.docx"):
+                document = Document()
+                document.add_paragraph(f"内容 {name}")
+                document.save(root / name)
+            (root / "broken.docx").write_bytes(b"not a zip")
+
+            results = batch_convert(str(root), recursive=True, jobs=2)
+
+            self.assertEqual(
+                ["a.docx", "b.docx", "broken.docx", "c.docx"],
+                [Path(entry["file"]).name for entry in results],
+            )
+            self.assertTrue(results[0]["result"]["success"], results[0])
+            self.assertIn("内容 a.docx", results[0]["result"]["markdown_content"])
+            self.assertFalse(results[2]["result"]["success"])
+            self.assertIn("内容 c.docx", results[3]["result"]["markdown_content"])
+
+    @unittest.skipUnless(
+        hasattr(signal, "SIGKILL") and multiprocessing.get_start_method() == "fork",
+        "patched converter is inherited by isolated workers only with fork",
+    )
+    def test_batch_convert_isolates_timeouts_and_killed_workers(self):
+        real_convert_document = convert_document
+
+        def flaky_convert_document(file_path, **kwargs):
+            name = Path(file_path).name
+            if name == "hang.docx":
+                time.sleep(60)
+            if name == "killed.docx":
+                os.kill(os.getpid(), signal.SIGKILL)
+            return real_convert_document(file_path, **kwargs)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            for name in ("hang.docx", "killed.docx", "ok.docx", "ok2.docx"):
+                document = Document()
+                document.add_paragraph(f"内容 {name}")
+                document.save(root / name)
+
+            started = time.monotonic()
+            with patch("scripts.convert_document.convert_document", side_effect=flaky_convert_document):
+                results = batch_convert(str(root), jobs=2, timeout=2)
+
+            self.assertLess(time.monotonic() - started, 30)
+            by_name = {Path(entry["file"]).name: entry["result"] for entry in results}
+            self.assertEqual("timeout", by_name["hang.docx"]["error_type"])
+            self.assertFalse(by_name["hang.docx"]["success"])
+            self.assertEqual("memory", by_name["killed.docx"]["error_type"])
+            self.assertIn("内容 ok.docx", by_name["ok.docx"]["markdown_content"])
+            self.assertIn("内容 ok2.docx", by_name["ok2.docx"]["markdown_content"])
+
+    def test_batch_dispatch_order_uses_size_format_cost_and_learned_stats(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            sizes = {"a.docx": 1024 * 1024, "b.pdf": 512 * 1024, "c.xlsx": 2 * 1024 * 1024}
+            for name, size in sizes.items():
+                (root / name).write_bytes(b"\0" * size)
+            paths = [str(root / name) for name in sizes]
+            stats_path = root / "stats.json"
+
+            order, file_sizes = _plan_batch_dispatch_order(paths, _load_batch_cost_model(str(stats_path)))
+            self.assertEqual(["b.pdf", "a.docx", "c.xlsx"], [Path(paths[i]).name for i in order])
+            self.assertEqual(list(sizes.values()), file_sizes)
+
+            stats_path.write_text(json.dumps({"version": 1, "formats": {".pdf": {"seconds_per_mb": 1.0}}}))
+            order, _ = _plan_batch_dispatch_order(paths, _load_batch_cost_model(str(stats_path)))
+            self.assertEqual(["a.docx", "c.xlsx", "b.pdf"], [Path(paths[i]).name for i in order])
+
+            docs_dir = root / "docs"
+            docs_dir.mkdir()
+            for name in ("x.docx", "y.docx"):
+                document = Document()
+                document.add_paragraph(name)
+                document.save(docs_dir / name)
+            with patch.dict(os.environ, {"BRUCE_DOC_CONVERTER_BATCH_STATS": str(stats_path)}):
+                results = batch_convert(str(docs_dir), jobs=2)
+
+            self.assertEqual(["x.docx", "y.docx"], [Path(entry["file"]).name for entry in results])
+            learned = json.loads(stats_path.read_text())["formats"]
+            self.assertEqual(1.0, learned[".pdf"]["seconds_per_mb"])
+            self.assertGreater(learned[".docx"]["seconds_per_mb"], 0)
+
+    def test_batch_convert_dedup_converts_identical_inputs_once(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            (root / "a").mkdir()
+            (root / "b").mkdir()
+            img_path = root / "img.png"
+            img_path.write_bytes(self._make_test_png(200, 150))
+            document = Document()
+            document.add_paragraph("附件正文")
+            document.add_picture(str(img_path), width=Inches(2))
+            document.save(root / "a" / "report.docx")
+            (root / "b" / "copy.docx").write_bytes((root / "a" / "report.docx").read_bytes())
+            img_path.unlink()
+
+            with patch("scripts.convert_document.convert_docx", wraps=convert_docx) as converter:
+                results = batch_convert(str(root), jobs=1, dedup=True)
+
+            self.assertEqual(1, converter.call_count)
+            original, duplicate = (entry["result"] for entry in results)
+            self.assertTrue(duplicate["success"], duplicate)
+            self.assertEqual(str(root / "a" / "report.docx"), duplicate["deduplicated_from"])
+            self.assertNotIn("deduplicated_from", original)
+            self.assertEqual(["images/copy_img_001.png"], duplicate["extracted_images"])
+            self.assertIn("](images/copy_img_001.png)", duplicate["markdown_content"])
+            copied_markdown = (root / "b" / "Markdown" / "copy.md").read_text(encoding="utf-8")
+            self.assertEqual(duplicate["markdown_content"], copied_markdown)
+            self.assertEqual(
+                (root / "a" / "Markdown" / "images" / "report_img_001.png").read_bytes(),
+                (root / "b" / "Markdown" / "images" / "copy_img_001.png").read_bytes(),
+            )
+            self.assertEqual(1, _summarize_batch_results(results)["deduplicated"])
+
+    def test_batch_convert_writes_outputs_into_archive_without_output_dirs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir) / "docs"
+            (root / "sub").mkdir(parents=True)
+            img_path = Path(tmp_dir) / "img.png"
+            img_path.write_bytes(self._make_test_png(200, 150))
+            document = Document()
+            document.add_paragraph("归档正文")
+            document.add_picture(str(img_path), width=Inches(2))
+            document.save(root / "sub" / "report.docx")
+            (root / "copy.docx").write_bytes((root / "sub" / "report.docx").read_bytes())
+
+            zip_path = Path(tmp_dir) / "out.zip"
+            results = batch_convert(str(root), jobs=1, dedup=True, output_archive=str(zip_path))
+
+            self.assertTrue(all(entry["result"]["success"] for entry in results), results)
+            by_file = {Path(entry["file"]).name: entry["result"] for entry in results}
+            self.assertEqual("sub/report.md", by_file["report.docx"]["archive_path"])
+            self.assertEqual("copy.md", by_file["copy.docx"]["archive_path"])
+            self.assertNotIn("output_path", by_file["report.docx"])
+            self.assertFalse(any(path.name == "Markdown" for path in root.rglob("*")))
+            with zipfile.ZipFile(zip_path) as archive:
+                self.assertEqual(
+                    ["copy.md", "images/copy_img_001.png", "sub/images/report_img_001.png", "sub/report.md"],
+                    sorted(archive.namelist()),
+                )
+                self.assertIn("](images/copy_img_001.png)", archive.read("copy.md").decode("utf-8"))
+                self.assertEqual(zipfile.ZIP_STORED, archive.getinfo("sub/images/report_img_001.png").compress_type)
+
+            tar_path = Path(tmp_dir) / "out.tar.gz"
+            results = batch_convert(str(root), jobs=1, output_archive=str(tar_path))
+            self.assertTrue(all(entry["result"]["success"] for entry in results), results)
+            with tarfile.open(tar_path) as archive:
+                self.assertIn("sub/report.md", archive.getnames())
+            self.assertEqual([], list(Path(tmp_dir).glob("*.tmp")))
+
+            rejected = batch_convert(str(root), output_archive=str(zip_path), incremental=True)
+            self.assertFalse(rejected[0]["result"]["success"])
+
+    def test_batch_convert_resume_skips_checkpointed_files_and_retries_failures(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            for name in ("a.docx", "b.docx", "c.docx"):
+                document = Document()
+                document.add_paragraph(f"内容 {name}")
+                document.save(root / name)
+            (root / "broken.docx").write_bytes(b"not a zip")
+
+            first = batch_convert(str(root), jobs=1, checkpoint=True)
+            self.assertEqual([True, True, False, True], [entry["result"]["success"] for entry in first])
+            checkpoint_path = root / "Markdown" / BATCH_CHECKPOINT_FILENAME
+            lines = checkpoint_path.read_text(encoding="utf-8").splitlines()
+            self.assertEqual(5, len(lines))
+            self.assertNotIn("markdown_content", json.loads(lines[1])["result"])
+
+            # 模拟在写入 c.docx 的记录时中断：最后一行只写了一半
+            checkpoint_path.write_text("\n".join(lines[:4]) + "\n" + lines[4][:10], encoding="utf-8")
+            document = Document()
+            document.add_paragraph("修复后的内容")
+            document.save(root / "broken.docx")
+
+            with patch("scripts.convert_document.convert_docx", wraps=convert_docx) as converter:
+                resumed = batch_convert(str(root), jobs=1, resume=True, content="preview")
+
+            converted = sorted(Path(call.args[0]).name for call in converter.call_args_list)
+            self.assertEqual(["broken.docx", "c.docx"], converted)
+            self.assertEqual([True] * 4, [entry["result"]["success"] for entry in resumed])
+            self.assertTrue(resumed[0]["result"]["resumed"])
+            self.assertIn("内容 a.docx", resumed[0]["result"]["markdown_content"])
+            self.assertIn("content_stats", resumed[0]["result"])
+            summary = _summarize_batch_results(resumed)
+            self.assertEqual({"total": 4, "success": 4, "failed": 0, "resumed": 2}, summary)
+
+            with patch("scripts.convert_document.convert_docx", wraps=convert_docx) as converter:
+                batch_convert(str(root), jobs=1, resume=True)
+            self.assertEqual(0, converter.call_count)
+
+    def test_async_batch_limits_concurrency_and_matches_sync_results(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            for name in ("a.docx", "b.docx", "c.docx"):
+                document = Document()
+                document.add_paragraph(f"内容 {name}")
+                document.save(root / name)
+
+            running = 0
+            peak = 0
+            real_convert_document = convert_document
+
+            def tracking_convert_document(*args, **kwargs):
+                nonlocal running, peak
+                running += 1
+                peak = max(peak, running)
+                try:
+                    time.sleep(0.05)
+                    return real_convert_document(*args, **kwargs)
+                finally:
+                    running -= 1
+
+            async def collect():
+                return [entry async for entry in iter_batch_convert_async(str(root), max_concurrency=2)]
+
+            with patch("scripts.convert_document.convert_document", side_effect=tracking_convert_document):
+                entries = asyncio.run(collect())
+                single = asyncio.run(convert_document_async(str(root / "a.docx"), content="none"))
+
+            self.assertEqual(["a.docx", "b.docx", "c.docx"], sorted(Path(entry["file"]).name for entry in entries))
+            self.assertTrue(all(entry["result"]["success"] for entry in entries), entries)
+            self.assertEqual(2, peak)
+            self.assertTrue(single["success"], single)
+            self.assertNotIn("markdown_content", single)
+
+    def test_convert_md_async_parses_output_and_kills_subprocess_on_cancel(self):
+        output = json.dumps({"success": True, "output_path": "/tmp/out.docx"})
+        quick = ([sys.executable, "-c", f"print({output!r})"], dict(os.environ))
+        slow = ([sys.executable, "-c", "import time; time.sleep(30)"], dict(os.environ))
+
+        async def cancel_after_start():
+            task = asyncio.ensure_future(convert_md_async("doc.md"))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+
+        with patch("scripts.convert_document._prepare_md_conversion", return_value=(quick, None)):
+            result = asyncio.run(convert_md_async("doc.md"))
+        self.assertEqual({"success": True, "output_path": "/tmp/out.docx"}, result)
+
+        started = time.monotonic()
+        with patch("scripts.convert_document._prepare_md_conversion", return_value=(slow, None)):
+            self.assertTrue(asyncio.run(cancel_after_start()))
+        self.assertLess(time.monotonic() - started, 10)
+
+    def test_batch_convert_groups_markdown_inputs_into_one_node_process(self):
+        fake_node = "\n".join([
+            "import json, os, sys",
+            "assert sys.argv[1:] == ['--stdin']",
+            "for job in json.load(sys.stdin):",
+            "    if 'crash' in job['input']:",
+            "        sys.exit(3)",
+            "    out_dir = job['output_dir'] or os.path.join(os.path.dirname(job['input']), 'Word')",
+            "    os.makedirs(out_dir, exist_ok=True)",
+            "    out = os.path.join(out_dir, os.path.basename(job['input'])[:-3] + '.docx')",
+            "    open(out, 'wb').close()",
+            "    print(json.dumps({'index': job['index'], 'result': {'success': True, 'output_path': out}}), flush=True)",
+        ])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            for name in ("a.md", "b.md", "c.md"):
+                (root / name).write_text(f"# {name}", encoding="utf-8")
+            document = Document()
+            document.add_paragraph("Word 正文")
+            document.save(root / "d.docx")
+
+            command = ([sys.executable, "-c", fake_node], dict(os.environ))
+            with patch("scripts.convert_document._prepare_md_node_command", return_value=(command, None)), \
+                    patch("scripts.convert_document.subprocess.run", wraps=subprocess.run) as run:
+                results = batch_convert(str(root), jobs=1)
+
+                self.assertEqual(1, run.call_count)
+                self.assertEqual(["a.md", "b.md", "c.md", "d.docx"], [Path(entry["file"]).name for entry in results])
+                self.assertTrue(all(entry["result"]["success"] for entry in results), results)
+                self.assertEqual(str(root / "Word" / "b.docx"), results[1]["result"]["output_path"])
+
+                (root / "b-crash.md").write_text("# crash", encoding="utf-8")
+                crashed = convert_md_batch([str(root / "a.md"), str(root / "b-crash.md"), str(root / "missing.md")])
+
+            self.assertTrue(crashed[0]["success"])
+            self.assertIn("退出码 3", crashed[1]["error"])
+            self.assertIn("文件不存在", crashed[2]["error"])
+
+    def test_persistent_md_worker_reuses_process_and_restarts_after_crash_or_job_limit(self):
+        fake_node = "\n".join([
+            "import json, os, sys",
+            "assert sys.argv[1:] == ['--serve']",
+            "for line in sys.stdin:",
+            "    request = json.loads(line)",
+            "    if 'crash' in request['input']:",
+            "        sys.stderr.write('boom')",
+            "        sys.exit(7)",
+            "    result = {'success': True, 'output_path': request['input'], 'pid': os.getpid()}",
+            "    print(json.dumps({'id': 'stale', 'result': {}}))",
+            "    print(json.dumps({'id': request['id'], 'result': result}), flush=True)",
+        ])
+        command = ([sys.executable, "-c", fake_node], dict(os.environ))
+        self.addCleanup(shutdown_md_worker)
+
+        with patch("scripts.convert_document._prepare_md_node_command", return_value=(command, None)), \
+                patch("scripts.convert_document.MD_WORKER_MAX_JOBS", 3):
+            first = convert_md("a.md", persistent=True)
+            second = convert_md("b.md", persistent=True)
+            crashed = convert_md("crash.md", persistent=True)
+            recovered = convert_md("c.md", persistent=True)
+            results = [convert_md(f"{name}.md", persistent=True) for name in ("d", "e", "f")]
+
+        self.assertTrue(first["success"], first)
+        self.assertEqual(os.path.abspath("b.md"), second["output_path"])
+        self.assertEqual(first["pid"], second["pid"])
+        self.assertIn("退出码 7", crashed["error"])
+        self.assertIn("boom", crashed["error"])
+        self.assertNotEqual(first["pid"], recovered["pid"])
+        self.assertEqual(recovered["pid"], results[0]["pid"])
+        self.assertEqual(results[0]["pid"], results[1]["pid"])
+        self.assertNotEqual(results[1]["pid"], results[2]["pid"])
+
+    def test_batch_convert_incremental_skips_unchanged_and_removes_deleted(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            for name in ("keep", "change", "delete"):
+                document = Document()
+                document.add_paragraph(f"{name} v1")
+                document.save(root / f"{name}.docx")
+
+            first = batch_convert(str(root), jobs=1, incremental=True)
+            self.assertEqual(3, sum(1 for entry in first if entry["result"]["success"]))
+            self.assertTrue((root / "Markdown" / ".bruce-doc-converter-manifest.json").exists())
+
+            document = Document()
+            document.add_paragraph("change v2 with more text")
+            document.save(root / "change.docx")
+            (root / "delete.docx").unlink()
+
+            converted = []
+            original_convert = convert_document
+
+            def _tracking_convert(path, *args, **kwargs):
+                converted.append(Path(path).name)
+                return original_convert(path, *args, **kwargs)
+
+            with patch("scripts.convert_document.convert_document", side_effect=_tracking_convert):
+                second = batch_convert(str(root), jobs=1, incremental=True)
+
+            self.assertEqual(["change.docx"], converted)
+            by_name = {Path(entry["file"]).name: entry["result"] for entry in second}
+            self.assertTrue(by_name["keep.docx"]["skipped"])
+            self.assertIn("change v2", by_name["change.docx"]["markdown_content"])
+            self.assertEqual(
+                [str(root / "Markdown" / "delete.md")],
+                by_name["delete.docx"]["removed_outputs"],
+            )
+            self.assertFalse((root / "Markdown" / "delete.md").exists())
+            self.assertTrue((root / "Markdown" / "keep.md").exists())
+
+    def test_batch_stream_mode_prints_one_line_per_file_and_summary(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir)
+            for name in ("one", "two"):
+                document = Document()
+                document.add_paragraph(name)
+                document.save(root / f"{name}.docx")
+
+            script = Path(__file__).resolve().parents[1] / "scripts" / "convert_document.py"
+            completed = subprocess.run(
+                [sys.executable, str(script), "--batch", str(root), "--stream", "--jobs", "1"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+            )
+
+            lines = [json.loads(line) for line in completed.stdout.splitlines()]
+            self.assertEqual(0, completed.returncode, completed.stderr)
+            self.assertEqual(["one.docx", "two.docx"], sorted(Path(line["file"]).name for line in lines[:-1]))
+            self.assertEqual({"total": 2, "success": 2, "failed": 0}, lines[-1])
+
+    def test_batch_shards_are_disjoint_and_merge_into_single_summary(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            root = Path(tmp_dir) / "share"
+            (root / "sub").mkdir(parents=True)
+            names = [f"doc{index}.docx" for index in range(6)] + [f"sub/nested{index}.docx" for index in range(3)]
+            for name in names:
+                document = Document()
+                document.add_paragraph(name)
+                document.save(root / name)
+
+            full = batch_convert(str(root), jobs=1, content="none")
+            shard_results = [batch_convert(str(root), jobs=1, content="none", shard=f"{index}/3") for index in (1, 2, 3)]
+            shard_files = [{entry["file"] for entry in results} for results in shard_results]
+            self.assertEqual(len(names), sum(len(files) for files in shard_files))
+            self.assertEqual({entry["file"] for entry in full}, set().union(*shard_files))
+            self.assertEqual(shard_results[1], batch_convert(str(root), jobs=1, content="none", shard=(2, 3)))
+
+            script = Path(__file__).resolve().parents[1] / "scripts" / "convert_document.py"
+            outputs = []
+            for index in (1, 2, 3):
+                output = Path(tmp_dir) / f"shard{index}.json"
+                completed = subprocess.run(
+                    [sys.executable, str(script), "--batch", str(root), "--shard", f"{index}/3",
+                     "--jobs", "1", "--content", "none"] + (["--stream"] if index == 3 else []),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    text=True,
+                    encoding="utf-8",
+                )
+                self.assertEqual(0, completed.returncode, completed.stderr)
+                output.write_text(completed.stdout, encoding="utf-8")
+                outputs.append(str(output))
+
+            merged = merge_batch_summaries(outputs)
+            self.assertEqual({"count": 3, "merged": [1, 2, 3], "missing": []}, merged.pop("shards"))
+            self.assertEqual([entry["file"] for entry in full], [entry["file"] for entry in merged["results"]])
+            self.assertEqual(_summarize_batch_results(full), {key: merged[key] for key in ("total", "success", "failed")})
+            self.assertEqual([2, 3], merge_batch_summaries(outputs[:1])["shards"]["missing"])
+            with self.assertRaises(ValueError):
+                merge_batch_summaries([outputs[0], outputs[0]])
+
+    def test_spool_worker_claims_publishes_and_recovers_stale_jobs(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            spool = Path(tmp_dir) / "spool"
+            incoming = spool / "incoming"
+            incoming.mkdir(parents=True)
+            for name in ("incoming/dropped.docx", "shared/referenced.docx", "processing/lost-worker/stale.docx"):
+                (spool / name).parent.mkdir(parents=True, exist_ok=True)
+                document = Document()
+                document.add_paragraph(f"队列 {Path(name).name}")
+                document.save(spool / name)
+            stale = spool / "processing" / "lost-worker" / "stale.docx"
+            os.utime(stale, (time.time() - 120, time.time() - 120))
+            (spool / "processing" / "lost-worker" / "stale.docx.out").mkdir()
+            (incoming / "job.json").write_text(
+                json.dumps({"file_path": "shared/referenced.docx", "content": "none"}), encoding="utf-8"
+            )
+            (incoming / "broken.docx").write_bytes(b"not a zip")
+            (incoming / "upload.docx.part").write_bytes(b"still uploading")
+
+            jobs = []
+            stats = run_spool_worker(str(spool), worker_id="w1", lease_seconds=60, once=True, on_job=jobs.append)
+
+            self.assertEqual({"processed": 4, "success": 3, "failed": 1, "recovered": 1}, stats)
+            self.assertEqual(["broken.docx", "dropped.docx", "job.json", "stale.docx"], sorted(job["job"] for job in jobs))
+            done = spool / "done"
+            self.assertTrue((done / "dropped.docx" / "dropped.docx").exists())
+            self.assertIn("队列 dropped.docx", (done / "dropped.docx" / "dropped.md").read_text(encoding="utf-8"))
+            record = json.loads((done / "job.json" / "result.json").read_text(encoding="utf-8"))
+            self.assertEqual("w1", record["worker"])
+            self.assertEqual(str(done / "job.json" / "referenced.md"), record["result"]["output_path"])
+            self.assertNotIn("markdown_content", record["result"])
+            self.assertTrue((done / "stale.docx" / "stale.md").exists())
+            failed = json.loads((spool / "failed" / "broken.docx" / "result.json").read_text(encoding="utf-8"))
+            self.assertFalse(failed["result"]["success"])
+            self.assertEqual(["upload.docx.part"], os.listdir(incoming))
+            self.assertEqual([], os.listdir(spool / "processing" / "w1"))
+            self.assertEqual([], os.listdir(spool / "processing" / "lost-worker"))
+
+    def test_serve_answers_each_json_line_request(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            document = Document()
+            document.add_paragraph("服务模式正文")
+            document.save(tmp_path / "served.docx")
+
+            requests = "\n".join([
+                json.dumps({"id": 1, "file_path": str(tmp_path / "served.docx"), "output_dir": str(tmp_path / "out")}),
+                json.dumps({"id": 2, "file_path": str(tmp_path / "missing.docx")}),
+                "not json",
+            ]) + "\n"
+            output = io.StringIO()
+
+            serve(io.StringIO(requests), output, jobs=1)
+
+            responses = [json.loads(line) for line in output.getvalue().splitlines()]
+            by_id = {response["id"]: response["result"] for response in responses}
+            self.assertEqual(3, len(responses))
+            self.assertTrue(by_id[1]["success"], by_id[1])
+            self.assertIn("服务模式正文", by_id[1]["markdown_content"])
+            self.assertFalse(by_id[2]["success"])
+            self.assertIn("文件不存在", by_id[2]["error"])
+            self.assertIn("JSON", by_id[None]["error"])
+
     def test_extract_pdf_page_blocks_keeps_spanning_words_in_two_column_mode(self):
         words = [
             {"text": "FULLWIDTH", "x0": 10, "x1": 90, "top": 5, "bottom": 10, "upright": 1},
@@ -641,6 +1205,174 @@ Proof details.
             img_file = output_dir / result["extracted_images"][0]
             self.assertTrue(img_file.exists())
 
+    def test_convert_docx_streaming_matches_full_document_path(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            docx_path = tmp_path / "streaming.docx"
+
+            document = Document()
+            document.add_heading("第一章", level=1)
+            paragraph = document.add_paragraph("普通")
+            paragraph.add_run("加粗").bold = True
+            document.add_paragraph("第一项", style="List Number")
+            document.add_paragraph("第二项", style="List Number")
+            img_path = tmp_path / "test_img.png"
+            img_path.write_bytes(self._make_test_png(200, 150))
+            document.add_picture(str(img_path), width=Inches(2))
+            table = document.add_table(rows=2, cols=2)
+            table.cell(0, 0).text = "A"
+            table.cell(0, 1).text = "B"
+            table.cell(1, 0).text = "C"
+            table.cell(0, 1).merge(table.cell(1, 1))
+            document.add_paragraph("结尾")
+            document.save(docx_path)
+
+            def convert(streaming):
+                images = []
+                markdown, extracted = convert_docx(
+                    str(docx_path), image_sink=_make_memory_image_sink(images), streaming=streaming
+                )
+                return markdown, extracted, images
+
+            expected = convert(False)
+            self.assertIn("| A | B |", expected[0])
+            self.assertEqual(expected, convert(True))
+            with patch.dict(os.environ, {"BRUCE_DOC_CONVERTER_DOCX_STREAMING": "1"}), \
+                    patch("docx.Document", side_effect=AssertionError("streaming path must not load the object model")):
+                self.assertEqual(expected, convert(None))
+
+    def test_convert_document_content_modes_preview_and_none(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            docx_path = tmp_path / "long.docx"
+            document = Document()
+            document.add_heading("第一章", level=1)
+            document.add_paragraph("正文" * 200)
+            document.add_heading("第二章", level=2)
+            document.save(docx_path)
+
+            full = convert_document(str(docx_path), output_dir=str(tmp_path / "out"))
+            preview = convert_document(
+                str(docx_path), output_dir=str(tmp_path / "out"), content="preview", content_preview_bytes=100
+            )
+            none = convert_document(str(docx_path), output_dir=str(tmp_path / "out"), content="none")
+
+            full_bytes = len(full["markdown_content"].encode("utf-8"))
+            self.assertTrue(full["markdown_content"].startswith(preview["markdown_content"]))
+            self.assertLessEqual(len(preview["markdown_content"].encode("utf-8")), 100)
+            self.assertEqual(
+                {"bytes": full_bytes, "lines": 5, "headings": 2, "truncated": True},
+                preview["content_stats"],
+            )
+            self.assertNotIn("markdown_content", none)
+            self.assertEqual(full_bytes, none["content_stats"]["bytes"])
+            self.assertEqual(full["markdown_content"], Path(none["output_path"]).read_text(encoding="utf-8"))
+
+    def test_convert_document_profile_reports_stages_pages_and_batch_totals(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            input_dir = tmp_path / "in"
+            input_dir.mkdir()
+            presentation = Presentation()
+            for title in ("第一页", "第二页"):
+                slide = presentation.slides.add_slide(presentation.slide_layouts[1])
+                slide.shapes.title.text = title
+            presentation.save(input_dir / "deck.pptx")
+            document = Document()
+            document.add_paragraph("正文")
+            document.save(input_dir / "notes.docx")
+
+            plain = convert_document(str(input_dir / "deck.pptx"), output_dir=str(tmp_path / "out"))
+            result = convert_document(str(input_dir / "deck.pptx"), output_dir=str(tmp_path / "out"), profile=True)
+
+            self.assertNotIn("profile", plain)
+            self.assertEqual(plain["markdown_content"], result["markdown_content"])
+            profile = result["profile"]
+            self.assertGreater(profile["total"]["wall_ms"], 0)
+            for stage in ("dependencies", "convert", "pptx.open", "pptx.slide", "write_output"):
+                self.assertIn(stage, profile["stages"])
+            self.assertEqual(2, profile["stages"]["pptx.slide"]["calls"])
+            self.assertEqual([1, 2], [page["page"] for page in profile["pages"]])
+            self.assertEqual({"page", "stages", "wall_ms", "cpu_ms", "peak_bytes"}, set(profile["pages"][0]))
+
+            results = batch_convert(str(input_dir), output_dir=str(tmp_path / "batch"), jobs=1, profile=True)
+            summary = _summarize_batch_results(results)
+
+            self.assertEqual(2, summary["profile"]["files"])
+            self.assertEqual(2, summary["profile"]["total"]["calls"])
+            self.assertEqual(1, summary["profile"]["stages"]["docx.open"]["calls"])
+            self.assertEqual(2, summary["profile"]["stages"]["convert"]["calls"])
+
+    def test_convert_docx_style_cache_resolves_inheritance_and_reports_hit_rate(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            docx_path = tmp_path / "styles.docx"
+
+            document = Document()
+            strong = document.styles.add_style("Strong Char", WD_STYLE_TYPE.CHARACTER)
+            strong.font.bold = True
+            base = document.styles.add_style("Base Para", WD_STYLE_TYPE.PARAGRAPH)
+            base.font.italic = True
+            child = document.styles.add_style("Child Para", WD_STYLE_TYPE.PARAGRAPH)
+            child.base_style = base
+            for _ in range(3):
+                paragraph = document.add_paragraph("斜体", style="Child Para")
+                paragraph.add_run("加粗").style = "Strong Char"
+                heading = document.add_heading("标题", level=1)
+                heading.add_run("加粗").style = "Strong Char"
+            document.save(docx_path)
+
+            result = convert_document(str(docx_path), output_dir=str(tmp_path / "out"), profile=True)
+
+            self.assertTrue(result["success"], result)
+            self.assertEqual(3, result["markdown_content"].count("*斜体****加粗***"))
+            self.assertEqual(3, result["markdown_content"].count("# 标题**加粗**"))
+            caches = result["profile"]["caches"]
+            self.assertEqual({"hits": 4, "misses": 2, "hit_rate": 0.6667}, caches["docx.paragraph_styles"])
+            self.assertEqual(4, caches["docx.run_formats"]["misses"])
+            self.assertEqual(8, caches["docx.run_formats"]["hits"])
+
+            results = batch_convert(str(tmp_path), output_dir=str(tmp_path / "batch"), jobs=1, profile=True)
+            summary = _summarize_batch_results(results)
+            self.assertEqual(4, summary["profile"]["caches"]["docx.paragraph_styles"]["hits"])
+
+    def test_convert_stream_returns_markdown_and_image_blobs_in_memory(self):
+        png_data = self._make_test_png(200, 150)
+        document = Document()
+        document.add_paragraph("上传的正文")
+        document.add_picture(io.BytesIO(png_data), width=Inches(2))
+        buffer = io.BytesIO()
+        document.save(buffer)
+        docx_bytes = buffer.getvalue()
+
+        class NonSeekable(io.RawIOBase):
+            def __init__(self, data):
+                self._inner = io.BytesIO(data)
+
+            def readable(self):
+                return True
+
+            def readinto(self, target):
+                chunk = self._inner.read(len(target))
+                target[:len(chunk)] = chunk
+                return len(chunk)
+
+        with patch("scripts.convert_document._save_extracted_image") as save_to_disk:
+            from_bytes = convert_stream(docx_bytes, "docx", base_name="upload")
+            from_stream = convert_stream(NonSeekable(docx_bytes), ".DOCX", extract_images=False)
+
+        save_to_disk.assert_not_called()
+        self.assertTrue(from_bytes["success"], from_bytes)
+        self.assertIn("上传的正文", from_bytes["markdown_content"])
+        self.assertEqual(1, len(from_bytes["images"]))
+        image = from_bytes["images"][0]
+        self.assertEqual("images/upload_img_001.png", image["path"])
+        self.assertEqual(png_data, image["data"])
+        self.assertIn(f"]({image['path']})", from_bytes["markdown_content"])
+        self.assertTrue(from_stream["success"], from_stream)
+        self.assertEqual([], from_stream["images"])
+        self.assertFalse(convert_stream(b"", "md")["success"])
+
     def test_convert_docx_no_images_when_extract_false(self):
         with tempfile.TemporaryDirectory() as tmp_dir:
             tmp_path = Path(tmp_dir)
@@ -660,6 +1392,58 @@ Proof details.
             self.assertNotIn("![image]", result["markdown_content"])
             self.assertNotIn("extracted_images", result)
 
+    def test_convert_document_cache_restores_renamed_images_without_parsing(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            cache_dir = tmp_path / "cache"
+            first_path = tmp_path / "first.docx"
+
+            document = Document()
+            document.add_paragraph("缓存正文")
+            img_path = tmp_path / "img.png"
+            img_path.write_bytes(self._make_test_png(200, 150))
+            document.add_picture(str(img_path), width=Inches(2))
+            document.save(first_path)
+            second_path = tmp_path / "second.docx"
+            second_path.write_bytes(first_path.read_bytes())
+
+            first = convert_document(str(first_path), output_dir=str(tmp_path / "out1"), cache_dir=str(cache_dir))
+            with patch("scripts.convert_document.convert_docx", side_effect=AssertionError("should not parse")):
+                second = convert_document(str(second_path), output_dir=str(tmp_path / "out2"), cache_dir=str(cache_dir))
+
+            self.assertEqual("miss", first["cache"])
+            self.assertEqual("hit", second["cache"], second)
+            self.assertEqual(["images/second_img_001.png"], second["extracted_images"])
+            self.assertIn("](images/second_img_001.png)", second["markdown_content"])
+            self.assertNotIn("first_img_", second["markdown_content"])
+            self.assertTrue((tmp_path / "out2" / "images" / "second_img_001.png").exists())
+            self.assertEqual(second["markdown_content"], Path(second["output_path"]).read_text(encoding="utf-8"))
+
+            no_images = convert_document(
+                str(second_path), extract_images=False, output_dir=str(tmp_path / "out3"), cache_dir=str(cache_dir)
+            )
+            self.assertEqual("miss", no_images["cache"])
+
+    def test_convert_document_cache_evicts_least_recently_used_entries(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            tmp_path = Path(tmp_dir)
+            cache_dir = tmp_path / "cache"
+            paths = []
+            for name in ("a", "b"):
+                document = Document()
+                document.add_paragraph(f"正文 {name}" * 200)
+                path = tmp_path / f"{name}.docx"
+                document.save(path)
+                paths.append(path)
+
+            convert_document(str(paths[0]), output_dir=str(tmp_path / "out"), cache_dir=str(cache_dir), cache_max_bytes=2500)
+            convert_document(str(paths[1]), output_dir=str(tmp_path / "out"), cache_dir=str(cache_dir), cache_max_bytes=2500)
+
+            again_b = convert_document(str(paths[1]), output_dir=str(tmp_path / "out"), cache_dir=str(cache_dir))
+            again_a = convert_document(str(paths[0]), output_dir=str(tmp_path / "out"), cache_dir=str(cache_dir))
+            self.assertEqual("hit", again_b["cache"])
+            self.assertEqual("miss", again_a["cache"])
+
     def test_convert_pptx_extracts_picture_image(self):
         with tempfile.TemporaryDirectory() as tmp_dir:
             tmp_path = Path(tmp_dir)